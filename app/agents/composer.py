@@ -5,6 +5,8 @@ from app.models import ComposerOutput, Context
 
 # Agent dependency requirements
 requires: list[str] = ["mapper_output"]
+# Sampling temperature of each speculative candidate (ctx.candidate), most conservative first
+candidate_temperatures: list[float] = [0.0, 0.7, 1.0]
 
 
 async def composer_agent(ctx: Context) -> Context:
@@ -53,10 +55,19 @@ Mapper Output:
 
 Generate a complete, valid SQL query that fulfills the original request."""
 
+    # Speculative candidates sample at different temperatures so they do not all make the same mistake
+    temperature = None
+    if ctx.candidate is not None:
+        temperature = candidate_temperatures[ctx.candidate % len(candidate_temperatures)]
+
     try:
         # Call OpenAI with structured output
         composer_output = await openai_client.call_structured(
-            model="gpt-4o-mini", system_prompt=system_prompt, user_prompt=user_prompt, output_model=ComposerOutput
+            model="gpt-4o-mini",
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            output_model=ComposerOutput,
+            temperature=temperature,
         )
 
         # Update context
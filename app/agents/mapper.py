@@ -18,6 +18,14 @@ async def mapper_agent(ctx: Context) -> Context:
     if not ctx.planner_output:
         raise ValueError("Planner output is required but not found in context")
 
+    # Table size hints from the database catalog, when available
+    statistics_section = ""
+    if ctx.table_statistics:
+        statistics_section = f"""
+Table statistics (catalog estimates: row_estimate, null_fraction, distinct_estimate):
+{json.dumps(ctx.table_statistics, indent=2)}
+"""
+
     # Build system prompt for the mapper
     system_prompt = f"""You are a database schema mapper that takes structured query components and maps them to specific database tables and columns.
 
@@ -29,7 +37,7 @@ Your task is to map the planner's structured output to the actual database schem
 
 Available database schema:
 {json.dumps(ctx.schema, indent=2)}
-
+{statistics_section}
 Mapping Rules:
 - For entities of type "table", set column to None and map to the actual table name
 - For entities of type "column", map to the specific table.column combination
@@ -38,6 +46,7 @@ Mapping Rules:
 - For order_by, map to the full table.column format
 - Use the exact table and column names from the schema
 - If a mapping is ambiguous, choose the most relevant table based on the query context
+- When table statistics are provided, prefer smaller tables and selective (high distinct, low null) columns for joins and filters
 """
 
     # Build user prompt with planner output
@@ -15,6 +15,14 @@ async def planner_agent(ctx: Context) -> Context:
     the user's query and populates ctx.planner_output.
     """
 
+    # Table size hints from the database catalog, when available
+    statistics_section = ""
+    if ctx.table_statistics:
+        statistics_section = f"""
+Table statistics (catalog estimates: row_estimate, null_fraction, distinct_estimate):
+{json.dumps(ctx.table_statistics, indent=2)}
+"""
+
     # Build system prompt for the planner
     system_prompt = f"""You are a SQL query planner that analyzes natural language queries about healthcare processes and extracts structured information.
 
@@ -28,7 +36,7 @@ Your task is to parse the user's natural language query and identify:
 
 Available database schema:
 {json.dumps(ctx.schema, indent=2)}
-
+{statistics_section}
 Instructions:
 - For intent: use "select" for basic queries, "aggregate" for COUNT/SUM/AVG operations, "filter" for WHERE conditions
 - For entities: identify table names and column references, specify type as "table" or "column"
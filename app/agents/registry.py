@@ -0,0 +1,139 @@
+"""
+Process-wide registry of workflow agents.
+
+Agent modules are imported once and their metadata (requires, provides,
+retry_from, timeout, whether the function is async) is read into an AgentSpec.
+The workflow DAG, its execution order and the retry path are derived from the
+specs at the same time, so orchestrators only look them up.
+"""
+
+import importlib
+import inspect
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from typing import Optional, Union
+
+import logfire
+
+from app.config import workflow_config
+from app.models import Context
+from app.services.workflow_state import output_field
+
+AGENT_MODULES = {
+    "planner": "app.agents.planner",
+    "mapper": "app.agents.mapper",
+    "composer": "app.agents.composer",
+    "validator": "app.agents.validator",
+}
+
+AgentFunction = Union[Callable[[Context], Context], Callable[[Context], Awaitable[Context]]]
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """An agent function and the metadata its module declares."""
+
+    name: str
+    func: AgentFunction
+    is_async: bool
+    # Context fields the agent reads and writes
+    requires: tuple[str, ...]
+    provides: tuple[str, ...]
+    # Agents a failed validation restarts from
+    retry_from: tuple[str, ...]
+    # Seconds one run may take (None: no limit)
+    timeout: Optional[float]
+
+    @classmethod
+    def from_module(cls, name: str, module) -> "AgentSpec":
+        func = getattr(module, f"{name}_agent")
+        timeout = getattr(module, "timeout", workflow_config.AGENT_TIMEOUT_SECONDS)
+        return cls(
+            name=name,
+            func=func,
+            is_async=inspect.iscoroutinefunction(func),
+            requires=tuple(getattr(module, "requires", [])),
+            provides=tuple(getattr(module, "provides", [output_field(name)])),
+            retry_from=tuple(getattr(module, "retry_from", [])),
+            timeout=timeout or None,
+        )
+
+
+class AgentRegistry:
+    """
+    Agents of the workflow and the DAG derived from what they require and provide.
+
+    dependencies maps an agent to the agents it waits for, workflow_dag is the
+    adjacency list (agent -> agents that consume its output).
+    """
+
+    def __init__(self, agent_modules: dict[str, str] = AGENT_MODULES):
+        self.specs: dict[str, AgentSpec] = {}
+        for agent_name, module_path in agent_modules.items():
+            try:
+                self.specs[agent_name] = AgentSpec.from_module(agent_name, importlib.import_module(module_path))
+            except (ImportError, AttributeError) as e:
+                logfire.info(f"Warning: Could not register agent {agent_name}: {e}")
+
+        self.agents: dict[str, AgentFunction] = {name: spec.func for name, spec in self.specs.items()}
+        self.dependencies: dict[str, set[str]] = {}
+        self.workflow_dag: dict[str, list[str]] = {}
+        self.execution_order: list[str] = []
+        self._build_graph()
+        # Where a failed validation restarts: the retry_from agents and their downstream
+        self.retry_path: list[str] = self.with_downstream(
+            root for spec in self.specs.values() for root in spec.retry_from
+        )
+
+    def _build_graph(self):
+        """
+        Derive the DAG from the agents' requires/provides.
+
+        An agent depends on the agents providing the fields it requires; required fields
+        no agent provides (e.g. table_statistics) are inputs of the workflow.
+
+        Raises:
+            ValueError: If two agents provide the same field
+            graphlib.CycleError: If the dependencies form a cycle
+        """
+        providers: dict[str, str] = {}
+        for spec in self.specs.values():
+            for field in spec.provides:
+                if field in providers:
+                    raise ValueError(f"Both {providers[field]} and {spec.name} provide {field}")
+                providers[field] = spec.name
+
+        self.dependencies = {
+            spec.name: {providers[req] for req in spec.requires if req in providers} for spec in self.specs.values()
+        }
+        self.workflow_dag = {
+            agent_name: [other for other, upstream in self.dependencies.items() if agent_name in upstream]
+            for agent_name in self.specs
+        }
+        # Registration order breaks ties, so the order is stable
+        self.execution_order = list(TopologicalSorter(self.dependencies).static_order())
+
+    def with_downstream(self, agent_names) -> list[str]:
+        """The given agents and everything downstream of them, in execution order."""
+        path: set[str] = set()
+        pending = list(agent_names)
+        while pending:
+            agent_name = pending.pop()
+            if agent_name in path or agent_name not in self.specs:
+                continue
+            path.add(agent_name)
+            pending.extend(self.workflow_dag[agent_name])
+        return [agent_name for agent_name in self.execution_order if agent_name in path]
+
+
+_registry: Optional[AgentRegistry] = None
+
+
+def get_agent_registry() -> AgentRegistry:
+    """The process-wide registry, built on first use."""
+    global _registry
+
+    if _registry is None:
+        _registry = AgentRegistry()
+    return _registry
@@ -5,6 +5,8 @@ from app.models import Context, ValidatorOutput
 
 # Agent dependency requirements
 requires: list[str] = ["composer_output"]
+# When validation fails, the workflow re-runs these agents and everything downstream
+retry_from: list[str] = ["composer"]
 
 
 async def validator_agent(ctx: Context) -> Context:
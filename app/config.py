@@ -20,6 +20,10 @@ database_config = DatabaseConfig()  # type: ignore
 
 class RedisConfig(BaseSettings):
     REDIS_URL: str
+    # Codec for new writes: json, msgpack or msgpack+zstd (every format stays readable)
+    REDIS_CODEC: str = "msgpack+zstd"
+    # Connect to a Redis Cluster (REDIS_URL is any node of it)
+    REDIS_CLUSTER: bool = False
 
 
 cache_config = RedisConfig()  # type: ignore
@@ -37,3 +41,35 @@ class LLMConfig(BaseSettings):
 
 
 llm_config = LLMConfig()  # type: ignore
+
+
+class WorkflowConfig(BaseSettings):
+    # Pacing of workflows started through the API (none, fixed or ui) and from the web UI
+    AGENT_PACING: str = "none"
+    AGENT_UI_PACING: str = "ui"
+    # Minimum duration (fixed) or display time (ui) of each agent step, in seconds
+    AGENT_MIN_STEP_SECONDS: float = 2.0
+    # Default limit on one agent step, in seconds (agents may declare their own timeout); 0 disables it
+    AGENT_TIMEOUT_SECONDS: float = 0
+    # Workflows one worker process runs at the same time
+    WORKFLOW_WORKER_CONCURRENCY: int = 10
+    # Whether the API process runs workflow jobs itself; set to false when dedicated workers
+    # (`python -m app.worker`) run them, so a single API process or container works on its own
+    WORKFLOW_RUN_IN_API: bool = True
+    # Admission control: workflows running at once (all workers) and per user, and how many may
+    # wait for a slot before new ones are rejected with 429
+    WORKFLOW_MAX_RUNNING: int = 50
+    WORKFLOW_MAX_RUNNING_PER_USER: int = 5
+    WORKFLOW_MAX_PENDING: int = 1000
+    # Speculative candidates of the retry path (composer -> validator) run in parallel per attempt;
+    # the first valid one wins. 1 disables speculation; requests may ask for up to WORKFLOW_MAX_CANDIDATES
+    WORKFLOW_CANDIDATES: int = 1
+    WORKFLOW_MAX_CANDIDATES: int = 4
+    # Default end-to-end time budget of a workflow from its submission, in seconds; 0 disables it
+    WORKFLOW_DEADLINE_SECONDS: float = 0
+    # Batch submissions: workflows of one batch queued or running at a time, and queries per batch
+    WORKFLOW_BATCH_CONCURRENCY: int = 10
+    WORKFLOW_BATCH_MAX_QUERIES: int = 1000
+
+
+workflow_config = WorkflowConfig()
@@ -1,28 +1,125 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
 from app.config import llm_config
-from openai import AsyncOpenAI
+from openai import NOT_GIVEN, AsyncOpenAI
+from openai.types import CompletionUsage
 from openai.types.chat import ParsedChatCompletion
 from pydantic import BaseModel
 
 
+@dataclass
+class LLMUsage:
+    """LLM calls made while it is being tracked (see track_usage), failed ones included."""
+
+    calls: int = 0
+    # Calls that raised (API errors, timeouts, cancellation, truncated output)
+    failed_calls: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[LLMUsage]:
+    """Accumulate the LLM calls of the current task (and tasks it starts) into a new LLMUsage."""
+    usage = LLMUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def deadline(at: Optional[float]) -> Iterator[None]:
+    """Bound the LLM calls of the current task (and tasks it starts) by a deadline (epoch seconds)."""
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _error_usage(error: BaseException) -> Optional[CompletionUsage]:
+    """Usage reported with a failed call, if any (a completion cut off by its length or a filter)."""
+    return getattr(getattr(error, "completion", None), "usage", None)
+
+
+def _request_timeout():
+    """Remaining time before the deadline, as the request timeout (the client default without one)."""
+    at = _deadline.get()
+    if at is None:
+        return NOT_GIVEN
+    remaining = at - time.time()
+    if remaining <= 0:
+        raise TimeoutError("Workflow deadline exceeded before the LLM call")
+    return remaining
+
+
+def _record_usage(started_at: float, usage: Optional[CompletionUsage], failed: bool = False):
+    tracked = _usage.get()
+    if tracked is None:
+        return
+    tracked.calls += 1
+    if failed:
+        tracked.failed_calls += 1
+    tracked.seconds += time.monotonic() - started_at
+    if usage is not None:
+        tracked.prompt_tokens += usage.prompt_tokens
+        tracked.completion_tokens += usage.completion_tokens
+
+
 class OpenAIClient:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=llm_config.OPENAI_API_KEY)
 
     async def call(self, model: str, system_prompt: str, user_prompt: str) -> str:
-        response = await self.client.chat.completions.create(
-            model=model,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-        )
+        started_at = time.monotonic()
+        try:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+                timeout=_request_timeout(),
+            )
+        except BaseException as e:
+            # Failed calls (timeouts and cancellation too) still cost time and maybe tokens
+            _record_usage(started_at, _error_usage(e), failed=True)
+            raise
+        _record_usage(started_at, response.usage)
         return response.choices[0].message.content or ""
 
     async def call_structured[T: BaseModel](
-        self, model: str, system_prompt: str, user_prompt: str, output_model: type[T]
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        output_model: type[T],
+        temperature: Optional[float] = None,
     ) -> T:
-        openai_response: ParsedChatCompletion = await self.client.beta.chat.completions.parse(
-            model=model,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-            response_format=output_model,
-        )
+        started_at = time.monotonic()
+        try:
+            openai_response: ParsedChatCompletion = await self.client.beta.chat.completions.parse(
+                model=model,
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+                response_format=output_model,
+                temperature=temperature if temperature is not None else NOT_GIVEN,
+                timeout=_request_timeout(),
+            )
+        except BaseException as e:
+            _record_usage(started_at, _error_usage(e), failed=True)
+            raise
+        _record_usage(started_at, openai_response.usage)
 
         message = openai_response.choices[0].message
         if parsed_response := message.parsed:
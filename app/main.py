@@ -3,8 +3,9 @@ from contextlib import asynccontextmanager
 import logfire
 from fastapi import FastAPI
 
-from app.config import database_config, logfire_config
+from app.config import database_config, logfire_config, workflow_config
 from app.llm_clients.openai_client import openai_client
+from app.models import DatabaseConnection
 from app.routes.frontend import router as frontend_router
 
 # Import routers
@@ -14,7 +15,11 @@ from app.routes.mock_data import router as mock_data_router
 from app.routes.query import router as query_router
 from app.routes.workflow import router as workflow_router
 from app.services.database import ping_db, sessionmanager
+from app.services.local_cache import start_local_cache, stop_local_cache
 from app.services.redis import ping_redis
+from app.services.sql_runner import close_pools
+from app.services.workflow_archive import start_archiver, stop_archiver
+from app.workflow_runner import start_runner, stop_runner
 
 # lifespan = None  # type: ignore
 
@@ -28,7 +33,18 @@ async def lifespan(app: FastAPI):
     # Ping to ensure they are up and connections open
     await ping_db()
     await ping_redis()
+    # Connections are read on every query and almost never change
+    await start_local_cache(DatabaseConnection)
+    # Moves finished workflows from Redis to Postgres
+    await start_archiver()
+    # Unless disabled, the API process is a worker too; dedicated workers run python -m app.worker
+    if workflow_config.WORKFLOW_RUN_IN_API:
+        await start_runner()
     yield
+    await stop_runner()
+    await stop_archiver()
+    await stop_local_cache()
+    await close_pools()
     if sessionmanager._engine is not None:
         await sessionmanager.close()
 
@@ -3,7 +3,9 @@ from enum import Enum
 from typing import Any, Optional
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, field_serializer, field_validator, model_validator
+
+from app.services.schema_store import cached_schema, remember_schema, schema_hash
 
 
 class DatabaseType(str, Enum):
@@ -53,13 +55,24 @@ class DatabaseConnection(BaseModel):
 
 
 class QueryResult(BaseModel):
-    """Result of a SQL query execution."""
+    """
+    Result of a SQL query execution.
+
+    The SQL runner builds this with model_construct and keeps the driver's row
+    objects (asyncpg Records / SQLAlchemy Rows) as-is; routes encode them with
+    app.services.result_encoder instead of going through Pydantic.
+    """
 
     columns: list[str] = Field(default_factory=list)
     rows: list[list[Any]] = Field(default_factory=list)
     row_count: int = 0
     execution_time_ms: float = 0.0
 
+    @field_serializer("rows")
+    def serialize_rows(self, rows: list) -> list[list[Any]]:
+        # Slow path only: driver rows are not lists, so copy them when Pydantic serializes
+        return [list(row) for row in rows]
+
 
 class QueryRequest(BaseModel):
     """Request payload for SQL query execution."""
@@ -76,6 +89,43 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
 
 
+class TransactionStatement(BaseModel):
+    """A single statement inside a transaction request."""
+
+    sql: str = Field(..., min_length=1)
+    # Positional parameters in the driver's placeholder style ($1 for PostgreSQL, ? for SQLite, %s for MySQL)
+    params: Optional[list[Any]] = None
+    # Run the statement once per parameter set (pipelined via executemany on PostgreSQL)
+    batch: Optional[list[list[Any]]] = None
+    # Optional statements run inside a savepoint; a failure rolls back only that statement
+    optional: bool = False
+
+
+class TransactionRequest(BaseModel):
+    """Request payload for executing several statements in one transaction."""
+
+    connection_id: str = Field(..., min_length=1)
+    statements: list[TransactionStatement] = Field(..., min_length=1)
+
+
+class StatementResult(BaseModel):
+    """Outcome of one statement in a transaction."""
+
+    index: int
+    status: str = Field(..., pattern="^(ok|error|rolled_back|skipped)$")
+    data: Optional[QueryResult] = None
+    error: Optional[str] = None
+
+
+class TransactionResponse(BaseModel):
+    """Response for a multi-statement transaction."""
+
+    status: str = Field(..., pattern="^(ok|error)$")
+    results: list[StatementResult] = Field(default_factory=list)
+    error: Optional[str] = None
+    execution_time_ms: float = 0.0
+
+
 class DatabaseConnectionCreate(BaseModel):
     """Request payload for creating a database connection."""
 
@@ -129,6 +179,54 @@ class DatabaseConnectionResponse(BaseModel):
         )
 
 
+class ColumnStatistics(BaseModel):
+    """Catalog statistics for a single column. Values are estimates and may be missing."""
+
+    null_fraction: Optional[float] = None
+    distinct_estimate: Optional[float] = None
+
+
+class TableStatistics(BaseModel):
+    """Catalog statistics for a single table."""
+
+    row_estimate: Optional[int] = None
+    columns: dict[str, ColumnStatistics] = Field(default_factory=dict)
+
+
+class DatabaseStatistics(BaseModel):
+    """Table statistics for a database connection, cached in Redis with a TTL."""
+
+    connection_id: str
+    tables: dict[str, TableStatistics] = Field(default_factory=dict)
+    collected_at: float = Field(default_factory=time.time)
+
+    def to_prompt_dict(self) -> dict:
+        """Compact representation for agent prompts (drops empty values)."""
+        return self.model_dump(mode="json", exclude_none=True, exclude={"connection_id", "collected_at"})["tables"]
+
+
+class IndexSuggestion(BaseModel):
+    """A CREATE INDEX recommendation derived from the query log."""
+
+    table: str
+    columns: list[str]
+    statement: str
+    fingerprints: list[str] = Field(default_factory=list)
+    calls: int = 0
+    observed_time_ms: float = 0.0
+    # calls x rows the sequential scans read that an index lookup would skip
+    estimated_rows_avoided: float = 0.0
+
+
+class IndexAdvice(BaseModel):
+    """Index suggestions for a database connection, ordered by estimated benefit."""
+
+    connection_id: str
+    suggestions: list[IndexSuggestion] = Field(default_factory=list)
+    analyzed_queries: int = 0
+    generated_at: float = Field(default_factory=time.time)
+
+
 # Agentic Workflow Models
 
 
@@ -201,14 +299,75 @@ class WorkflowStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     RETRYING = "retrying"
+    CANCELLED = "cancelled"
+
+
+class AgentPacing(str, Enum):
+    """How agent steps are paced for people watching a workflow."""
+
+    NONE = "none"  # run every agent as soon as the previous one finishes
+    FIXED = "fixed"  # every agent step takes at least AGENT_MIN_STEP_SECONDS
+    UI = "ui"  # run at full speed; the web UI reveals each step for at least AGENT_MIN_STEP_SECONDS
+
+
+class WorkflowPriority(str, Enum):
+    """Admission class of a queued workflow; higher classes leave the pending queue first."""
+
+    HIGH = "high"  # someone is watching it in the web UI
+    NORMAL = "normal"  # started through the API
+    LOW = "low"  # background and bulk work
+
+
+class AgentRun(BaseModel):
+    """Timing and LLM usage of one agent execution; retries and candidates each get their own."""
+
+    agent: str
+    # retry_count of the workflow when the agent ran
+    attempt: int = 0
+    candidate: Optional[int] = None
+    # When its dependencies were done (for the first agent: when the workflow was submitted)
+    ready_at: float
+    started_at: float
+    finished_at: Optional[float] = None
+    # Failed LLM calls are counted too, with their time and any tokens they reported
+    llm_calls: int = 0
+    llm_failed_calls: int = 0
+    llm_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Duration of the state flush that saved its outputs; known once that flush is done, so it
+    # reaches Redis with the next write (the workflow writes its agent_runs once more when it
+    # finishes; losing candidates are never saved)
+    persist_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    @computed_field
+    @property
+    def queue_wait_seconds(self) -> float:
+        return self.started_at - self.ready_at
+
+    @computed_field
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        return self.finished_at - self.started_at if self.finished_at is not None else None
 
 
 class Context(BaseModel):
-    """Shared context model that holds all workflow state."""
+    """
+    Shared context model that holds all workflow state.
+
+    The database schema is not part of the stored state: Context keeps its content
+    hash (schema_ref) and the schema itself lives in app/services/schema_store.py.
+    Context(schema=...) still works; the hash is computed on construction.
+    """
 
     request_id: UUID = Field(default_factory=uuid4)
     query: str
-    schema: dict
+    schema_ref: str
+    _schema: Optional[dict] = PrivateAttr(default=None)
+    _candidate: Optional[int] = PrivateAttr(default=None)
+    # Row counts, null fractions and distinct estimates per table, when collected
+    table_statistics: Optional[dict] = None
 
     # Agent outputs
     planner_output: Optional[PlannerOutput] = None
@@ -222,6 +381,17 @@ class Context(BaseModel):
     feedback: Optional[str] = None
     retry_count: int = 0
     max_retries: int = 3
+    # None uses the deployment default (AGENT_PACING)
+    pacing: Optional[AgentPacing] = None
+    priority: WorkflowPriority = WorkflowPriority.NORMAL
+    # Speculative candidates generated and validated at once per attempt; None uses the
+    # deployment default (WORKFLOW_CANDIDATES)
+    candidates: Optional[int] = None
+    # Time (epoch seconds) by which the workflow must be done; None: no limit
+    deadline: Optional[float] = None
+    # One entry per agent execution; copies made for parallel branches and candidates share
+    # the list, so cancelled candidates are accounted for too
+    agent_runs: list[AgentRun] = Field(default_factory=list)
 
     # Timestamps
     created_at: float = Field(default_factory=time.time)
@@ -231,6 +401,54 @@ class Context(BaseModel):
     user_id: Optional[str] = None
     session_id: Optional[str] = None
 
+    @model_validator(mode="before")
+    @classmethod
+    def _schema_to_ref(cls, data: Any) -> Any:
+        """Accept a full schema (new contexts and legacy Redis documents) and keep only its hash."""
+        if isinstance(data, dict) and "schema" in data:
+            data = dict(data)
+            schema = data.pop("schema")
+            schema_ref = schema_hash(schema)
+            remember_schema(schema_ref, schema)
+            data.setdefault("schema_ref", schema_ref)
+        return data
+
+    def model_post_init(self, __context: Any) -> None:
+        self._schema = cached_schema(self.schema_ref)
+
+    @property
+    def schema(self) -> dict:
+        """
+        The full database schema.
+
+        Raises:
+            LookupError: If it has not been loaded in this process (see attach_schema)
+        """
+        if self._schema is None:
+            self._schema = cached_schema(self.schema_ref)
+            if self._schema is None:
+                raise LookupError(f"Schema {self.schema_ref} is not loaded; use schema_store.load_schema first")
+        return self._schema
+
+    @property
+    def schema_loaded(self) -> bool:
+        return self._schema is not None
+
+    def attach_schema(self, schema: dict) -> None:
+        """Attach the schema loaded for schema_ref."""
+        self._schema = schema
+
+    @property
+    def candidate(self) -> Optional[int]:
+        """Index of the speculative candidate this copy generates (None outside speculation)."""
+        return self._candidate
+
+    def as_candidate(self, index: int) -> "Context":
+        """A copy of the context that generates speculative candidate index."""
+        candidate = self.model_copy()
+        candidate._candidate = index
+        return candidate
+
     def update_timestamp(self):
         """Update the updated_at timestamp."""
         self.updated_at = time.time()
@@ -1,17 +1,534 @@
 import asyncio
-import importlib
-import inspect
-import json
-from collections.abc import Awaitable, Callable
-from typing import Optional, Union
+import time
+from collections import deque
+from collections.abc import Callable
+from functools import partial
+from graphlib import TopologicalSorter
+from typing import Optional
 
 import logfire
+import orjson
+from redis.exceptions import ResponseError
 
-from app.models import Context, WorkflowStatus
-from app.services.redis import redis
+from app.agents.registry import get_agent_registry
+from app.config import workflow_config
+from app.llm_clients.openai_client import deadline as llm_deadline
+from app.llm_clients.openai_client import track_usage
+from app.models import AgentPacing, AgentRun, Context, WorkflowStatus
+from app.services.admission import queue_position
+from app.services.codec import decode_model
+from app.services.redis import CLUSTER_MODE, KEY_BUCKETS, binary_redis
+from app.services.schema_store import load_schema, store_schema
+from app.services.workflow_archive import ARCHIVE_AFTER, list_archived_contexts, load_archived_context
+from app.services.workflow_archive import FINISHED_STATUSES as ARCHIVED_STATUSES
+from app.services.workflow_state import (
+    WORKFLOW_INDEX_RETENTION,
+    WORKFLOW_TTL,
+    decode_context,
+    decode_field,
+    encode_fields,
+    legacy_workflow_key,
+    output_field,
+    workflow_bucket,
+    workflow_cancel_key,
+    workflow_events_channel,
+    workflow_index_key,
+    workflow_key,
+)
 
+# Fields an agent may change besides its own output
+AGENT_STEP_FIELDS = ["current_step", "feedback", "updated_at", "agent_runs"]
+STATUS_FIELDS = [
+    "request_id",
+    "status",
+    "current_step",
+    "retry_count",
+    "created_at",
+    "updated_at",
+    "feedback",
+    "pacing",
+    "priority",
+]
+# Extra fields returned when listing workflows
+LIST_FIELDS = [*STATUS_FIELDS, "query", "user_id", "session_id"]
+# Extra fields returned for the steps of a workflow
+STEP_FIELDS = [*STATUS_FIELDS, "agent_runs"]
+# Index entries read per ZREVRANGEBYSCORE while listing
+LIST_BATCH_SIZE = 100
+# Field updates arriving within this window are written together
+STATE_FLUSH_INTERVAL = 0.05
 
-class WorkflowOrchestrator:
+agent_duration = logfire.metric_histogram(
+    "workflow.agent.duration", unit="s", description="Duration of one agent execution"
+)
+agent_queue_wait = logfire.metric_histogram(
+    "workflow.agent.queue_wait", unit="s", description="Time an agent waited between being ready and starting"
+)
+agent_llm_latency = logfire.metric_histogram(
+    "workflow.agent.llm_latency", unit="s", description="Time one agent execution spent in LLM calls"
+)
+agent_tokens = logfire.metric_counter("workflow.agent.tokens", unit="{token}", description="LLM tokens used by agents")
+state_flush_duration = logfire.metric_histogram(
+    "workflow.state.flush_duration", unit="s", description="Duration of one workflow state flush"
+)
+
+
+class WorkflowCancelledError(Exception):
+    """The workflow was cancelled (see workflow_runner.cancel_workflow)."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """The workflow ran past its deadline."""
+
+
+class _PendingWrite:
+    """Field changes of one workflow hash waiting to be flushed."""
+
+    def __init__(self, request_id: str, created_at: float, replace: bool = False):
+        self.request_id = request_id
+        # Score of the workflow in the index sorted sets
+        self.created_at = created_at
+        # Replace the whole hash (DEL before HSET) instead of patching it
+        self.replace = replace
+        self.mapping: dict = {}
+        self.deleted: set[str] = set()
+        self.fields: set[str] = set()
+        # Called with the flush duration once the write is durable
+        self.on_flushed: list[Callable[[float], None]] = []
+
+    def apply(self, mapping: dict, deleted: list[str]):
+        self.mapping.update(mapping)
+        self.deleted.difference_update(mapping)
+        for field in deleted:
+            self.mapping.pop(field, None)
+            if not self.replace:
+                self.deleted.add(field)
+        self.fields.update(mapping, deleted)
+
+    def then(self, newer: "_PendingWrite") -> "_PendingWrite":
+        """Combine with a write that was queued after this one."""
+        if newer.replace:
+            newer.on_flushed = [*self.on_flushed, *newer.on_flushed]
+            return newer
+        combined = _PendingWrite(self.request_id, self.created_at, self.replace)
+        combined.apply(self.mapping, list(self.deleted))
+        combined.apply(newer.mapping, list(newer.deleted))
+        combined.fields.update(self.fields, newer.fields)
+        combined.on_flushed = [*self.on_flushed, *newer.on_flushed]
+        return combined
+
+
+class WorkflowStateWriter:
+    """
+    Coalesces workflow state writes.
+
+    Field updates are merged per workflow and written after a short window; each
+    flush is a single MULTI pipeline that updates every pending hash and publishes
+    a change event on workflow:{request_id}:events. flush() makes everything
+    queued so far durable.
+    """
+
+    def __init__(self, redis_client, flush_interval: float = STATE_FLUSH_INTERVAL):
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+        self._pending: dict[str, _PendingWrite] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def update(
+        self,
+        ctx: Context,
+        fields: Optional[list[str]] = None,
+        replace: bool = False,
+        on_flushed: Optional[Callable[[float], None]] = None,
+    ):
+        """Queue the current values of the given fields (all fields when None)."""
+        key = workflow_key(ctx.request_id)
+        mapping, deleted = encode_fields(ctx, fields)
+
+        pending = self._pending.get(key)
+        if pending is None or replace:
+            replaced = pending
+            pending = self._pending[key] = _PendingWrite(str(ctx.request_id), ctx.created_at, replace)
+            if replaced is not None:
+                # The replacing write makes the replaced changes durable too
+                pending.on_flushed = replaced.on_flushed
+        pending.apply(mapping, deleted)
+        if on_flushed is not None:
+            pending.on_flushed.append(on_flushed)
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            # Pending writes were kept; the next flush retries them
+            logfire.info(f"Warning: Could not persist workflow state: {str(e)}")
+
+    async def flush(self):
+        """Write every queued update in one MULTI pipeline (one per slot in a cluster)."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+
+            started_at = time.monotonic()
+            try:
+                if CLUSTER_MODE:
+                    groups: dict[int, dict[str, _PendingWrite]] = {}
+                    for key, write in batch.items():
+                        groups.setdefault(workflow_bucket(write.request_id), {})[key] = write
+                    await asyncio.gather(*(self._write(group) for group in groups.values()))
+                else:
+                    await self._write(batch)
+            except Exception:
+                # Put the batch back underneath anything queued meanwhile (rewriting is idempotent)
+                for key, write in batch.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = write.then(newer) if newer else write
+                raise
+
+            duration = time.monotonic() - started_at
+            state_flush_duration.record(duration)
+            for write in batch.values():
+                for callback in write.on_flushed:
+                    callback(duration)
+
+    async def _write(self, batch: dict[str, _PendingWrite]):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            for key, write in batch.items():
+                if write.replace:
+                    # Also drops fields that became None and legacy string documents
+                    pipe.delete(key)
+                if write.mapping:
+                    pipe.hset(key, mapping=write.mapping)
+                if write.deleted:
+                    pipe.hdel(key, *write.deleted)
+                pipe.expire(key, WORKFLOW_TTL)
+                self._update_indexes(pipe, write)
+                event = orjson.dumps({"request_id": write.request_id, "fields": sorted(write.fields)})
+                if CLUSTER_MODE:
+                    # Sharded pub/sub: the channel belongs to the workflow's slot, so it can join the MULTI
+                    pipe.spublish(workflow_events_channel(write.request_id), event)
+                else:
+                    pipe.publish(workflow_events_channel(write.request_id), event)
+            await pipe.execute()
+
+    @staticmethod
+    def _update_indexes(pipe, write: _PendingWrite):
+        """Queue sorted-set index updates for the fields in a write (same MULTI as the hash)."""
+        member = {write.request_id: write.created_at}
+        cutoff = write.created_at - WORKFLOW_INDEX_RETENTION
+        bucket = workflow_bucket(write.request_id)
+        index_keys = []
+
+        if write.replace:
+            index_keys.append(workflow_index_key(bucket))
+        for kind, field in (("user", "user_id"), ("session", "session_id")):
+            if write.mapping.get(field):
+                index_keys.append(workflow_index_key(bucket, kind, write.mapping[field]))
+        if "status" in write.mapping:
+            # A workflow is in exactly one status index
+            for status in WorkflowStatus:
+                if status.value != write.mapping["status"]:
+                    pipe.zrem(workflow_index_key(bucket, "status", status.value), write.request_id)
+            index_keys.append(workflow_index_key(bucket, "status", write.mapping["status"]))
+
+        for index_key in index_keys:
+            pipe.zadd(index_key, member)
+            pipe.zremrangebyscore(index_key, "-inf", f"({cutoff}")
+            pipe.expire(index_key, WORKFLOW_INDEX_RETENTION)
+
+
+class WorkflowReader:
+    """
+    Read side of workflow state: contexts, status and listings.
+
+    Holds no per-workflow state, so status endpoints share one instance
+    (workflow_reader) instead of creating an orchestrator.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or binary_redis
+
+    async def _load_legacy_context(self, key: str) -> Optional[Context]:
+        """Read a context written as a single document before workflow hashes."""
+        data = await self.redis_client.get(key)
+        return decode_model(data, Context) if data else None
+
+    async def load_context(self, request_id: str) -> Optional[Context]:
+        """Load context from Redis."""
+        for key in (workflow_key(request_id), legacy_workflow_key(request_id)):
+            try:
+                mapping = await self.redis_client.hgetall(key)
+            except ResponseError:
+                # WRONGTYPE: the workflow is still stored as one document
+                return await self._load_legacy_context(key)
+
+            if mapping:
+                return decode_context(mapping)
+        return await self._load_archived_context(request_id)
+
+    async def _load_archived_context(self, request_id: str) -> Optional[Context]:
+        """Finished workflows are moved from Redis to the SQL archive."""
+        try:
+            return await load_archived_context(request_id)
+        except Exception as e:
+            logfire.info(f"Warning: Could not read workflow archive: {str(e)}")
+            return None
+
+    def _queue_status_reads(self, pipe, key: str, fields: list[str]):
+        pipe.hmget(key, [*fields, "composer_output", "validator_output"])
+        # Only existence matters for the planner and mapper outputs
+        pipe.hexists(key, "planner_output")
+        pipe.hexists(key, "mapper_output")
+
+    def _status_from_fields(
+        self, fields: list[str], values: list, has_planner_output: bool, has_mapper_output: bool
+    ) -> Optional[dict]:
+        """Build a status dict from the results queued by _queue_status_reads (None if the workflow is gone)."""
+        raw = dict(zip([*fields, "composer_output", "validator_output"], values))
+        if raw["request_id"] is None:
+            return None
+
+        status = {field: decode_field(field, raw[field]) for field in fields}
+        composer_output = decode_field("composer_output", raw["composer_output"])
+        validator_output = decode_field("validator_output", raw["validator_output"])
+        return {
+            **status,
+            "retry_count": int(status["retry_count"]),
+            "created_at": float(status["created_at"]),
+            "updated_at": float(status["updated_at"]),
+            "has_planner_output": bool(has_planner_output),
+            "has_mapper_output": bool(has_mapper_output),
+            "has_composer_output": composer_output is not None,
+            "has_validator_output": validator_output is not None,
+            "sql_query": composer_output["sql_query"] if composer_output else None,
+            "is_valid": validator_output["validation"]["is_valid"] if validator_output else None,
+            "queue_position": None,
+        }
+
+    async def get_workflow_status(self, request_id: str, fields: list[str] = STATUS_FIELDS) -> Optional[dict]:
+        """Get the current status of a workflow, reading only the fields it reports (STEP_FIELDS adds agent_runs)."""
+        for key in (workflow_key(request_id), legacy_workflow_key(request_id)):
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    self._queue_status_reads(pipe, key, fields)
+                    values, has_planner_output, has_mapper_output = await pipe.execute()
+            except ResponseError:
+                # WRONGTYPE: the workflow is still stored as one document
+                ctx = await self._load_legacy_context(key)
+                return self._status_from_context(ctx) if ctx else None
+
+            status = self._status_from_fields(fields, values, has_planner_output, has_mapper_output)
+            if status is not None:
+                if status["status"] == WorkflowStatus.PENDING.value:
+                    # Waiting for admission (None once handed to the workers)
+                    status["queue_position"] = await queue_position(request_id)
+                return status
+
+        ctx = await self._load_archived_context(request_id)
+        return self._status_from_context(ctx) if ctx else None
+
+    @staticmethod
+    def _index_entries(entries: list) -> list[tuple[float, str]]:
+        return [(score, member.decode("utf-8") if isinstance(member, bytes) else member) for member, score in entries]
+
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str]) -> tuple[float | str, Optional[str]]:
+        """The cursor is the (created_at, request_id) of the last item returned."""
+        if not cursor:
+            return "+inf", None
+        try:
+            score, last_id = cursor.split(":", 1)
+            return float(score), last_id
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    async def list_workflows(
+        self,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        status: Optional[WorkflowStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        List workflows newest first, from Redis and the SQL archive.
+
+        Finished workflows leave Redis ARCHIVE_AFTER seconds after creation, so the
+        archive is only queried when the Redis page could reach that far back; both
+        sources are merged by (created_at, request_id). Returns the page and the cursor
+        of the next one.
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        items, next_cursor = await self._list_live_workflows(user_id, session_id, status, cursor, limit)
+        if len(items) == limit and items[-1]["created_at"] >= time.time() - ARCHIVE_AFTER:
+            return items, next_cursor
+        if status is not None and status not in ARCHIVED_STATUSES:
+            return items, next_cursor
+
+        max_score, last_id = self._parse_cursor(cursor)
+        before = (max_score, last_id) if last_id is not None else None
+        try:
+            contexts = await list_archived_contexts(
+                user_id, session_id, status.value if status else None, before, limit + 1
+            )
+        except Exception as e:
+            logfire.info(f"Warning: Could not read workflow archive: {str(e)}")
+            return items, next_cursor
+
+        listed = {item["request_id"] for item in items}
+        archived = [self._list_item_from_context(ctx) for ctx in contexts]
+        merged = sorted(
+            [*items, *(item for item in archived if item["request_id"] not in listed)],
+            key=lambda item: (item["created_at"], item["request_id"]),
+            reverse=True,
+        )
+        page = merged[:limit]
+        has_more = next_cursor is not None or len(contexts) > limit or len(merged) > limit
+        if not page or not has_more:
+            return page, None
+        return page, f"{page[-1]['created_at']!r}:{page[-1]['request_id']}"
+
+    async def _list_live_workflows(
+        self,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        status: Optional[WorkflowStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        List workflows newest first from the sorted-set indexes (never scans the keyspace).
+
+        The most selective index among the filters is walked in every bucket at once
+        (scatter) and the buckets are merged by (created_at, request_id) (gather); the
+        remaining filters are checked on the fetched fields. Returns the page and the
+        cursor of the next one.
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        if session_id is not None:
+            kind, value = "session", session_id
+        elif user_id is not None:
+            kind, value = "user", user_id
+        elif status is not None:
+            kind, value = "status", status.value
+        else:
+            kind, value = None, None
+        index_keys = [workflow_index_key(bucket, kind, value) for bucket in range(KEY_BUCKETS)]
+        filters = {"user_id": user_id, "session_id": session_id, "status": status.value if status else None}
+        filters = {field: value for field, value in filters.items() if value is not None}
+
+        max_score, last_id = self._parse_cursor(cursor)
+
+        # Per bucket: entries fetched but not merged yet, the offset of the next batch and
+        # whether the index has more
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for index_key in index_keys:
+                pipe.zrevrangebyscore(index_key, max_score, "-inf", start=0, num=LIST_BATCH_SIZE, withscores=True)
+            batches = [self._index_entries(entries) for entries in await pipe.execute()]
+        buffers = [deque(batch) for batch in batches]
+        offsets = [len(batch) for batch in batches]
+        has_more = [len(batch) == LIST_BATCH_SIZE for batch in batches]
+
+        items: list[dict] = []
+        while True:
+            candidates = []
+            while len(candidates) < LIST_BATCH_SIZE:
+                heads = [bucket for bucket, buffer in enumerate(buffers) if buffer]
+                if not heads:
+                    break
+                bucket = max(heads, key=lambda b: buffers[b][0])
+                score, request_id = buffers[bucket].popleft()
+                if not buffers[bucket] and has_more[bucket]:
+                    # Refill before this bucket's next entry is compared
+                    entries = await self.redis_client.zrevrangebyscore(
+                        index_keys[bucket],
+                        max_score,
+                        "-inf",
+                        start=offsets[bucket],
+                        num=LIST_BATCH_SIZE,
+                        withscores=True,
+                    )
+                    batch = self._index_entries(entries)
+                    buffers[bucket].extend(batch)
+                    offsets[bucket] += len(batch)
+                    has_more[bucket] = len(batch) == LIST_BATCH_SIZE
+                # Members sharing the cursor's score sort by request_id (descending)
+                if last_id is not None and score == max_score and request_id >= last_id:
+                    continue
+                candidates.append((request_id, score, bucket))
+            if not candidates:
+                return items, None
+
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for request_id, _, _ in candidates:
+                    self._queue_status_reads(pipe, workflow_key(request_id), LIST_FIELDS)
+                results = await pipe.execute(raise_on_error=False)
+
+            stale: dict[int, list[str]] = {}
+            for i, (request_id, score, bucket) in enumerate(candidates):
+                values, has_planner_output, has_mapper_output = results[3 * i : 3 * i + 3]
+                if isinstance(values, Exception):
+                    # Still a legacy single document; not listable
+                    continue
+                item = self._status_from_fields(LIST_FIELDS, values, has_planner_output, has_mapper_output)
+                if item is None:
+                    # Expired since it was indexed
+                    stale.setdefault(bucket, []).append(request_id)
+                    continue
+                if any(item.get(field) != value for field, value in filters.items()):
+                    continue
+                items.append(item)
+                if len(items) == limit:
+                    await self._remove_stale(index_keys, stale)
+                    return items, f"{score!r}:{request_id}"
+
+            await self._remove_stale(index_keys, stale)
+            for bucket, request_ids in stale.items():
+                # Removed entries were before the next batch's offset
+                offsets[bucket] -= len(request_ids)
+
+    async def _remove_stale(self, index_keys: list[str], stale: dict[int, list[str]]):
+        for bucket, request_ids in stale.items():
+            await self.redis_client.zrem(index_keys[bucket], *request_ids)
+
+    def _list_item_from_context(self, ctx: Context) -> dict:
+        item = self._status_from_context(ctx)
+        del item["agent_runs"]
+        return {**item, "query": ctx.query, "user_id": ctx.user_id, "session_id": ctx.session_id}
+
+    def _status_from_context(self, ctx: Context) -> dict:
+        return {
+            "request_id": str(ctx.request_id),
+            "status": ctx.status.value,
+            "current_step": ctx.current_step,
+            "retry_count": ctx.retry_count,
+            "created_at": ctx.created_at,
+            "updated_at": ctx.updated_at,
+            "feedback": ctx.feedback,
+            "pacing": ctx.pacing.value if ctx.pacing else None,
+            "priority": ctx.priority.value,
+            "has_planner_output": ctx.planner_output is not None,
+            "has_mapper_output": ctx.mapper_output is not None,
+            "has_composer_output": ctx.composer_output is not None,
+            "has_validator_output": ctx.validator_output is not None,
+            "sql_query": ctx.composer_output.sql_query if ctx.composer_output else None,
+            "is_valid": ctx.validator_output.validation.is_valid if ctx.validator_output else None,
+            "queue_position": None,
+            "agent_runs": [run.model_dump(mode="json") for run in ctx.agent_runs],
+        }
+
+
+class WorkflowOrchestrator(WorkflowReader):
     """
     DAG-based workflow orchestrator for agentic workflows.
 
@@ -20,45 +537,27 @@ class WorkflowOrchestrator:
     """
 
     def __init__(self):
-        self.redis_client = redis
-
-        # Define the workflow DAG - adjacency list representation
-        self.workflow_dag = {
-            "planner": ["mapper"],
-            "mapper": ["composer"],
-            "composer": ["validator"],
-            "validator": [],  # End node
-        }
-
-        # Agent registry - maps agent names to their functions (sync or async)
-        self.agents: dict[str, Union[Callable[[Context], Context], Callable[[Context], Awaitable[Context]]]] = {}
-        self._register_agents()
-
-    def _register_agents(self):
-        """Register all agent functions from the agents module."""
-        agent_modules = {
-            "planner": "app.agents.planner",
-            "mapper": "app.agents.mapper",
-            "composer": "app.agents.composer",
-            "validator": "app.agents.validator",
-        }
+        super().__init__()
+        self.state_writer = WorkflowStateWriter(self.redis_client)
 
-        for agent_name, module_path in agent_modules.items():
-            try:
-                module = importlib.import_module(module_path)
-                agent_func = getattr(module, f"{agent_name}_agent")
-                self.agents[agent_name] = agent_func
-            except (ImportError, AttributeError) as e:
-                logfire.info(f"Warning: Could not register agent {agent_name}: {e}")
+        # Agents and the DAG derived from what they require and provide are built once
+        # per process; dependencies maps an agent to the agents it waits for,
+        # workflow_dag is the adjacency list (agent -> agents that consume its output)
+        self.registry = get_agent_registry()
+        self.agents = self.registry.agents
+        self.dependencies = self.registry.dependencies
+        self.workflow_dag = self.registry.workflow_dag
+        self.execution_order = self.registry.execution_order
 
     def get_agent_requirements(self, agent_name: str) -> list[str]:
         """Get the requirements for a specific agent."""
-        try:
-            module_path = f"app.agents.{agent_name}"
-            module = importlib.import_module(module_path)
-            return getattr(module, "requires", [])
-        except (ImportError, AttributeError):
-            return []
+        spec = self.registry.specs.get(agent_name)
+        return list(spec.requires) if spec else []
+
+    def get_agent_outputs(self, agent_name: str) -> list[str]:
+        """Context fields an agent writes (module-level provides, default {agent}_output)."""
+        spec = self.registry.specs.get(agent_name)
+        return list(spec.provides) if spec else [output_field(agent_name)]
 
     def check_requirements(self, ctx: Context, agent_name: str) -> bool:
         """Check if all requirements for an agent are satisfied."""
@@ -71,26 +570,31 @@ class WorkflowOrchestrator:
         return True
 
     async def save_context(self, ctx: Context):
-        """Save context to Redis."""
-        key = f"workflow:{ctx.request_id}"
-        data = ctx.to_dict()
-        await self.redis_client.setex(key, 3600, json.dumps(data))  # 1 hour TTL
+        """Save the whole context to Redis, replacing any previous state. Durable on return."""
+        # The schema is stored once under its hash; the context only references it
+        if ctx.schema_loaded:
+            await store_schema(ctx.schema_ref, ctx.schema)
 
-    async def load_context(self, request_id: str) -> Optional[Context]:
-        """Load context from Redis."""
-        key = f"workflow:{request_id}"
-        data = await self.redis_client.get(key)
+        self.state_writer.update(ctx, replace=True)
+        await self.state_writer.flush()
 
-        if data:
-            if isinstance(data, bytes):
-                data_str = data.decode("utf-8")
-            else:
-                data_str = str(data)
-            return Context.from_dict(json.loads(data_str))
-        return None
+    async def save_fields(self, ctx: Context, *fields: str, on_flushed: Optional[Callable[[float], None]] = None):
+        """
+        Queue a write of only the given context fields; coalesced with neighbouring updates.
+        on_flushed is called with the duration of the flush that makes them durable.
+        """
+        self.state_writer.update(ctx, list(fields), on_flushed=on_flushed)
+
+    async def execute_agent(
+        self, ctx: Context, agent_name: str, checkpoint: bool = True, ready_at: Optional[float] = None
+    ) -> Context:
+        """
+        Execute a single agent; without checkpoint its outputs are not saved.
 
-    async def execute_agent(self, ctx: Context, agent_name: str) -> Context:
-        """Execute a single agent."""
+        The execution is recorded in ctx.agent_runs (timings, LLM latency and tokens,
+        persistence time), in a logfire span and in the per-agent histograms. ready_at
+        is when the agent could have started (default: now).
+        """
         if agent_name not in self.agents:
             raise ValueError(f"Agent {agent_name} not found")
 
@@ -103,27 +607,105 @@ class WorkflowOrchestrator:
             ]
             raise ValueError(f"Missing requirements for {agent_name}: {missing_reqs}")
 
-        # Add sleep to simulate processing time for better UX
         logfire.info(f"Starting {agent_name} agent processing...")
-        await asyncio.sleep(2)  # 2 second delay for each agent
+        started_at = time.monotonic()
+        run = AgentRun(
+            agent=agent_name,
+            attempt=ctx.retry_count,
+            candidate=ctx.candidate,
+            ready_at=ready_at or time.time(),
+            started_at=time.time(),
+        )
+        ctx.agent_runs.append(run)
+
+        with (
+            logfire.span(
+                "agent {agent_name}", agent_name=agent_name, attempt=run.attempt, candidate=run.candidate
+            ) as span,
+            track_usage() as usage,
+        ):
+            try:
+                updated_ctx = await self._call_agent(ctx, agent_name)
+            except BaseException as e:
+                # Also cancellation (a losing candidate, a lost lease)
+                run.error = str(e) or type(e).__name__
+                raise
+            finally:
+                self._finish_run(run, usage, span)
+
+        if resolve_pacing(updated_ctx) == AgentPacing.FIXED:
+            # Keep the step visible for the minimum duration (agent time counts towards it)
+            remaining = workflow_config.AGENT_MIN_STEP_SECONDS - (time.monotonic() - started_at)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
 
-        # Execute the agent (handle both sync and async functions)
-        agent_func = self.agents[agent_name]
+        # Save what the agent changed after each step
+        if checkpoint:
+            await self.save_fields(
+                updated_ctx,
+                *self.get_agent_outputs(agent_name),
+                *AGENT_STEP_FIELDS,
+                on_flushed=partial(setattr, run, "persist_seconds"),
+            )
+
+        return updated_ctx
 
-        # Check if the agent function is async
-        if inspect.iscoroutinefunction(agent_func):
-            updated_ctx = await agent_func(ctx)
+    async def _call_agent(self, ctx: Context, agent_name: str) -> Context:
+        """Run an agent function (sync or async) under its timeout and the workflow deadline."""
+        spec = self.registry.specs[agent_name]
+        if spec.is_async:
+            # Only async agents can be interrupted by the timeout
+            timeout = spec.timeout
+            remaining = ctx.deadline - time.time() if ctx.deadline is not None else None
+            deadline_first = remaining is not None and (timeout is None or remaining < timeout)
+            if deadline_first:
+                timeout = remaining
+            try:
+                async with asyncio.timeout(timeout):
+                    # LLM requests get the remaining budget as their timeout
+                    with llm_deadline(ctx.deadline):
+                        updated_ctx = await spec.func(ctx)
+            except TimeoutError:
+                if deadline_first:
+                    raise DeadlineExceededError(f"Workflow deadline exceeded during {agent_name}")
+                raise TimeoutError(f"Agent {agent_name} timed out after {spec.timeout}s")
         else:
-            updated_ctx = agent_func(ctx)
+            updated_ctx = spec.func(ctx)
 
         # Ensure we have a Context object
         if not isinstance(updated_ctx, Context):
             raise ValueError(f"Agent {agent_name} must return a Context object")
+        return updated_ctx
 
-        # Save context after each step
-        await self.save_context(updated_ctx)
+    @staticmethod
+    def _finish_run(run: AgentRun, usage, span):
+        """Complete an agent run record and report it to the span and the metrics."""
+        run.finished_at = time.time()
+        run.llm_calls = usage.calls
+        run.llm_failed_calls = usage.failed_calls
+        run.llm_seconds = usage.seconds
+        run.prompt_tokens = usage.prompt_tokens
+        run.completion_tokens = usage.completion_tokens
 
-        return updated_ctx
+        attributes = {"agent": run.agent}
+        agent_duration.record(run.duration_seconds, attributes)
+        agent_queue_wait.record(run.queue_wait_seconds, attributes)
+        if run.llm_calls:
+            # Runs with a failed LLM call are tagged so their time and tokens can be told apart
+            llm_attributes = {**attributes, "llm_failed": run.llm_failed_calls > 0}
+            agent_llm_latency.record(run.llm_seconds, llm_attributes)
+            agent_tokens.add(run.prompt_tokens, {**llm_attributes, "type": "prompt"})
+            agent_tokens.add(run.completion_tokens, {**llm_attributes, "type": "completion"})
+        span.set_attributes(
+            {
+                "queue_wait_seconds": run.queue_wait_seconds,
+                "llm_calls": run.llm_calls,
+                "llm_failed_calls": run.llm_failed_calls,
+                "llm_seconds": run.llm_seconds,
+                "prompt_tokens": run.prompt_tokens,
+                "completion_tokens": run.completion_tokens,
+            }
+        )
 
     def should_retry(self, ctx: Context) -> bool:
         """Determine if the workflow should retry based on validator feedback."""
@@ -136,96 +718,317 @@ class WorkflowOrchestrator:
 
         return validation_failed and under_retry_limit
 
+    async def is_cancel_requested(self, request_id: str) -> bool:
+        return bool(await self.redis_client.exists(workflow_cancel_key(request_id)))
+
+    async def check_interrupts(self, ctx: Context, agent_name: str):
+        """
+        Stop before an agent when the workflow is past its deadline or was cancelled.
+
+        Raises:
+            DeadlineExceededError: If ctx.deadline has passed
+            WorkflowCancelledError: If the workflow was cancelled
+        """
+        if ctx.deadline is not None and time.time() >= ctx.deadline:
+            raise DeadlineExceededError(f"Workflow deadline exceeded before {agent_name}")
+        if await self.is_cancel_requested(str(ctx.request_id)):
+            raise WorkflowCancelledError(f"Workflow cancelled before {agent_name}")
+
+    def is_valid(self, ctx: Context) -> bool:
+        """Whether the context holds a SQL query the validator accepted."""
+        return ctx.validator_output is not None and ctx.validator_output.validation.is_valid
+
     def get_retry_path(self) -> list[str]:
-        """Get the path of agents to re-execute during retry (composer -> validator)."""
-        return ["composer", "validator"]
+        """
+        Agents to re-execute during retry, in execution order.
+
+        Agents declare where a retry restarts (module-level retry_from, e.g. the validator
+        names the composer); the path is those agents and everything downstream of them.
+        """
+        return list(self.registry.retry_path)
+
+    async def _run_graph(
+        self, ctx: Context, agent_names: list[str], checkpoint: bool = True, ready_at: Optional[float] = None
+    ) -> Context:
+        """
+        Run a sub-graph of agents in dependency order.
+
+        Agents whose dependencies are all done run at the same time (asyncio.TaskGroup),
+        each on its own copy of the context. Their outputs are merged back in execution
+        order, so the result does not depend on which one finished first. The first
+        agents have been ready since ready_at (default: now).
+        """
+        graph = {agent_name: self.dependencies[agent_name] & set(agent_names) for agent_name in agent_names}
+        sorter = TopologicalSorter(graph)
+        sorter.prepare()
+
+        while sorter.is_active():
+            ready = sorted(sorter.get_ready(), key=self.execution_order.index)
+            await self.check_interrupts(ctx, ready[0])
+            batch_ready_at, ready_at = ready_at or time.time(), None
+            ctx.current_step = ready[0]
+            if checkpoint:
+                await self.save_fields(ctx, "current_step")
+            for agent_name in ready:
+                logfire.info(f"Executing agent: {agent_name}")
+
+            if len(ready) == 1:
+                ctx = await self.execute_agent(ctx, ready[0], checkpoint, batch_ready_at)
+            else:
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [
+                            tg.create_task(self.execute_agent(ctx.model_copy(), name, checkpoint, batch_ready_at))
+                            for name in ready
+                        ]
+                except ExceptionGroup as e:
+                    # Report the first failing agent like a sequential run would
+                    raise e.exceptions[0]
+                ctx = self._merge_outputs(ctx, ready, [task.result() for task in tasks])
+
+            for agent_name in ready:
+                logfire.info(f"Completed agent: {agent_name}")
+            sorter.done(*ready)
+
+        return ctx
+
+    async def _run_path(self, ctx: Context, agent_names: list[str], ready_at: Optional[float] = None) -> Context:
+        """Run agents in dependency order; with speculation on, the retry path runs as parallel candidates."""
+        count = resolve_candidates(ctx)
+        speculative = [agent_name for agent_name in agent_names if agent_name in self.registry.retry_path]
+        if count == 1 or not speculative:
+            return await self._run_graph(ctx, agent_names, ready_at=ready_at)
+
+        # The retry path is closed downstream, so everything before it runs first
+        leading = [agent_name for agent_name in agent_names if agent_name not in speculative]
+        if leading:
+            ctx, ready_at = await self._run_graph(ctx, leading, ready_at=ready_at), None
+        return await self._run_candidates(ctx, speculative, count, ready_at)
+
+    async def _run_candidates(
+        self, ctx: Context, agent_names: list[str], count: int, ready_at: Optional[float] = None
+    ) -> Context:
+        """
+        Run count copies of a sub-graph at once and keep the first valid result.
+
+        Each copy knows its index (ctx.candidate) so agents can vary how they generate
+        (the composer samples at a different temperature). As soon as one candidate
+        passes validation the others are cancelled. Candidates do not checkpoint; only
+        the kept one is saved. When none is valid, the lowest-numbered candidate that
+        finished is kept (its feedback drives the next attempt); when all of them
+        failed, the first one's error is raised.
+        """
+        ctx.current_step = agent_names[0]
+        await self.save_fields(ctx, "current_step")
+        logfire.info(f"Running {count} candidates of {' -> '.join(agent_names)}")
+        first_run = len(ctx.agent_runs)
+
+        tasks = [
+            asyncio.create_task(
+                self._run_graph(ctx.as_candidate(index), agent_names, checkpoint=False, ready_at=ready_at)
+            )
+            for index in range(count)
+        ]
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None and self.is_valid(task.result()):
+                        winner = task.result()
+                        break
+        finally:
+            # Losers (and every candidate, if this run is cancelled) stop spending tokens
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            finished = [task.result() for task in tasks if task.exception() is None]
+            if not finished:
+                raise tasks[0].exception()
+            winner = finished[0]
+            logfire.info(f"No valid candidate among {count}")
+        else:
+            logfire.info(f"Candidate {winner.candidate + 1} of {count} is valid, cancelled {len(pending)}")
+
+        ctx = self._merge_outputs(ctx, agent_names, [winner] * len(agent_names))
+        outputs = [field for agent_name in agent_names for field in self.get_agent_outputs(agent_name)]
+        kept_runs = [run for run in ctx.agent_runs[first_run:] if run.candidate == winner.candidate]
+
+        def saved(duration: float):
+            for run in kept_runs:
+                run.persist_seconds = duration
+
+        await self.save_fields(ctx, *outputs, *AGENT_STEP_FIELDS, on_flushed=saved)
+        return ctx
+
+    def _merge_outputs(self, ctx: Context, agent_names: list[str], results: list[Context]) -> Context:
+        """Copy each branch's outputs (and feedback it set) into ctx, in the given order."""
+        feedback = ctx.feedback
+        for agent_name, result in zip(agent_names, results):
+            for field in self.get_agent_outputs(agent_name):
+                setattr(ctx, field, getattr(result, field))
+            if result.feedback != feedback:
+                ctx.feedback = result.feedback
+        ctx.current_step = agent_names[-1]
+        ctx.update_timestamp()
+        return ctx
 
     async def execute_workflow(self, ctx: Context) -> Context:
         """
         Execute the complete workflow.
 
         Follows the DAG, handles dependencies, supports feedback loops,
-        and persists state at each step.
+        and persists state at each step. A context that already holds agent outputs
+        (a workflow resumed after its worker died) continues from them: finished
+        agents are not run again.
         """
 
-        # Set initial status
-        ctx.status = WorkflowStatus.RUNNING
+        # Set initial status (a resumed workflow keeps running or retrying)
+        # A new workflow's first agents have been waiting since it was submitted
+        queued_since = ctx.created_at if ctx.status == WorkflowStatus.PENDING else None
+        if ctx.status == WorkflowStatus.PENDING:
+            ctx.status = WorkflowStatus.RUNNING
         await self.save_context(ctx)
 
         try:
-            # Execute the main workflow path
-            execution_order = self._get_execution_order()
+            # Agents read ctx.schema; contexts loaded from Redis only carry its hash
+            if not ctx.schema_loaded:
+                ctx.attach_schema(await load_schema(ctx.schema_ref))
 
-            for agent_name in execution_order:
-                logfire.info(f"Executing agent: {agent_name}")
-                ctx.current_step = agent_name
-                await self.save_context(ctx)
-                ctx = await self.execute_agent(ctx, agent_name)
-                logfire.info(f"Completed agent: {agent_name}")
+            # Execute the main workflow graph (the agents whose outputs are missing)
+            ctx = await self._run_path(ctx, self.get_resume_path(ctx), ready_at=queued_since)
 
             # Handle feedback loop if validation failed
             while self.should_retry(ctx):
                 logfire.info(f"Validation failed, retrying... (attempt {ctx.retry_count + 1})")
+                retry_path = self.get_retry_path()
                 ctx.retry_count += 1
                 ctx.status = WorkflowStatus.RETRYING
-                await self.save_context(ctx)
+                # Outputs of the retry path are stale; clearing them keeps the checkpoint exact
+                cleared = [field for agent_name in retry_path for field in self.get_agent_outputs(agent_name)]
+                for field in cleared:
+                    setattr(ctx, field, None)
+                await self.save_fields(ctx, "retry_count", "status", *cleared)
 
-                # Execute only the retry path (composer -> validator)
-                retry_path = self.get_retry_path()
-                for agent_name in retry_path:
-                    logfire.info(f"Re-executing agent: {agent_name}")
-                    ctx.current_step = agent_name
-                    await self.save_context(ctx)
-                    ctx = await self.execute_agent(ctx, agent_name)
-                    logfire.info(f"Re-completed agent: {agent_name}")
+                # Execute only the declared retry sub-graph (composer -> validator)
+                ctx = await self._run_path(ctx, retry_path)
 
             # Set final status
-            if ctx.validator_output and ctx.validator_output.validation.is_valid:
+            if self.is_valid(ctx):
                 ctx.status = WorkflowStatus.COMPLETED
                 logfire.info("Workflow completed successfully!")
             else:
                 ctx.status = WorkflowStatus.FAILED
                 logfire.info("Workflow failed after maximum retries")
 
+        except WorkflowCancelledError as e:
+            logfire.info(str(e))
+            ctx.status = WorkflowStatus.CANCELLED
+            ctx.feedback = "Cancelled"
+        except asyncio.CancelledError:
+            # The runner cancels the task of a cancelled workflow; a shutdown or a lost
+            # lease also cancels it, and then the workflow must stay resumable
+            if not await self.is_cancel_requested(str(ctx.request_id)):
+                raise
+            asyncio.current_task().uncancel()
+            logfire.info(f"Workflow {ctx.request_id} cancelled while running")
+            ctx.status = WorkflowStatus.CANCELLED
+            ctx.feedback = "Cancelled"
         except Exception as e:
             logfire.info(f"Workflow execution error: {e}")
             ctx.status = WorkflowStatus.FAILED
             ctx.feedback = f"Execution error: {str(e)}"
 
-        finally:
-            # Always save final context
-            ctx.update_timestamp()
-            await self.save_context(ctx)
+        # Always save the whole final context (agents may have failed mid-update). A
+        # cancelled run (shutdown or lost lease) does not get here: its state stays at
+        # the last checkpoint for the worker that resumes it.
+        ctx.update_timestamp()
+        await self.save_context(ctx)
+        # The persist_seconds of the last runs are only known once the final state is
+        # flushed; one more write of agent_runs stores them
+        await self.save_fields(ctx, "agent_runs")
+        await self.state_writer.flush()
 
         return ctx
 
+    def get_resume_path(self, ctx: Context) -> list[str]:
+        """
+        Agents still to run for a context, in execution order.
+
+        An agent is done when all the fields it provides are set; agents downstream of
+        one that is not done run again too.
+        """
+        return self.registry.with_downstream(
+            agent_name
+            for agent_name in self.execution_order
+            if any(getattr(ctx, field, None) is None for field in self.get_agent_outputs(agent_name))
+        )
+
     def _get_execution_order(self) -> list[str]:
         """Get the topological order of agent execution."""
-        # For this simple DAG, we can use a fixed order
-        # In a more complex scenario, you'd implement topological sorting
-        return ["planner", "mapper", "composer", "validator"]
-
-    async def get_workflow_status(self, request_id: str) -> Optional[dict]:
-        """Get the current status of a workflow."""
-        ctx = await self.load_context(request_id)
-        if not ctx:
-            return None
+        return list(self.execution_order)
 
-        return {
-            "request_id": str(ctx.request_id),
-            "status": ctx.status.value,
-            "current_step": ctx.current_step,
-            "retry_count": ctx.retry_count,
-            "created_at": ctx.created_at,
-            "updated_at": ctx.updated_at,
-            "feedback": ctx.feedback,
-            "has_planner_output": ctx.planner_output is not None,
-            "has_mapper_output": ctx.mapper_output is not None,
-            "has_composer_output": ctx.composer_output is not None,
-            "has_validator_output": ctx.validator_output is not None,
-            "sql_query": ctx.composer_output.sql_query if ctx.composer_output else None,
-            "is_valid": ctx.validator_output.validation.is_valid if ctx.validator_output else None,
-        }
+
+def resolve_pacing(ctx: Context) -> AgentPacing:
+    """Pacing of a workflow: its own, or the deployment default."""
+    return ctx.pacing or AgentPacing(workflow_config.AGENT_PACING)
+
+
+def resolve_candidates(ctx: Context) -> int:
+    """Speculative candidates per attempt: the workflow's own count, or the deployment default."""
+    count = ctx.candidates or workflow_config.WORKFLOW_CANDIDATES
+    return max(1, min(count, workflow_config.WORKFLOW_MAX_CANDIDATES))
+
+
+def displayed_status(status: dict, now: Optional[float] = None) -> dict:
+    """
+    Status as the web UI shows it.
+
+    Workflows paced by the UI run at full speed; here each step is revealed only after
+    the previous one was shown for AGENT_MIN_STEP_SECONDS, so a fast workflow still
+    walks through every step on screen. Other workflows are returned unchanged.
+    """
+    if status.get("pacing") != AgentPacing.UI.value:
+        return status
+
+    # Agents in the order they run, as registered
+    steps = get_agent_registry().execution_order
+    finished = status["status"] in (
+        WorkflowStatus.COMPLETED.value,
+        WorkflowStatus.FAILED.value,
+        WorkflowStatus.CANCELLED.value,
+    )
+    if finished:
+        reached = len(steps)
+    elif status.get("current_step") in steps:
+        reached = steps.index(status["current_step"])
+    else:
+        return status
+
+    min_step = workflow_config.AGENT_MIN_STEP_SECONDS
+    elapsed = (now or time.time()) - status["created_at"]
+    if min_step <= 0 or elapsed // min_step >= reached:
+        return status
+    shown = int(elapsed // min_step)
+
+    # Still revealing: the shown step is running and later outputs are hidden
+    hidden = steps[shown:]
+    displayed = {**status, "status": WorkflowStatus.RUNNING.value, "current_step": hidden[0], "feedback": None}
+    for step in hidden:
+        if f"has_{step}_output" in displayed:
+            displayed[f"has_{step}_output"] = False
+    if "composer" in hidden:
+        displayed["sql_query"] = None
+    if "validator" in hidden:
+        displayed["is_valid"] = None
+    return displayed
+
+
+# Shared by the status endpoints, which never need an orchestrator
+workflow_reader = WorkflowReader()
 
 
 # Convenience functions for external use
@@ -234,22 +1037,40 @@ def create_orchestrator() -> WorkflowOrchestrator:
     return WorkflowOrchestrator()
 
 
-async def execute_workflow(query: str, schema: dict, user_id: Optional[str] = None) -> Context:
-    """Execute a complete workflow with the given query and schema."""
-    orchestrator = create_orchestrator()
+async def execute_workflow(
+    query: str, schema: dict, user_id: Optional[str] = None, pacing: Optional[AgentPacing] = None
+) -> Context:
+    """
+    Execute a complete workflow with the given query and schema.
+
+    The workflow is registered in the run queue and leased by this process, so another
+    worker resumes it if this one dies before it finishes.
+    """
+    from app.workflow_runner import workflow_runner
 
     # Create initial context
     ctx = Context(
         query=query,
         schema=schema,
         user_id=user_id,
+        pacing=pacing,
     )
 
     # Execute workflow
-    return await orchestrator.execute_workflow(ctx)
+    return await workflow_runner.run(ctx)
 
 
-async def get_workflow_status(request_id: str) -> Optional[dict]:
+async def get_workflow_status(request_id: str, fields: list[str] = STATUS_FIELDS) -> Optional[dict]:
     """Get the status of a workflow by request ID."""
-    orchestrator = create_orchestrator()
-    return await orchestrator.get_workflow_status(request_id)
+    return await workflow_reader.get_workflow_status(request_id, fields)
+
+
+async def list_workflows(
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    status: Optional[WorkflowStatus] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> tuple[list[dict], Optional[str]]:
+    """List workflows newest first, filtered by user, session and status."""
+    return await workflow_reader.list_workflows(user_id, session_id, status, cursor, limit)
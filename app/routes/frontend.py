@@ -78,7 +78,10 @@ async def start_workflow_ui(request: Request, query: str = Form(...), schema: st
     try:
         import json
 
-        from app.orchestrator import execute_workflow
+        from app.config import workflow_config
+        from app.models import AgentPacing, Context, WorkflowPriority
+        from app.services.admission import QueueFullError
+        from app.workflow_runner import submit_workflow
 
         # Parse the schema JSON
         try:
@@ -88,8 +91,19 @@ async def start_workflow_ui(request: Request, query: str = Form(...), schema: st
                 "partials/workflow_panel.html", {"request": request, "error": "Invalid JSON schema format"}
             )
 
-        # Start the workflow
-        ctx = await execute_workflow(query=query, schema=schema_dict)
+        # Queue the workflow; the panel polls its steps while a worker runs it
+        ctx = Context(
+            query=query,
+            schema=schema_dict,
+            pacing=AgentPacing(workflow_config.AGENT_UI_PACING),
+            priority=WorkflowPriority.HIGH,
+        )
+        try:
+            await submit_workflow(ctx)
+        except QueueFullError as e:
+            return templates.TemplateResponse(
+                "partials/workflow_panel.html", {"request": request, "error": str(e)}, status_code=429
+            )
 
         return templates.TemplateResponse(
             "partials/workflow_panel.html", {"request": request, "request_id": str(ctx.request_id)}
@@ -105,13 +119,14 @@ async def start_workflow_ui(request: Request, query: str = Form(...), schema: st
 async def get_workflow_steps_ui(request: Request, request_id: str):
     """Get workflow steps for UI display."""
     try:
-        from app.orchestrator import get_workflow_status
+        from app.orchestrator import displayed_status, get_workflow_status
 
         status_info = await get_workflow_status(request_id)
         if not status_info:
             return templates.TemplateResponse(
                 "partials/workflow_steps.html", {"request": request, "steps": [], "error": "Workflow not found"}
             )
+        status_info = displayed_status(status_info)
 
         # Create steps data for template
         step_names = ["planner", "mapper", "composer", "validator"]
@@ -138,7 +153,10 @@ async def get_workflow_steps_ui(request: Request, request_id: str):
                 }
             )
 
-        return templates.TemplateResponse("partials/workflow_steps.html", {"request": request, "steps": steps})
+        return templates.TemplateResponse(
+            "partials/workflow_steps.html",
+            {"request": request, "steps": steps, "queue_position": status_info.get("queue_position")},
+        )
 
     except Exception as e:
         return templates.TemplateResponse(
@@ -153,7 +171,7 @@ def _determine_step_status_ui(
     """Determine the status of an individual step for UI."""
     step_order = ["planner", "mapper", "composer", "validator"]
 
-    if workflow_status == "failed":
+    if workflow_status in ["failed", "cancelled"]:
         return "failed"
 
     if not current_step:
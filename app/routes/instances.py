@@ -227,3 +227,59 @@ async def get_schema(connection_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get database schema: {str(e)}"
         )
+
+
+@router.get("/instances/{connection_id}/statistics")
+async def get_statistics(connection_id: str, refresh: bool = False):
+    """
+    Get cached table statistics (row, null and distinct estimates) for a database connection.
+    """
+    try:
+        connection = await get_data(connection_id, DatabaseConnection)
+
+        from app.services.sql_runner import get_table_statistics
+
+        statistics = await get_table_statistics(connection, refresh=refresh)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"status": "ok", "statistics": statistics.model_dump(mode="json")},
+        )
+
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Database connection with ID {connection_id} not found"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get table statistics: {str(e)}"
+        )
+
+
+@router.get("/instances/{connection_id}/index-advice")
+async def get_index_suggestions(connection_id: str, refresh: bool = False):
+    """
+    Get CREATE INDEX suggestions built from the connection's query log.
+
+    The analysis EXPLAINs logged queries, so it is cached; pass refresh=true to rerun it.
+    """
+    try:
+        connection = await get_data(connection_id, DatabaseConnection)
+
+        from app.services.index_advisor import get_index_advice
+
+        advice = await get_index_advice(connection, refresh=refresh)
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"status": "ok", "advice": advice.model_dump(mode="json")},
+        )
+
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Database connection with ID {connection_id} not found"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to build index advice: {str(e)}"
+        )
@@ -1,7 +1,16 @@
+import time
+
 from fastapi import APIRouter
 
-from app.models import QueryRequest, QueryResponse
-from app.services.sql_runner import ConnectionNotFoundError, SQLExecutionError, run_sql_query
+from app.models import QueryRequest, QueryResponse, TransactionRequest, TransactionResponse
+from app.services.result_encoder import query_response, transaction_response
+from app.services.sql_runner import (
+    ConnectionNotFoundError,
+    SQLExecutionError,
+    TransactionAbortedError,
+    run_sql_query,
+    run_sql_transaction,
+)
 
 router = APIRouter()
 
@@ -17,8 +26,8 @@ async def execute_sql_query(query_request: QueryRequest):
         # Execute the query
         result = await run_sql_query(query_request.connection_id, query_request.sql)
 
-        # Return successful response
-        return QueryResponse(status="ok", data=result, error=None)
+        # Encode driver rows straight to JSON, skipping response_model validation
+        return query_response(status="ok", data=result)
 
     except ConnectionNotFoundError as e:
         # Connection not found - return error response instead of HTTP exception
@@ -33,6 +42,36 @@ async def execute_sql_query(query_request: QueryRequest):
         return QueryResponse(status="error", data=None, error=f"Unexpected error: {str(e)}")
 
 
+@router.post("/query/transaction", response_model=TransactionResponse)
+async def execute_sql_transaction(transaction_request: TransactionRequest):
+    """
+    Execute an ordered list of statements in a single transaction.
+
+    All statements share one pooled connection and commit together. Statements marked
+    optional run inside a savepoint; any other failure rolls back the whole transaction.
+    """
+    start_time = time.time()
+
+    def elapsed() -> float:
+        return round((time.time() - start_time) * 1000, 2)
+
+    try:
+        results = await run_sql_transaction(transaction_request.connection_id, transaction_request.statements)
+        return transaction_response(status="ok", results=results, error=None, execution_time_ms=elapsed())
+
+    except ConnectionNotFoundError as e:
+        return TransactionResponse(status="error", error=f"Connection not found: {str(e)}", execution_time_ms=elapsed())
+
+    except TransactionAbortedError as e:
+        return transaction_response(status="error", results=e.results, error=str(e), execution_time_ms=elapsed())
+
+    except SQLExecutionError as e:
+        return TransactionResponse(status="error", error=f"SQL execution failed: {str(e)}", execution_time_ms=elapsed())
+
+    except Exception as e:
+        return TransactionResponse(status="error", error=f"Unexpected error: {str(e)}", execution_time_ms=elapsed())
+
+
 @router.post("/instances/{connection_id}/query", response_model=QueryResponse)
 async def execute_sql_query_by_connection(connection_id: str, sql_query: dict):
     """
@@ -49,8 +88,8 @@ async def execute_sql_query_by_connection(connection_id: str, sql_query: dict):
         # Execute the query
         result = await run_sql_query(connection_id, sql_query["sql"])
 
-        # Return successful response
-        return QueryResponse(status="ok", data=result, error=None)
+        # Encode driver rows straight to JSON, skipping response_model validation
+        return query_response(status="ok", data=result)
 
     except ConnectionNotFoundError as e:
         # Connection not found - return error response
@@ -1,16 +1,24 @@
 import json
+import time
 from datetime import datetime
 from typing import Optional
 
-from app.orchestrator import execute_workflow, get_workflow_status
-from fastapi import APIRouter, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse
+import logfire
+from app.config import workflow_config
+from app.models import AgentPacing, AgentRun, WorkflowPriority, WorkflowStatus
+from app.orchestrator import STEP_FIELDS, displayed_status, get_workflow_status, list_workflows
+from app.services.admission import QueueFullError, ensure_capacity
+from fastapi import APIRouter, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
+# Seconds clients are told to wait when the admission queue is full
+QUEUE_FULL_RETRY_AFTER = 5
+
 
 # Add custom filters for workflow templates
 def timestamp_to_datetime(timestamp: float) -> str:
@@ -39,15 +47,65 @@ class WorkflowRequest(BaseModel):
     query: str
     schema: dict
     user_id: Optional[str] = None
+    # Defaults to AGENT_PACING (none unless the deployment sets it)
+    pacing: Optional[AgentPacing] = None
+    # Admission class while waiting for a slot
+    priority: WorkflowPriority = WorkflowPriority.NORMAL
+    # Composer candidates validated in parallel per attempt (defaults to WORKFLOW_CANDIDATES)
+    candidates: Optional[int] = None
+    # End-to-end time budget from submission (defaults to WORKFLOW_DEADLINE_SECONDS)
+    timeout_seconds: Optional[float] = None
+
+
+class WorkflowBatchRequest(BaseModel):
+    connection_id: str
+    queries: list[str]
+    user_id: Optional[str] = None
+    # Batches are background work: they wait behind interactive workflows by default
+    priority: WorkflowPriority = WorkflowPriority.LOW
+    # Workflows of the batch queued or running at a time (defaults to WORKFLOW_BATCH_CONCURRENCY)
+    concurrency: Optional[int] = None
+    candidates: Optional[int] = None
+    # Time budget of each workflow from its submission
+    timeout_seconds: Optional[float] = None
 
 
 class WorkflowResponse(BaseModel):
     request_id: str
 
 
+class WorkflowCancelResponse(BaseModel):
+    request_id: str
+    # "cancelled", or the current status while its worker is stopping it
+    status: str
+
+
 class WorkflowStatusResponse(BaseModel):
     status: str
     current: Optional[str]
+    # Position in the admission queue while pending (1 = next to run)
+    queue_position: Optional[int] = None
+
+
+class WorkflowSummary(BaseModel):
+    request_id: str
+    query: str
+    status: str
+    current_step: Optional[str] = None
+    retry_count: int
+    created_at: float
+    updated_at: float
+    feedback: Optional[str] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+    sql_query: Optional[str] = None
+    is_valid: Optional[bool] = None
+
+
+class WorkflowListResponse(BaseModel):
+    items: list[WorkflowSummary]
+    # Pass back as ?cursor= to get the next page; None on the last page
+    next_cursor: Optional[str] = None
 
 
 class StepOutput(BaseModel):
@@ -56,24 +114,111 @@ class StepOutput(BaseModel):
     output: Optional[dict] = None
     started_at: Optional[float] = None
     finished_at: Optional[float] = None
+    # Every execution of the agent (retries, speculative candidates) with timings and token usage
+    runs: list[AgentRun] = []
 
 
 @router.post("/workflows")
 async def start_workflow(request: WorkflowRequest):
-    """Start a new workflow and return the request_id or HTML panel."""
+    """Queue a new workflow and return its request_id; poll the status endpoints for progress."""
     try:
-        # Execute workflow asynchronously
-        ctx = await execute_workflow(query=request.query, schema=request.schema, user_id=request.user_id)
+        from app.models import Context
+        from app.workflow_runner import submit_workflow
+
+        ctx = Context(
+            query=request.query,
+            schema=request.schema,
+            user_id=request.user_id,
+            pacing=request.pacing,
+            priority=request.priority,
+            candidates=request.candidates,
+            deadline=time.time() + request.timeout_seconds if request.timeout_seconds else None,
+        )
+
+        # A worker runs it once admitted; the API process only enqueues
+        await submit_workflow(ctx)
 
-        # Check if this is an HTMX request
-        # For HTMX requests, return HTML
-        # For API requests, return JSON
         return WorkflowResponse(request_id=str(ctx.request_id))
 
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start workflow: {str(e)}")
 
 
+@router.post("/workflows/batch")
+async def start_workflow_batch(request: WorkflowBatchRequest):
+    """
+    Run many queries against one database connection.
+
+    The schema is introspected once for the whole batch. The response streams one JSON
+    line per workflow as it finishes (in completion order, with its index in queries),
+    then a {"summary": ...} line with counts and latency statistics.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(request.queries) > workflow_config.WORKFLOW_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries ({len(request.queries)}); at most {workflow_config.WORKFLOW_BATCH_MAX_QUERIES}",
+        )
+
+    try:
+        from app.models import DatabaseConnection
+        from app.services.redis_ops import get_data
+        from app.services.sql_runner import get_database_schema, get_table_statistics
+        from app.workflow_batch import run_batch
+
+        try:
+            connection = await get_data(request.connection_id, DatabaseConnection)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Database connection not found")
+        schema_dict = await get_database_schema(connection)
+
+        # Table statistics are a hint for the agents; the workflows run without them
+        try:
+            table_statistics = (await get_table_statistics(connection)).to_prompt_dict()
+        except Exception as e:
+            logfire.info(f"Warning: could not collect table statistics of {connection.id}: {str(e)}")
+            table_statistics = None
+
+        results = run_batch(
+            request.queries,
+            schema_dict,
+            table_statistics=table_statistics,
+            concurrency=request.concurrency,
+            user_id=request.user_id,
+            priority=request.priority,
+            candidates=request.candidates,
+            timeout_seconds=request.timeout_seconds,
+        )
+        lines = (json.dumps(result) + "\n" async for result in results)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start batch: {str(e)}")
+
+
+@router.get("/workflows", response_model=WorkflowListResponse)
+async def list_workflows_endpoint(
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    status: Optional[WorkflowStatus] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """List workflows newest first, optionally filtered by user, session and status."""
+    try:
+        items, next_cursor = await list_workflows(user_id, session_id, status, cursor, limit)
+        return WorkflowListResponse(items=items, next_cursor=next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list workflows: {str(e)}")
+
+
 @router.post("/workflows/start-htmx", response_class=HTMLResponse)
 async def start_workflow_htmx(request: Request, query: str = Form(...), schema: str = Form(...)):
     """Start workflow for HTMX frontend - expects form data."""
@@ -96,28 +241,31 @@ async def start_workflow_htmx(request: Request, query: str = Form(...), schema:
             )
 
         # Create context immediately and save to Redis
-        import asyncio
-
         from app.models import Context
-        from app.orchestrator import create_orchestrator
+        from app.workflow_runner import submit_workflow
 
-        ctx = Context(query=query, schema=schema_dict)
-        orchestrator = create_orchestrator()
+        ctx = Context(
+            query=query,
+            schema=schema_dict,
+            pacing=AgentPacing(workflow_config.AGENT_UI_PACING),
+            priority=WorkflowPriority.HIGH,
+        )
 
-        # Save initial context
-        await orchestrator.save_context(ctx)
+        # Save initial context and queue it; a worker runs it in the background
+        await submit_workflow(ctx)
 
         request_id_str = str(ctx.request_id)
         print(f"DEBUG: Generated request_id: {request_id_str}")
 
-        # Start workflow execution in background (fire and forget)
-        asyncio.create_task(orchestrator.execute_workflow(ctx))
-
         # Return template immediately with request_id
         return templates.TemplateResponse(
             "partials/workflow_panel.html", {"request": request, "request_id": request_id_str}
         )
 
+    except QueueFullError as e:
+        return templates.TemplateResponse(
+            "partials/workflow_panel.html", {"request": request, "error": str(e)}, status_code=429
+        )
     except Exception as e:
         print(f"DEBUG: Error in start_workflow_htmx: {e}")
         import traceback
@@ -140,10 +288,13 @@ async def start_workflow_with_connection(request: Request, query: str = Form(...
                 "partials/workflow_panel.html", {"request": request, "error": "Missing query or connection ID"}
             )
 
+        # Refuse before the schema introspection when nothing more can be queued
+        await ensure_capacity()
+
         # Get schema from database connection
         from app.models import DatabaseConnection
         from app.services.redis_ops import get_data
-        from app.services.sql_runner import get_database_schema
+        from app.services.sql_runner import get_database_schema, get_table_statistics
 
         try:
             connection = await get_data(connection_id, DatabaseConnection)
@@ -160,28 +311,39 @@ async def start_workflow_with_connection(request: Request, query: str = Form(...
             )
 
         # Create context immediately and save to Redis
-        import asyncio
-
         from app.models import Context
-        from app.orchestrator import create_orchestrator
+        from app.workflow_runner import submit_workflow
 
-        ctx = Context(query=query, schema=schema_dict)
-        orchestrator = create_orchestrator()
+        # Table statistics are a hint for the agents; the workflow runs without them
+        try:
+            table_statistics = (await get_table_statistics(connection)).to_prompt_dict()
+        except Exception as e:
+            logfire.info(f"Warning: could not collect table statistics of {connection.id}: {str(e)}")
+            table_statistics = None
+
+        ctx = Context(
+            query=query,
+            schema=schema_dict,
+            table_statistics=table_statistics,
+            pacing=AgentPacing(workflow_config.AGENT_UI_PACING),
+            priority=WorkflowPriority.HIGH,
+        )
 
-        # Save initial context
-        await orchestrator.save_context(ctx)
+        # Save initial context and queue it; a worker runs it in the background
+        await submit_workflow(ctx)
 
         request_id_str = str(ctx.request_id)
         print(f"DEBUG: Generated request_id: {request_id_str}")
 
-        # Start workflow execution in background (fire and forget)
-        asyncio.create_task(orchestrator.execute_workflow(ctx))
-
         # Return template immediately with request_id
         return templates.TemplateResponse(
             "partials/workflow_panel.html", {"request": request, "request_id": request_id_str}
         )
 
+    except QueueFullError as e:
+        return templates.TemplateResponse(
+            "partials/workflow_panel.html", {"request": request, "error": str(e)}, status_code=429
+        )
     except Exception as e:
         print(f"DEBUG: Error in start_workflow_with_connection: {e}")
         import traceback
@@ -192,6 +354,31 @@ async def start_workflow_with_connection(request: Request, query: str = Form(...
         )
 
 
+@router.post("/workflows/{request_id}/cancel", response_model=WorkflowCancelResponse)
+async def cancel_workflow_endpoint(request_id: str):
+    """
+    Cancel a workflow on whichever worker runs it.
+
+    A workflow waiting for admission is cancelled at once. A running one is stopped by
+    its worker and its status becomes cancelled shortly after (before its next agent at
+    the latest). Cancelling a cancelled workflow is a no-op.
+    """
+    try:
+        from app.workflow_runner import cancel_workflow
+
+        status = await cancel_workflow(request_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Workflow not found")
+        if status in (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED):
+            raise HTTPException(status_code=409, detail=f"Workflow already {status.value}")
+
+        return WorkflowCancelResponse(request_id=request_id, status=status.value)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel workflow: {str(e)}")
+
+
 @router.get("/workflows/{request_id}/status", response_model=WorkflowStatusResponse)
 async def get_status(request_id: str):
     """Get the overall workflow status."""
@@ -200,7 +387,11 @@ async def get_status(request_id: str):
         if not status_info:
             raise HTTPException(status_code=404, detail="Workflow not found")
 
-        return WorkflowStatusResponse(status=status_info["status"], current=status_info.get("current_step"))
+        return WorkflowStatusResponse(
+            status=status_info["status"],
+            current=status_info.get("current_step"),
+            queue_position=status_info.get("queue_position"),
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -211,13 +402,14 @@ async def get_status(request_id: str):
 async def get_workflow_steps(request_id: str):
     """Get detailed step information for a workflow."""
     try:
-        status_info = await get_workflow_status(request_id)
+        status_info = await get_workflow_status(request_id, STEP_FIELDS)
         if not status_info:
             raise HTTPException(status_code=404, detail="Workflow not found")
 
         # Define the workflow steps in order
         step_names = ["planner", "mapper", "composer", "validator"]
         steps = []
+        agent_runs = [AgentRun.model_validate(run) for run in status_info.get("agent_runs") or []]
 
         current_step = status_info.get("current_step")
         workflow_status = status_info.get("status", "pending")
@@ -227,14 +419,19 @@ async def get_workflow_steps(request_id: str):
 
             output = _get_step_output(step_name, status_info)
 
-            # For simplicity, we'll use created_at and updated_at from the workflow
-            # In a real implementation, you'd want to track individual step timings
-            started_at = status_info.get("created_at") if step_status in ["running", "done"] else None
-            finished_at = status_info.get("updated_at") if step_status == "done" else None
+            # From the first execution of the agent to the end of the last one
+            runs = [run for run in agent_runs if run.agent == step_name]
+            started_at = runs[0].started_at if runs else None
+            finished_at = runs[-1].finished_at if runs and step_status == "done" else None
 
             steps.append(
                 StepOutput(
-                    name=step_name, status=step_status, output=output, started_at=started_at, finished_at=finished_at
+                    name=step_name,
+                    status=step_status,
+                    output=output,
+                    started_at=started_at,
+                    finished_at=finished_at,
+                    runs=runs,
                 )
             )
 
@@ -260,6 +457,7 @@ async def get_workflow_steps_htmx(request: Request, request_id: str):
             )
 
         print(f"DEBUG: Found workflow status: {status_info}")
+        status_info = displayed_status(status_info)
 
         # Create steps data for template
         step_names = ["planner", "mapper", "composer", "validator"]
@@ -295,7 +493,8 @@ async def get_workflow_steps_htmx(request: Request, request_id: str):
         print(f"DEBUG: Template context: request={request}, steps={steps}")
 
         template_response = templates.TemplateResponse(
-            "partials/workflow_steps.html", {"request": request, "steps": steps}
+            "partials/workflow_steps.html",
+            {"request": request, "steps": steps, "queue_position": status_info.get("queue_position")},
         )
         print(f"DEBUG: Template response created successfully")
 
@@ -316,7 +515,7 @@ def _determine_step_status(step_name: str, current_step: Optional[str], workflow
     """Determine the status of an individual step."""
     step_order = ["planner", "mapper", "composer", "validator"]
 
-    if workflow_status == "failed":
+    if workflow_status in ["failed", "cancelled"]:
         return "failed"
 
     if not current_step:
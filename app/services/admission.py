@@ -0,0 +1,179 @@
+"""
+Admission control for workflows.
+
+New workflows wait in a bounded pending queue (a sorted set ordered by priority
+class, then arrival) and are admitted to the worker pool only while fewer than
+WORKFLOW_MAX_RUNNING workflows run in total and fewer than
+WORKFLOW_MAX_RUNNING_PER_USER run for their user. When WORKFLOW_MAX_PENDING
+workflows are already waiting, new ones are rejected at once (HTTP 429) instead
+of piling up behind an overloaded LLM provider.
+
+Running workflows are tracked in sorted sets scored by when their entry expires;
+workers push the expiry forward with their lease heartbeats, so the slots of a
+worker that died free up on their own. Every key shares one hash tag, so each
+admission is one MULTI. Admission runs under a short lock, whenever a workflow
+is submitted or finishes and periodically in every worker.
+"""
+
+import time
+from collections.abc import Awaitable, Callable
+from typing import Optional
+from uuid import uuid4
+
+from app.config import workflow_config
+from app.models import Context, WorkflowPriority
+from app.services.redis import get_binary_redis, release_lock
+
+ADMISSION_TAG = "{workflows:admission}"
+PENDING_KEY = f"{ADMISSION_TAG}:pending"
+RUNNING_KEY = f"{ADMISSION_TAG}:running"
+# request_id -> user_id of pending and running workflows
+USERS_KEY = f"{ADMISSION_TAG}:users"
+ADMISSION_LOCK_KEY = f"{ADMISSION_TAG}:lock"
+ADMISSION_LOCK_TTL = 5
+# An admitted workflow keeps its slot this long before a worker picks it up
+ADMITTED_SLOT_TTL = 300
+# Pending workflows looked at per admission round (users at their cap are skipped)
+ADMISSION_SCAN = 500
+
+# Classes are far apart so arrival time (in ms) only orders workflows within a class
+PRIORITY_WEIGHTS = {WorkflowPriority.HIGH: 0, WorkflowPriority.NORMAL: 1, WorkflowPriority.LOW: 2}
+PRIORITY_STRIDE = 10**13
+
+
+class QueueFullError(Exception):
+    """The pending queue is full; the caller should retry later."""
+
+
+def user_running_key(user_id: str) -> str:
+    return f"{ADMISSION_TAG}:running:user:{user_id}"
+
+
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def priority_score(priority: WorkflowPriority, now: Optional[float] = None) -> float:
+    return PRIORITY_WEIGHTS[priority] * PRIORITY_STRIDE + int((now or time.time()) * 1000)
+
+
+async def ensure_capacity():
+    """
+    Fail fast when no more workflows can wait.
+
+    Raises:
+        QueueFullError: If WORKFLOW_MAX_PENDING workflows are pending
+    """
+    if await get_binary_redis().zcard(PENDING_KEY) >= workflow_config.WORKFLOW_MAX_PENDING:
+        raise QueueFullError(f"Too many workflows waiting ({workflow_config.WORKFLOW_MAX_PENDING}); try again shortly")
+
+
+async def enqueue(ctx: Context):
+    """Add a stored workflow to the pending queue (after ensure_capacity)."""
+    request_id = str(ctx.request_id)
+    async with get_binary_redis().pipeline(transaction=True) as pipe:
+        pipe.zadd(PENDING_KEY, {request_id: priority_score(ctx.priority, ctx.created_at)})
+        if ctx.user_id:
+            pipe.hset(USERS_KEY, request_id, ctx.user_id)
+        await pipe.execute()
+
+
+async def queue_position(request_id: str) -> Optional[int]:
+    """1-based position of a workflow in the pending queue, or None once admitted."""
+    rank = await get_binary_redis().zrank(PENDING_KEY, request_id)
+    return rank + 1 if rank is not None else None
+
+
+async def withdraw(request_id: str) -> bool:
+    """Take a workflow out of the pending queue; False if it was not waiting there."""
+    redis = get_binary_redis()
+    if not await redis.zrem(PENDING_KEY, request_id):
+        # Admitted: its user is needed until its slot is released
+        return False
+    await redis.hdel(USERS_KEY, request_id)
+    return True
+
+
+async def hold(request_id: str, ttl: float):
+    """Take or keep a running slot for a workflow for ttl more seconds."""
+    redis = get_binary_redis()
+    user_id = _decode(await redis.hget(USERS_KEY, request_id))
+    expires_at = time.time() + ttl
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zadd(RUNNING_KEY, {request_id: expires_at})
+        if user_id:
+            pipe.zadd(user_running_key(user_id), {request_id: expires_at})
+        await pipe.execute()
+
+
+async def release(request_id: str):
+    """Free the slot of a finished workflow."""
+    redis = get_binary_redis()
+    user_id = _decode(await redis.hget(USERS_KEY, request_id))
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(RUNNING_KEY, request_id)
+        pipe.zrem(PENDING_KEY, request_id)
+        pipe.hdel(USERS_KEY, request_id)
+        if user_id:
+            pipe.zrem(user_running_key(user_id), request_id)
+        await pipe.execute()
+
+
+async def admit(start_job: Callable[[str], Awaitable[None]]) -> int:
+    """
+    Move pending workflows into free slots, best priority first; start_job queues one
+    for the workers. Returns how many were admitted (0 if another process is admitting).
+    """
+    redis = get_binary_redis()
+    token = uuid4().hex
+    if not await redis.set(ADMISSION_LOCK_KEY, token, nx=True, ex=ADMISSION_LOCK_TTL):
+        return 0
+
+    try:
+        now = time.time()
+        async with redis.pipeline(transaction=False) as pipe:
+            # Slots of workflows whose worker stopped heartbeating
+            pipe.zremrangebyscore(RUNNING_KEY, "-inf", now)
+            pipe.zcard(RUNNING_KEY)
+            pipe.zrange(PENDING_KEY, 0, ADMISSION_SCAN - 1)
+            _, running, pending = await pipe.execute()
+        free = workflow_config.WORKFLOW_MAX_RUNNING - running
+        if free <= 0 or not pending:
+            return 0
+
+        pending = [_decode(request_id) for request_id in pending]
+        users = [_decode(user_id) for user_id in await redis.hmget(USERS_KEY, pending)]
+        user_running: dict[str, int] = {}
+        distinct_users = list(dict.fromkeys(user_id for user_id in users if user_id))
+        if distinct_users:
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_id in distinct_users:
+                    pipe.zremrangebyscore(user_running_key(user_id), "-inf", now)
+                    pipe.zcard(user_running_key(user_id))
+                counts = await pipe.execute()
+            user_running = dict(zip(distinct_users, counts[1::2]))
+
+        admitted = 0
+        for request_id, user_id in zip(pending, users):
+            if admitted == free:
+                break
+            if user_id and user_running[user_id] >= workflow_config.WORKFLOW_MAX_RUNNING_PER_USER:
+                # Stays in line; other users' workflows go ahead
+                continue
+            # Queue the job first: if this process dies before the MULTI, the workflow is
+            # admitted again and the lease keeps it from running twice
+            await start_job(request_id)
+            expires_at = now + ADMITTED_SLOT_TTL
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(PENDING_KEY, request_id)
+                pipe.zadd(RUNNING_KEY, {request_id: expires_at})
+                if user_id:
+                    pipe.zadd(user_running_key(user_id), {request_id: expires_at})
+                await pipe.execute()
+            if user_id:
+                user_running[user_id] += 1
+            admitted += 1
+        return admitted
+    finally:
+        # A pass that outlived the lock must not release the next holder's
+        await release_lock(redis, ADMISSION_LOCK_KEY, token)
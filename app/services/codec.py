@@ -0,0 +1,133 @@
+"""
+Versioned serialization of models stored in Redis.
+
+Every encoded payload starts with a two byte header: MAGIC (0xFF, which never
+starts a UTF-8 JSON document) followed by the format id of the codec that wrote
+it. Payloads without the header are legacy JSON written before codecs existed,
+so they are always readable. New formats are added with register_codec under a
+new id; ids already written to Redis must never be reused.
+"""
+
+from typing import Optional, Protocol
+
+import msgpack
+import orjson
+from pydantic import BaseModel
+
+from app.config import cache_config
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+MAGIC = 0xFF
+
+FORMAT_MSGPACK = 1
+FORMAT_MSGPACK_ZSTD = 2
+
+ZSTD_LEVEL = 3
+
+
+class Codec(Protocol):
+    name: str
+    format_id: int
+
+    def encode(self, data: dict) -> bytes: ...
+
+    def decode(self, payload: bytes) -> dict: ...
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    format_id = FORMAT_MSGPACK
+
+    def encode(self, data: dict) -> bytes:
+        return msgpack.packb(data)
+
+    def decode(self, payload: bytes) -> dict:
+        return msgpack.unpackb(payload)
+
+
+class MsgpackZstdCodec:
+    name = "msgpack+zstd"
+    format_id = FORMAT_MSGPACK_ZSTD
+
+    def __init__(self, level: int = ZSTD_LEVEL):
+        if zstandard is None:
+            raise RuntimeError("The msgpack+zstd codec requires the 'zstandard' package")
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, data: dict) -> bytes:
+        return self._compressor.compress(msgpack.packb(data))
+
+    def decode(self, payload: bytes) -> dict:
+        return msgpack.unpackb(self._decompressor.decompress(payload))
+
+
+_codecs: dict[int, Codec] = {}
+_codecs_by_name: dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Make a codec available for reading its format id and for writing by name."""
+    _codecs[codec.format_id] = codec
+    _codecs_by_name[codec.name] = codec
+
+
+register_codec(MsgpackCodec())
+if zstandard is not None:
+    register_codec(MsgpackZstdCodec())
+
+
+def _write_codec() -> Optional[Codec]:
+    """Codec used for new writes, None for legacy JSON."""
+    name = cache_config.REDIS_CODEC
+    if name == "json":
+        return None
+    if name == "msgpack+zstd" and zstandard is None:
+        # Fall back to uncompressed msgpack when zstandard is not installed
+        name = "msgpack"
+    try:
+        return _codecs_by_name[name]
+    except KeyError:
+        raise ValueError(f"Unknown Redis codec: {name}")
+
+
+def encode_model(data: BaseModel) -> bytes:
+    """Serialize a model with the configured codec."""
+    codec = _write_codec()
+    if codec is None:
+        return data.model_dump_json().encode("utf-8")
+
+    return bytes((MAGIC, codec.format_id)) + codec.encode(data.model_dump(mode="json"))
+
+
+def _read_codec(payload: bytes, what: str) -> Codec:
+    codec = _codecs.get(payload[1])
+    if codec is None:
+        raise ValueError(f"Unsupported payload format {payload[1]} for {what}")
+    return codec
+
+
+def decode_model[T: BaseModel](payload: bytes | str, model: type[T]) -> T:
+    """Deserialize a payload written by any registered codec, or legacy JSON."""
+    if isinstance(payload, str) or not payload or payload[0] != MAGIC:
+        return model.model_validate_json(payload)
+    return model.model_validate(_read_codec(payload, model.__name__).decode(payload[2:]))
+
+
+def encode_data(data: dict) -> bytes:
+    """Serialize a JSON-compatible dict with the configured codec."""
+    codec = _write_codec()
+    if codec is None:
+        return orjson.dumps(data)
+    return bytes((MAGIC, codec.format_id)) + codec.encode(data)
+
+
+def decode_data(payload: bytes | str) -> dict:
+    """Deserialize a dict written by encode_data, or legacy JSON."""
+    if isinstance(payload, str) or not payload or payload[0] != MAGIC:
+        return orjson.loads(payload)
+    return _read_codec(payload, "dict").decode(payload[2:])
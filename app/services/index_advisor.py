@@ -0,0 +1,294 @@
+"""
+Offline index advisor.
+
+Reads the heaviest fingerprints from the query log, EXPLAINs each logged
+statement through the SQL runner and looks for sequential scans. The log keeps
+statements without their literals, so placeholders are planned as parameters
+(PostgreSQL 16+) or filled with neutral values. Filter and join columns
+of the scanned tables (resolved against the database schema) become CREATE INDEX
+suggestions, ranked by how many rows the scans read that an index would skip.
+"""
+
+import itertools
+import json
+import re
+from typing import Optional
+
+from app.models import (
+    DatabaseConnection,
+    DatabaseStatistics,
+    IndexAdvice,
+    IndexSuggestion,
+    QueryResult,
+    TableStatistics,
+)
+from app.services.query_log import top_queries
+from app.services.redis_ops import get_data, save_data
+from app.services.sql_runner import SQLExecutionError, explain_query, get_database_schema, get_table_statistics
+
+INDEX_ADVICE_TTL = 24 * 3600
+
+# Sequential scans of tables smaller than this are cheap; no index is suggested
+MIN_TABLE_ROWS = 1000
+# Selectivity assumed for a predicate when the catalog has no distinct estimate
+DEFAULT_SELECTIVITY = 0.1
+MAX_INDEX_COLUMNS = 3
+ANALYZED_QUERIES = 50
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_RELATION_RE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`]?([\w.]+)[\"`]?(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_PREDICATE_RE = re.compile(
+    r"(?:\b(\w+)\.)?\b(\w+)\s*(=|<>|!=|<=|>=|<|>|\bLIKE\b|\bILIKE\b|\bIN\b|\bBETWEEN\b)", re.IGNORECASE
+)
+_JOIN_RHS_RE = re.compile(r"=\s*(?:\b(\w+)\.)?\b([A-Za-z_]\w*)\b")
+_LIMIT_PLACEHOLDER_RE = re.compile(r"\b(?:LIMIT|OFFSET)\s+\?(?:\s*,\s*\?)?", re.IGNORECASE)
+_SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?", re.IGNORECASE)
+_NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "full", "cross", "on", "group", "order", "limit",
+    "union", "natural", "outer", "using", "having", "offset", "and", "or", "set",
+}  # fmt: skip
+
+
+def _schema_columns(schema: dict) -> dict[str, set[str]]:
+    """Map lower-cased table names to their lower-cased column names."""
+    return {
+        table.lower(): {column["name"].lower() for column in info.get("columns", [])}
+        for table, info in schema.get("tables", {}).items()
+    }
+
+
+def _relations(sql: str, known_tables: set[str]) -> dict[str, str]:
+    """Map every alias (and table name) in the FROM / JOIN clauses to its table."""
+    relations = {}
+    for match in _RELATION_RE.finditer(sql):
+        table = match.group(1).split(".")[-1].lower()
+        if table not in known_tables:
+            continue
+        relations[table] = table
+        alias = (match.group(2) or "").lower()
+        if alias and alias not in _NOT_ALIASES:
+            relations[alias] = table
+    return relations
+
+
+def _predicate_columns(sql: str, schema_columns: dict[str, set[str]]) -> dict[str, list[tuple[str, bool]]]:
+    """
+    Extract filter and join columns per table.
+
+    Returns table -> [(column, is_equality)] in order of appearance.
+    """
+    masked = _LITERAL_RE.sub("?", sql)
+    from_index = re.search(r"\bFROM\b", masked, re.IGNORECASE)
+    if from_index is None:
+        return {}
+    body = masked[from_index.start() :]
+    relations = _relations(body, set(schema_columns))
+
+    def resolve(qualifier: Optional[str], column: str) -> Optional[str]:
+        column = column.lower()
+        if qualifier:
+            table = relations.get(qualifier.lower())
+            return table if table and column in schema_columns[table] else None
+        candidates = {table for table in relations.values() if column in schema_columns[table]}
+        return candidates.pop() if len(candidates) == 1 else None
+
+    found: dict[str, list[tuple[str, bool]]] = {}
+
+    def add(table: Optional[str], column: str, is_equality: bool):
+        if table is None:
+            return
+        columns = found.setdefault(table, [])
+        if all(existing != column.lower() for existing, _ in columns):
+            columns.append((column.lower(), is_equality))
+
+    for match in _PREDICATE_RE.finditer(body):
+        qualifier, column, operator = match.groups()
+        add(resolve(qualifier, column), column, operator.lower() in ("=", "in"))
+    for match in _JOIN_RHS_RE.finditer(body):
+        qualifier, column = match.groups()
+        add(resolve(qualifier, column), column, True)
+
+    return found
+
+
+def _numbered_parameters(sql: str) -> str:
+    """Turn ? placeholders into $1, $2, ..."""
+    counter = itertools.count(1)
+    return re.sub(r"\?", lambda _: f"${next(counter)}", sql)
+
+
+def _placeholder_values(sql: str) -> str:
+    """Fill ? placeholders with values any column type compares with: 0 in LIMIT / OFFSET, '0' elsewhere."""
+    sql = _LIMIT_PLACEHOLDER_RE.sub(lambda m: m.group(0).replace("?", "0"), sql)
+    return sql.replace("?", "'0'")
+
+
+async def _explain(connection: DatabaseConnection, sql: str) -> QueryResult:
+    """EXPLAIN a logged statement, whose literals were replaced by ? placeholders."""
+    if connection.db_type.value == "postgresql":
+        try:
+            return await explain_query(connection, _numbered_parameters(sql), generic=True)
+        except SQLExecutionError:
+            # Before PostgreSQL 16; '0' only fails for columns such as timestamps
+            pass
+    return await explain_query(connection, _placeholder_values(sql))
+
+
+def _postgresql_scans(plan: dict, scans: dict[str, Optional[float]]) -> None:
+    """Walk a JSON plan collecting Seq Scan nodes and their estimated output rows."""
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name"):
+        table = plan["Relation Name"].lower()
+        scans[table] = plan.get("Plan Rows")
+    for child in plan.get("Plans", []):
+        _postgresql_scans(child, scans)
+
+
+def _sequential_scans(db_type: str, plan_rows: list, columns: list[str], relations: dict[str, str]) -> dict:
+    """
+    Find tables read with a full scan.
+
+    Returns table -> rows returned by the scan when the planner reports them (PostgreSQL),
+    rows examined (MySQL) or None (SQLite).
+    """
+    scans: dict[str, Optional[float]] = {}
+
+    if db_type == "postgresql":
+        for row in plan_rows:
+            document = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+            for entry in document:
+                _postgresql_scans(entry.get("Plan", {}), scans)
+
+    elif db_type == "sqlite":
+        for row in plan_rows:
+            detail = str(row[-1])
+            match = _SQLITE_SCAN_RE.match(detail)
+            if match and "USING" not in detail.upper():
+                name = (match.group(2) or match.group(1)).lower()
+                if name in relations:
+                    scans[relations[name]] = None
+
+    else:
+        lowered = [column.lower() for column in columns]
+        if {"table", "type"} <= set(lowered):
+            table_index, type_index = lowered.index("table"), lowered.index("type")
+            rows_index = lowered.index("rows") if "rows" in lowered else None
+            for row in plan_rows:
+                name = str(row[table_index] or "").lower()
+                if str(row[type_index]).upper() == "ALL" and name in relations:
+                    scans[relations[name]] = row[rows_index] if rows_index is not None else None
+
+    return scans
+
+
+def _index_columns(predicates: list[tuple[str, bool]]) -> list[str]:
+    """Equality columns first, then at most one range column."""
+    equality = [column for column, is_equality in predicates if is_equality]
+    ranges = [column for column, is_equality in predicates if not is_equality]
+    return (equality + ranges[:1])[:MAX_INDEX_COLUMNS]
+
+
+def _lowered_statistics(statistics: Optional[DatabaseStatistics]) -> dict[str, TableStatistics]:
+    """Index catalog statistics by lower-cased table and column names."""
+    if statistics is None:
+        return {}
+    return {
+        name.lower(): table.model_copy(update={"columns": {c.lower(): s for c, s in table.columns.items()}})
+        for name, table in statistics.tables.items()
+    }
+
+
+def _rows_avoided(
+    db_type: str, columns: list[str], scan_rows: Optional[float], table_stats: Optional[TableStatistics]
+) -> Optional[float]:
+    """Estimate how many rows one execution reads that an index on `columns` would skip."""
+    table_rows = table_stats.row_estimate if table_stats else None
+
+    if db_type == "mysql" and table_rows is None:
+        table_rows = scan_rows
+    if table_rows is None:
+        return None
+
+    if db_type == "postgresql" and scan_rows is not None:
+        # The planner already estimated how many rows survive the filter
+        return max(table_rows - scan_rows, 0)
+
+    selectivity = DEFAULT_SELECTIVITY
+    column_stats = table_stats.columns.get(columns[0]) if table_stats else None
+    if column_stats and column_stats.distinct_estimate:
+        selectivity = 1 / column_stats.distinct_estimate
+    return table_rows * (1 - selectivity)
+
+
+def _create_index_statement(table: str, columns: list[str]) -> str:
+    name = "_".join(["ix", table, *columns])[:63]
+    return f"CREATE INDEX {name} ON {table} ({', '.join(columns)});"
+
+
+async def build_index_advice(connection: DatabaseConnection) -> IndexAdvice:
+    """
+    Analyze the query log of a connection and suggest indexes.
+
+    Raises:
+        SQLExecutionError: If the schema cannot be read
+    """
+    schema_columns = _schema_columns(await get_database_schema(connection))
+    try:
+        statistics = _lowered_statistics(await get_table_statistics(connection))
+    except SQLExecutionError:
+        statistics = {}
+
+    db_type = connection.db_type.value
+    suggestions: dict[tuple[str, tuple[str, ...]], IndexSuggestion] = {}
+    queries = [
+        q for q in await top_queries(connection.id, ANALYZED_QUERIES) if q["normalized"].startswith(("select", "with"))
+    ]
+
+    for query in queries:
+        predicates = _predicate_columns(query["sql"], schema_columns)
+        if not predicates:
+            continue
+        try:
+            plan = await _explain(connection, query["sql"])
+        except SQLExecutionError:
+            # Statements that no longer run (dropped tables, ...) are skipped
+            continue
+
+        relations = _relations(_LITERAL_RE.sub("?", query["sql"]), set(schema_columns))
+        scans = _sequential_scans(db_type, plan.rows, plan.columns, relations)
+
+        for table, scan_rows in scans.items():
+            columns = _index_columns(predicates.get(table, []))
+            if not columns:
+                continue
+
+            table_stats = statistics.get(table)
+            if table_stats and table_stats.row_estimate is not None and table_stats.row_estimate < MIN_TABLE_ROWS:
+                continue
+            rows_avoided = _rows_avoided(db_type, columns, scan_rows, table_stats)
+
+            key = (table, tuple(columns))
+            suggestion = suggestions.get(key)
+            if suggestion is None:
+                suggestion = suggestions[key] = IndexSuggestion(
+                    table=table, columns=columns, statement=_create_index_statement(table, columns)
+                )
+            suggestion.fingerprints.append(query["fingerprint"])
+            suggestion.calls += query["calls"]
+            suggestion.observed_time_ms = round(suggestion.observed_time_ms + query["total_time_ms"], 2)
+            suggestion.estimated_rows_avoided += (rows_avoided or 0) * query["calls"]
+
+    ranked = sorted(suggestions.values(), key=lambda s: (s.estimated_rows_avoided, s.observed_time_ms), reverse=True)
+    return IndexAdvice(connection_id=connection.id, suggestions=ranked, analyzed_queries=len(queries))
+
+
+async def get_index_advice(connection: DatabaseConnection, refresh: bool = False) -> IndexAdvice:
+    """Get index advice for a connection, reusing the last analysis while it is cached."""
+    if not refresh:
+        try:
+            return await get_data(connection.id, IndexAdvice)
+        except KeyError:
+            pass
+
+    advice = await build_index_advice(connection)
+    await save_data(connection.id, advice, ttl=INDEX_ADVICE_TTL)
+    return advice
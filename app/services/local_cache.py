@@ -0,0 +1,167 @@
+"""
+Process-local read-through cache for rarely changing models.
+
+get_data serves enabled models from an in-memory LRU with a TTL. save_data and
+delete_data publish the written key on a Redis channel; every process listens on
+it and evicts its copy, so updates propagate within milliseconds. The cache is
+only used while the listener is subscribed; if the subscription drops, caches are
+cleared and bypassed until it is back. Other per-process state derived from a
+model (such as database pools) can follow the same invalidations with on_evict.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Optional
+
+import logfire
+from pydantic import BaseModel
+
+from app.services.redis import get_pubsub_redis
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TTL = 60
+RECONNECT_DELAY = 1
+# Longest wait for the subscription; reads are uncached until it is there
+SUBSCRIBE_TIMEOUT = 5
+
+
+class LocalCache:
+    """LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = LOCAL_CACHE_SIZE, ttl: float = LOCAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, BaseModel]] = OrderedDict()
+        # Bumped on every eviction so a read that raced an invalidation is not cached
+        self.generation = 0
+
+    def get(self, key: str) -> Optional[BaseModel]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: BaseModel, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def evict(self, key: str) -> None:
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+
+_caches: dict[str, LocalCache] = {}
+# model name -> callbacks taking the id of a saved or deleted instance
+_evict_hooks: dict[str, list[Callable[[str], None]]] = {}
+_listener_task: Optional[asyncio.Task] = None
+_subscribed = False
+
+
+def get_cache(model_name: str) -> Optional[LocalCache]:
+    """Cache for a model, or None if it is not enabled or invalidations are not being received."""
+    return _caches.get(model_name) if _subscribed else None
+
+
+def parse_key(key: str) -> tuple[str, str]:
+    """(model name, id) of a model key: {Model:bucket}:id, or Model:id before hash tags."""
+    if key.startswith("{"):
+        tag_end = key.index("}")
+        return key[1:tag_end].rsplit(":", 1)[0], key[tag_end + 2 :]
+    model_name, _, id = key.partition(":")
+    return model_name, id
+
+
+def on_evict(model: type[BaseModel], hook: Callable[[str], None]) -> None:
+    """Call hook(id) whenever an instance of model is saved or deleted, by this or another process."""
+    _evict_hooks.setdefault(model.__name__, []).append(hook)
+
+
+def evict(key: str) -> None:
+    """Evict a model's Redis key from the local cache."""
+    model_name, id = parse_key(key)
+    cache = _caches.get(model_name)
+    if cache is not None:
+        cache.evict(key)
+    for hook in _evict_hooks.get(model_name, ()):
+        hook(id)
+
+
+def _clear_all() -> None:
+    for cache in _caches.values():
+        cache.clear()
+
+
+async def _listen(ready: asyncio.Event) -> None:
+    global _subscribed
+
+    while True:
+        pubsub = get_pubsub_redis().pubsub()
+        try:
+            await asyncio.wait_for(pubsub.subscribe(INVALIDATION_CHANNEL), SUBSCRIBE_TIMEOUT)
+            # Anything written while we were not subscribed may be stale
+            _clear_all()
+            _subscribed = True
+            ready.set()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    evict(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logfire.info(f"Warning: cache invalidation listener disconnected: {str(e)}")
+        finally:
+            _subscribed = False
+            _clear_all()
+            await pubsub.aclose()
+        await asyncio.sleep(RECONNECT_DELAY)
+
+
+async def start_local_cache(*models: type[BaseModel], maxsize: int = LOCAL_CACHE_SIZE, ttl: float = LOCAL_CACHE_TTL):
+    """
+    Enable local caching of the given models and start listening for invalidations.
+
+    Waits up to SUBSCRIBE_TIMEOUT for the subscription; without it the process starts
+    anyway and reads uncached while the listener keeps retrying.
+    """
+    global _listener_task
+
+    for model in models:
+        _caches.setdefault(model.__name__, LocalCache(maxsize, ttl))
+
+    if _listener_task is None:
+        ready = asyncio.Event()
+        _listener_task = asyncio.create_task(_listen(ready))
+        try:
+            await asyncio.wait_for(ready.wait(), SUBSCRIBE_TIMEOUT)
+        except TimeoutError:
+            logfire.info("Warning: cache invalidation listener is not subscribed; reading uncached until it is")
+
+
+async def stop_local_cache() -> None:
+    """Stop the invalidation listener and drop every cached entry."""
+    global _listener_task
+
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+    _caches.clear()
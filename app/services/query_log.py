@@ -0,0 +1,98 @@
+"""
+Per-connection log of executed query fingerprints.
+
+Every statement run through the SQL runner is normalized (literals replaced by
+placeholders) and hashed. Redis keeps, per connection and fingerprint, the call
+count, the accumulated execution time and the statement with its literals
+stripped, which the index advisor EXPLAINs later. Literal values (emails, ids,
+...) are never stored. The keys of a connection share one hash tag.
+"""
+
+import hashlib
+import re
+
+from app.services.redis import get_redis, hash_tag, key_bucket
+
+QUERY_LOG_TTL = 7 * 24 * 3600
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_LOGGED_STATEMENTS = ("select", "with", "update", "delete")
+
+
+def strip_literals(sql: str) -> str:
+    """Replace literals with ? placeholders and collapse whitespace, keeping identifiers' case."""
+    stripped = _LITERAL_RE.sub("?", sql)
+    stripped = _IN_LIST_RE.sub("in (?)", stripped)
+    return _WHITESPACE_RE.sub(" ", stripped).strip().rstrip(";")
+
+
+def normalize_sql(sql: str) -> str:
+    """Replace literals with placeholders and collapse whitespace and case."""
+    return strip_literals(sql).lower()
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Stable short hash of the normalized statement."""
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def _keys(connection_id: str) -> tuple[str, str, str]:
+    prefix = f"{hash_tag('query_log', key_bucket(connection_id))}:{connection_id}"
+    return f"{prefix}:calls", f"{prefix}:time_ms", f"{prefix}:samples"
+
+
+async def record_query(connection_id: str, sql: str, execution_time_ms: float) -> None:
+    """Record one execution of a statement (a single pipelined round trip)."""
+    if not sql.lstrip().lower().startswith(_LOGGED_STATEMENTS):
+        return
+
+    redis = get_redis()
+    statement = strip_literals(sql)
+    fingerprint = fingerprint_sql(statement)
+    calls_key, time_key, samples_key = _keys(connection_id)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zincrby(calls_key, 1, fingerprint)
+        pipe.zincrby(time_key, execution_time_ms, fingerprint)
+        pipe.hset(samples_key, fingerprint, statement)
+        for key in (calls_key, time_key, samples_key):
+            pipe.expire(key, QUERY_LOG_TTL)
+        await pipe.execute()
+
+
+async def top_queries(connection_id: str, limit: int = 50) -> list[dict]:
+    """
+    Return the most expensive fingerprints by accumulated execution time.
+
+    Each entry has: fingerprint, sql (the statement with ? in place of its literals),
+    normalized, calls, total_time_ms.
+    """
+    redis = get_redis()
+    calls_key, time_key, samples_key = _keys(connection_id)
+
+    ranked = await redis.zrevrange(time_key, 0, limit - 1, withscores=True)
+    if not ranked:
+        return []
+
+    fingerprints = [fingerprint for fingerprint, _ in ranked]
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zmscore(calls_key, fingerprints)
+        pipe.hmget(samples_key, fingerprints)
+        calls, samples = await pipe.execute()
+
+    entries = []
+    for (fingerprint, total_time_ms), call_count, sample in zip(ranked, calls, samples):
+        if sample is None:
+            continue
+        entries.append(
+            {
+                "fingerprint": fingerprint,
+                "sql": sample,
+                "normalized": normalize_sql(sample),
+                "calls": int(call_count or 0),
+                "total_time_ms": round(total_time_ms, 2),
+            }
+        )
+    return entries
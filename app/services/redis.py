@@ -1,6 +1,53 @@
+import zlib
+from typing import Any
+
 from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.cluster import RedisCluster
 
 from app.config import cache_config
+from app.services.storage import StorageBackend, is_memory_url, memory_backend
+
+# REDIS_URL=memory:// runs every service on the in-process backend (no server)
+USE_MEMORY_BACKEND = is_memory_url(cache_config.REDIS_URL)
+CLUSTER_MODE = cache_config.REDIS_CLUSTER and not USE_MEMORY_BACKEND
+
+# Keys of one entity share a {hash tag} so they land in one cluster slot and can be
+# used together in MGET, pipelines and MULTI. Each namespace is spread over this many
+# tags (slots); listings scatter-gather over all of them. Changing it moves every key.
+KEY_BUCKETS = 16
+
+
+def key_bucket(value: Any) -> int:
+    """Bucket (0..KEY_BUCKETS-1) of an entity id."""
+    return zlib.crc32(str(value).encode("utf-8")) % KEY_BUCKETS
+
+
+def hash_tag(namespace: str, bucket: int) -> str:
+    """Hash tag shared by the keys of one bucket of a namespace, e.g. {workflow:3}."""
+    return "{" + f"{namespace}:{bucket}" + "}"
+
+
+# Deletes a lock only while it still holds the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+async def release_lock(redis: StorageBackend, key: str, token: str) -> bool:
+    """
+    Release a lock taken with SET key token NX EX. A lock that outlived its expiry may
+    belong to another holder by now; it is left alone.
+    """
+    if USE_MEMORY_BACKEND:
+        # In-memory commands never yield to the event loop, so GET then DEL is atomic
+        holder = await redis.get(key)
+        if (holder.decode("utf-8") if isinstance(holder, bytes) else holder) != token:
+            return False
+        return bool(await redis.delete(key))
+    return bool(await redis.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
 
 
 def create_async_connection_pool() -> ConnectionPool:
@@ -10,14 +57,49 @@ def create_async_connection_pool() -> ConnectionPool:
     )
 
 
-async_pool = create_async_connection_pool()
+def create_binary_connection_pool() -> ConnectionPool:
+    """Pool returning raw bytes, for codec-encoded payloads."""
+    return ConnectionPool.from_url(url=cache_config.REDIS_URL)
+
+
+def create_cluster_client(decode_responses: bool = False) -> RedisCluster:
+    """Cluster client; it discovers the nodes and keeps a connection pool per node."""
+    return RedisCluster.from_url(url=cache_config.REDIS_URL, decode_responses=decode_responses)
+
+
+async_pool = None if USE_MEMORY_BACKEND or CLUSTER_MODE else create_async_connection_pool()
+binary_pool = None if USE_MEMORY_BACKEND or CLUSTER_MODE else create_binary_connection_pool()
+cluster_client = create_cluster_client(decode_responses=True) if CLUSTER_MODE else None
+binary_cluster_client = create_cluster_client() if CLUSTER_MODE else None
+# Classic pub/sub is broadcast to every node, so subscribing on the seed node is enough
+pubsub_client = Redis.from_url(url=cache_config.REDIS_URL, decode_responses=True) if CLUSTER_MODE else None
 
 
-def get_redis() -> Redis:
+def get_redis() -> StorageBackend:
+    if USE_MEMORY_BACKEND:
+        return memory_backend(decode_responses=True)
+    if CLUSTER_MODE:
+        return cluster_client
     return Redis(connection_pool=async_pool)
 
 
+def get_binary_redis() -> StorageBackend:
+    if USE_MEMORY_BACKEND:
+        return memory_backend()
+    if CLUSTER_MODE:
+        return binary_cluster_client
+    return Redis(connection_pool=binary_pool)
+
+
+def get_pubsub_redis() -> StorageBackend:
+    """Client for SUBSCRIBE (cluster clients do not provide pub/sub)."""
+    if CLUSTER_MODE:
+        return pubsub_client
+    return get_redis()
+
+
 redis = get_redis()
+binary_redis = get_binary_redis()
 
 
 async def ping_redis():
@@ -1,6 +1,29 @@
-from app.services.redis import get_redis
+import asyncio
+from typing import Optional
+
+from app.services import local_cache
+from app.services.codec import decode_model, encode_model
+from app.services.redis import CLUSTER_MODE, KEY_BUCKETS, USE_MEMORY_BACKEND, get_binary_redis, hash_tag, key_bucket
 from pydantic import BaseModel
 
+# Number of IDs fetched per SSCAN / MGET page when listing
+LIST_PAGE_SIZE = 100
+
+# Models whose keys are known to be in the current layout in this process
+_indexed_models: set[str] = set()
+
+# Drops index entries whose value is still missing, atomically: a value saved again since
+# the MGET keeps its entry. KEYS[1] is the index set, KEYS[i + 1] the value key of ARGV[i].
+PRUNE_INDEX_SCRIPT = """
+local removed = 0
+for i, id in ipairs(ARGV) do
+    if redis.call("EXISTS", KEYS[i + 1]) == 0 then
+        removed = removed + redis.call("SREM", KEYS[1], id)
+    end
+end
+return removed
+"""
+
 
 def _get_model_name(model: type[BaseModel]) -> str:
     """Get the model name for Redis key prefixing."""
@@ -8,90 +31,242 @@ def _get_model_name(model: type[BaseModel]) -> str:
 
 
 def _make_key(model_name: str, id: str) -> str:
-    """Create Redis key with model name prefix."""
+    """Create Redis key: {Model:bucket}:id, in the slot of the bucket's index set."""
+    return f"{hash_tag(model_name, key_bucket(id))}:{id}"
+
+
+def _make_index_key(model_name: str, bucket: int) -> str:
+    """Key of the set holding the IDs of one bucket of a model."""
+    return f"{hash_tag(model_name, bucket)}:index"
+
+
+def _make_legacy_key(model_name: str, id: str) -> str:
+    """Key used before hash tags (Model:id)."""
     return f"{model_name}:{id}"
 
 
-async def save_data(id: str, data: BaseModel) -> None:
-    """Save a Pydantic model instance to Redis."""
-    redis = get_redis()
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+async def save_data(id: str, data: BaseModel, ttl: Optional[int] = None) -> None:
+    """Save a Pydantic model instance to Redis, optionally expiring after ttl seconds."""
+    redis = get_binary_redis()
     model_name = _get_model_name(type(data))
     key = _make_key(model_name, id)
 
-    # Serialize to JSON using Pydantic's built-in serialization
-    json_data = data.model_dump_json()
-    await redis.set(key, json_data)
+    # Serialize with the configured codec (msgpack / zstd / JSON)
+    payload = encode_model(data)
+
+    # Write the value and its index entry atomically (MULTI/EXEC, one slot)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(key, payload, ex=ttl)
+        pipe.sadd(_make_index_key(model_name, key_bucket(id)), id)
+        if not CLUSTER_MODE:
+            pipe.publish(local_cache.INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+    if CLUSTER_MODE:
+        # A cluster MULTI only takes commands on keys of one slot; PUBLISH has no key
+        await redis.publish(local_cache.INVALIDATION_CHANNEL, key)
+    local_cache.evict(key)
 
 
 async def get_data[T: BaseModel](id: str, model: type[T]) -> T:
     """Retrieve a Pydantic model instance from Redis."""
-    redis = get_redis()
+    redis = get_binary_redis()
     model_name = _get_model_name(model)
     key = _make_key(model_name, id)
 
-    json_data = await redis.get(key)
-    if json_data is None:
+    # Models enabled in local_cache are served from process memory
+    cache = local_cache.get_cache(model_name)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.model_copy()
+        generation = cache.generation
+
+    payload = await redis.get(key)
+    if payload is None and model_name not in _indexed_models:
+        # It may still be stored under its pre-hash-tag key
+        await _ensure_index(model_name)
+        payload = await redis.get(key)
+    if payload is None:
         raise KeyError(f"No data found for {model_name} with id: {id}")
 
-    # Ensure we have a string for JSON parsing
-    if isinstance(json_data, bytes):
-        json_data = json_data.decode("utf-8")
+    # Any codec format is readable, including legacy JSON
+    data = decode_model(payload, model)
+    if cache is not None:
+        cache.put(key, data.model_copy(), generation)
+    return data
 
-    # Deserialize from JSON using Pydantic's built-in deserialization
-    return model.model_validate_json(json_data)
 
+async def _ensure_index(model_name: str) -> None:
+    """
+    Move keys written before the hash-tag layout (Model:id) to {Model:bucket}:id and
+    add them to their bucket's index set.
 
-async def list_ids(model_name: str) -> list[str]:
-    """List all IDs for a given model type."""
-    redis = get_redis()
-    pattern = f"{model_name}:*"
+    Runs once per model (a marker key records completion) and uses SCAN, never KEYS.
+    Values already written in the new layout win over legacy ones.
+    """
+    if model_name in _indexed_models:
+        return
 
-    # Get all keys matching the pattern
-    keys = await redis.keys(pattern)
+    redis = get_binary_redis()
+    marker_key = f"index:{model_name}:migrated"
+
+    if not await redis.exists(marker_key):
+        prefix_len = len(model_name) + 1  # +1 for the colon
+        async for legacy_key in redis.scan_iter(match=_make_legacy_key(model_name, "*"), count=1000):
+            legacy_key = _decode(legacy_key)
+            id = legacy_key[prefix_len:]
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(legacy_key)
+                pipe.pttl(legacy_key)
+                payload, ttl_ms = await pipe.execute()
+            if payload is None:
+                continue
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.set(_make_key(model_name, id), payload, px=ttl_ms if ttl_ms > 0 else None, nx=True)
+                pipe.sadd(_make_index_key(model_name, key_bucket(id)), id)
+                await pipe.execute()
+            await redis.delete(legacy_key)
+        # Single index set of the previous layout
+        await redis.delete(f"index:{model_name}", f"index:{model_name}:built")
+        await redis.set(marker_key, "1")
+
+    _indexed_models.add(model_name)
+
+
+async def list_ids_page(model_name: str, cursor: int = 0, count: int = LIST_PAGE_SIZE) -> tuple[list[str], int]:
+    """
+    List one page of IDs for a model type from its index sets, one bucket after the other.
+
+    Returns the IDs and the next cursor (0 when the listing is complete).
+    """
+    await _ensure_index(model_name)
+    redis = get_binary_redis()
+
+    # The cursor packs the SSCAN cursor of the current bucket and the bucket
+    bucket, sscan_cursor = cursor % KEY_BUCKETS, cursor // KEY_BUCKETS
+    next_sscan_cursor, ids = await redis.sscan(_make_index_key(model_name, bucket), cursor=sscan_cursor, count=count)
+    next_sscan_cursor = int(next_sscan_cursor)
+
+    if next_sscan_cursor:
+        next_cursor = next_sscan_cursor * KEY_BUCKETS + bucket
+    elif bucket + 1 < KEY_BUCKETS:
+        next_cursor = bucket + 1
+    else:
+        next_cursor = 0
+    return [_decode(id) for id in ids], next_cursor
 
-    # Extract IDs by removing the model name prefix
-    ids = []
-    prefix_len = len(model_name) + 1  # +1 for the colon
-    for key in keys:
-        if isinstance(key, bytes):
-            key = key.decode("utf-8")
-        ids.append(key[prefix_len:])
 
+async def _list_bucket_ids(model_name: str, bucket: int) -> list[str]:
+    redis = get_binary_redis()
+    ids = []
+    async for id in redis.sscan_iter(_make_index_key(model_name, bucket), count=LIST_PAGE_SIZE):
+        ids.append(_decode(id))
     return ids
 
 
-async def list_data[T: BaseModel](model: type[T]) -> list[T]:
-    """List all instances of a given model type from Redis."""
+async def list_ids(model_name: str) -> list[str]:
+    """List all IDs for a given model type, reading every bucket concurrently."""
+    await _ensure_index(model_name)
+    buckets = await asyncio.gather(*(_list_bucket_ids(model_name, bucket) for bucket in range(KEY_BUCKETS)))
+    return [id for ids in buckets for id in ids]
+
+
+async def _load_bucket[T: BaseModel](model: type[T], bucket: int, ids: list[str]) -> list[T]:
+    """MGET the values of IDs from one bucket (one slot) and drop stale index entries."""
+    if not ids:
+        return []
+
+    redis = get_binary_redis()
     model_name = _get_model_name(model)
-    ids = await list_ids(model_name)
+    values = await redis.mget([_make_key(model_name, id) for id in ids])
 
     data_list = []
-    for id in ids:
-        try:
-            data = await get_data(id, model)
-            data_list.append(data)
-        except KeyError:
-            # Skip if data was deleted between listing and retrieval
+    stale_ids = []
+    for id, payload in zip(ids, values):
+        if payload is None:
+            # Deleted or expired since it was indexed
+            stale_ids.append(id)
             continue
+        data_list.append(decode_model(payload, model))
+
+    if stale_ids:
+        await _prune_index(redis, model_name, bucket, stale_ids)
+
+    return data_list
+
 
+async def _prune_index(redis, model_name: str, bucket: int, ids: list[str]) -> int:
+    """Remove index entries of IDs whose value is gone (unless saved again meanwhile)."""
+    index_key = _make_index_key(model_name, bucket)
+    keys = [_make_key(model_name, id) for id in ids]
+    if USE_MEMORY_BACKEND:
+        # In-memory commands never yield to the event loop, so EXISTS then SREM is atomic
+        missing = [id for id, key in zip(ids, keys) if not await redis.exists(key)]
+        return await redis.srem(index_key, *missing) if missing else 0
+    return await redis.eval(PRUNE_INDEX_SCRIPT, len(keys) + 1, index_key, *keys, *ids)
+
+
+async def list_data_page[T: BaseModel](
+    model: type[T], cursor: int = 0, count: int = LIST_PAGE_SIZE
+) -> tuple[list[T], int]:
+    """
+    List one page of instances with a single MGET.
+
+    Returns the instances and the next cursor (0 when the listing is complete).
+    """
+    ids, next_cursor = await list_ids_page(_get_model_name(model), cursor, count)
+    return await _load_bucket(model, cursor % KEY_BUCKETS, ids), next_cursor
+
+
+async def _list_bucket_data[T: BaseModel](model: type[T], bucket: int) -> list[T]:
+    ids = await _list_bucket_ids(_get_model_name(model), bucket)
+    data_list = []
+    for start in range(0, len(ids), LIST_PAGE_SIZE):
+        data_list.extend(await _load_bucket(model, bucket, ids[start : start + LIST_PAGE_SIZE]))
     return data_list
 
 
+async def list_data[T: BaseModel](model: type[T]) -> list[T]:
+    """
+    List all instances of a given model type from Redis.
+
+    Scatter-gather: every bucket (a slot, so a node in a cluster) is read concurrently.
+    """
+    await _ensure_index(_get_model_name(model))
+    buckets = await asyncio.gather(*(_list_bucket_data(model, bucket) for bucket in range(KEY_BUCKETS)))
+    return [data for data_list in buckets for data in data_list]
+
+
 async def delete_data(id: str, model: type[BaseModel]) -> bool:
     """Delete a model instance from Redis. Returns True if deleted, False if not found."""
-    redis = get_redis()
+    redis = get_binary_redis()
     model_name = _get_model_name(model)
     key = _make_key(model_name, id)
+    await _ensure_index(model_name)
 
-    result = await redis.delete(key)
+    # Remove the value and its index entry atomically (MULTI/EXEC, one slot)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.srem(_make_index_key(model_name, key_bucket(id)), id)
+        if not CLUSTER_MODE:
+            pipe.publish(local_cache.INVALIDATION_CHANNEL, key)
+        result = (await pipe.execute())[0]
+    if CLUSTER_MODE:
+        await redis.publish(local_cache.INVALIDATION_CHANNEL, key)
+    local_cache.evict(key)
     return bool(result)
 
 
 async def exists_data(id: str, model: type[BaseModel]) -> bool:
     """Check if a model instance exists in Redis."""
-    redis = get_redis()
+    redis = get_binary_redis()
     model_name = _get_model_name(model)
     key = _make_key(model_name, id)
+    await _ensure_index(model_name)
 
     result = await redis.exists(key)
     return bool(result)
@@ -0,0 +1,83 @@
+"""
+Fast JSON encoding for query results.
+
+Query results are kept as the driver produced them (asyncpg Records or
+SQLAlchemy Rows) and written straight to JSON bytes with orjson, instead of
+being copied into lists, validated by Pydantic and re-encoded by FastAPI.
+The bytes have the same shape as the QueryResponse / TransactionResponse models.
+"""
+
+from decimal import Decimal
+from typing import Any, Optional
+
+import asyncpg
+import orjson
+from fastapi.responses import Response
+from pydantic_core import to_jsonable_python
+from sqlalchemy import Row
+
+from app.models import QueryResult, StatementResult
+
+
+def _default(obj: Any) -> Any:
+    """Encode values orjson does not handle natively, matching Pydantic's JSON output."""
+    if isinstance(obj, asyncpg.Record | Row):
+        return tuple(obj)
+    if isinstance(obj, Decimal):
+        # Pydantic encodes Decimal as its string form
+        return str(obj)
+    # timedelta, bytes, ... are encoded exactly like Pydantic would
+    return to_jsonable_python(obj)
+
+
+def result_payload(result: Optional[QueryResult]) -> Optional[dict]:
+    """Build the JSON payload of a QueryResult without touching its rows."""
+    if result is None:
+        return None
+    return {
+        "columns": result.columns,
+        "rows": result.rows,
+        "row_count": result.row_count,
+        "execution_time_ms": result.execution_time_ms,
+    }
+
+
+def statement_payload(result: StatementResult) -> dict:
+    return {
+        "index": result.index,
+        "status": result.status,
+        "data": result_payload(result.data),
+        "error": result.error,
+    }
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson, understanding driver row types."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def query_response(status: str, data: Optional[QueryResult] = None, error: Optional[str] = None) -> FastJSONResponse:
+    """Render a QueryResponse-shaped body directly from a QueryResult."""
+    return FastJSONResponse({"status": status, "data": result_payload(data), "error": error})
+
+
+def transaction_response(
+    status: str, results: list[StatementResult], error: Optional[str], execution_time_ms: float
+) -> FastJSONResponse:
+    """Render a TransactionResponse-shaped body directly from statement results."""
+    return FastJSONResponse(
+        {
+            "status": status,
+            "results": [statement_payload(result) for result in results],
+            "error": error,
+            "execution_time_ms": execution_time_ms,
+        }
+    )
@@ -0,0 +1,85 @@
+"""
+Content-addressed storage of database schemas.
+
+A schema is stored once in Redis under the hash of its canonical JSON, so every
+workflow (and every connection) with the same schema shares one copy and a
+Context only carries the hash. Schemas are immutable under their hash, which
+makes the per-process memo safe to keep without invalidation.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+
+from app.services.codec import decode_data, encode_data
+from app.services.redis import get_binary_redis
+
+# Refreshed every time a process stores the schema, so live schemas never expire
+SCHEMA_TTL = 24 * 3600
+# Number of schemas kept in process memory
+SCHEMA_MEMO_SIZE = 64
+
+_memo: OrderedDict[str, dict] = OrderedDict()
+
+
+def _make_key(schema_ref: str) -> str:
+    return f"schema:{schema_ref}"
+
+
+def schema_hash(schema: dict) -> str:
+    """SHA-256 of the schema's canonical JSON (sorted keys)."""
+    canonical = orjson.dumps(schema, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def remember_schema(schema_ref: str, schema: dict) -> None:
+    """Keep a schema in the process memo."""
+    _memo[schema_ref] = schema
+    _memo.move_to_end(schema_ref)
+    while len(_memo) > SCHEMA_MEMO_SIZE:
+        _memo.popitem(last=False)
+
+
+def cached_schema(schema_ref: str) -> Optional[dict]:
+    """Schema from the process memo, or None if this process has not loaded it."""
+    schema = _memo.get(schema_ref)
+    if schema is not None:
+        _memo.move_to_end(schema_ref)
+    return schema
+
+
+async def store_schema(schema_ref: str, schema: dict) -> None:
+    """
+    Make sure a schema is stored in Redis.
+
+    The TTL of a stored schema is refreshed; the payload is only sent when the key
+    does not exist (EXPIRE returned 0), e.g. after it expired or was evicted.
+    """
+    redis = get_binary_redis()
+    key = _make_key(schema_ref)
+    if not await redis.expire(key, SCHEMA_TTL):
+        await redis.set(key, encode_data(schema), ex=SCHEMA_TTL)
+
+    remember_schema(schema_ref, schema)
+
+
+async def load_schema(schema_ref: str) -> dict:
+    """
+    Load a schema by hash, from the process memo or Redis.
+
+    Raises:
+        KeyError: If the schema is not stored (or has expired)
+    """
+    schema = cached_schema(schema_ref)
+    if schema is not None:
+        return schema
+
+    payload = await get_binary_redis().get(_make_key(schema_ref))
+    if payload is None:
+        raise KeyError(f"No schema found with hash: {schema_ref}")
+
+    schema = decode_data(payload)
+    remember_schema(schema_ref, schema)
+    return schema
@@ -0,0 +1,523 @@
+"""
+SQL dialect translation between PostgreSQL, MySQL and SQLite.
+
+The agents tend to emit PostgreSQL or MySQL flavoured SQL regardless of the
+target database. Instead of paying for an LLM retry every time a query uses the
+wrong dialect, statements are rewritten here with a set of precompiled rules
+before they are executed.
+
+String literals, quoted identifiers and comments are masked out before the
+rules run, so rules never rewrite text inside them (MySQL sources may escape
+quotes with a backslash). Date functions and casts the target cannot express
+raise ValueError instead of reaching the database unchanged. Translations are
+memoized in an LRU keyed by (sql, source dialect, target dialect).
+"""
+
+import re
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Optional
+
+POSTGRESQL = "postgresql"
+MYSQL = "mysql"
+SQLITE = "sqlite"
+GENERIC = "generic"  # Unknown source: mix of PostgreSQL and MySQL syntax
+
+DIALECTS = (POSTGRESQL, MYSQL, SQLITE, GENERIC)
+
+TRANSLATION_CACHE_SIZE = 1024
+
+# Masked tokens are replaced by \x00<index>\x00 while the rules run
+_MASK_RE = re.compile(r"\x00(\d+)\x00")
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    | (?P<dquote>"(?:[^"]|"")*")
+    | (?P<backtick>`(?:[^`]|``)*`)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+# MySQL strings also escape with a backslash ('it\'s')
+_MYSQL_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>'(?:[^'\\]|\\.|'')*')
+    | (?P<dquote>"(?:[^"\\]|\\.|"")*")
+    | (?P<backtick>`(?:[^`]|``)*`)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_MYSQL_ESCAPE_RE = re.compile(r"\\(.)|''", re.DOTALL)
+# Escapes that stand for another character; \% and \_ keep their backslash (LIKE patterns)
+_MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+
+# Operand accepted by function rewrites: identifier, dotted name, masked token or number
+_OPERAND = r"(?:\x00\d+\x00|[\w.]+)"
+
+_SQLITE_TRUNC_FORMATS = {
+    "year": "%Y-01-01",
+    "month": "%Y-%m-01",
+    "day": "%Y-%m-%d",
+    "hour": "%Y-%m-%d %H:00:00",
+    "minute": "%Y-%m-%d %H:%M:00",
+    "second": "%Y-%m-%d %H:%M:%S",
+}
+
+# DATE_FORMAT patterns (minutes are %i in MySQL); the result is CAST back to DATETIME
+_MYSQL_TRUNC_FORMATS = {
+    "year": "%Y-01-01",
+    "month": "%Y-%m-01",
+    "day": "%Y-%m-%d",
+    "hour": "%Y-%m-%d %H:00:00",
+    "minute": "%Y-%m-%d %H:%i:00",
+    "second": "%Y-%m-%d %H:%i:%s",
+}
+
+_SQLITE_EXTRACT_FORMATS = {
+    "year": "%Y",
+    "month": "%m",
+    "day": "%d",
+    "hour": "%H",
+    "minute": "%M",
+    "second": "%S",
+    "dow": "%w",
+    "doy": "%j",
+    "epoch": "%s",
+}
+
+# `expr::type` to SQLite. CAST to a type name SQLite does not know gives NUMERIC
+# affinity ('2024-01-02 10:00:00' becomes 2024), so dates and times go through the
+# date functions and only numeric and text types are CAST. Other types are dropped:
+# SQLite compares the value as it is stored.
+_SQLITE_CAST_FUNCTIONS = {
+    "date": "date",
+    "time": "time",
+    "timetz": "time",
+    "timestamp": "datetime",
+    "timestamptz": "datetime",
+    "datetime": "datetime",
+}
+_SQLITE_CAST_TYPES = {
+    "int": "INTEGER",
+    "int2": "INTEGER",
+    "int4": "INTEGER",
+    "int8": "INTEGER",
+    "integer": "INTEGER",
+    "smallint": "INTEGER",
+    "bigint": "INTEGER",
+    "bool": "INTEGER",
+    "boolean": "INTEGER",
+    "real": "REAL",
+    "float": "REAL",
+    "float4": "REAL",
+    "float8": "REAL",
+    "double": "REAL",
+    "numeric": "NUMERIC",
+    "decimal": "NUMERIC",
+    "text": "TEXT",
+    "varchar": "TEXT",
+    "char": "TEXT",
+    "character": "TEXT",
+    "uuid": "TEXT",
+}
+
+# `expr::type` to MySQL, whose CAST only takes a handful of type names
+_MYSQL_CAST_TYPES = {
+    "date": "DATE",
+    "time": "TIME",
+    "timetz": "TIME",
+    "timestamp": "DATETIME",
+    "timestamptz": "DATETIME",
+    "datetime": "DATETIME",
+    "int": "SIGNED",
+    "int2": "SIGNED",
+    "int4": "SIGNED",
+    "int8": "SIGNED",
+    "integer": "SIGNED",
+    "smallint": "SIGNED",
+    "bigint": "SIGNED",
+    "bool": "SIGNED",
+    "boolean": "SIGNED",
+    "real": "DOUBLE",
+    "float": "DOUBLE",
+    "float4": "DOUBLE",
+    "float8": "DOUBLE",
+    "double": "DOUBLE",
+    "numeric": "DECIMAL",
+    "decimal": "DECIMAL",
+    "text": "CHAR",
+    "varchar": "CHAR",
+    "char": "CHAR",
+    "character": "CHAR",
+    "uuid": "CHAR",
+    "json": "JSON",
+    "jsonb": "JSON",
+}
+# Types whose precision or length MySQL's CAST accepts too
+_MYSQL_CAST_ARGS = ("DECIMAL", "CHAR")
+
+# EXTRACT units MySQL knows; the others are rewritten to functions
+_MYSQL_EXTRACT_UNITS = ("year", "quarter", "month", "week", "day", "hour", "minute", "second", "microsecond")
+_MYSQL_EXTRACT_FUNCTIONS = {"dow": "(DAYOFWEEK({}) - 1)", "doy": "DAYOFYEAR({})", "epoch": "UNIX_TIMESTAMP({})"}
+
+_INTERVAL_UNITS = ("year", "month", "week", "day", "hour", "minute", "second")
+
+
+class _Translation:
+    """Working state for one statement: masked SQL plus the masked tokens."""
+
+    def __init__(self, sql: str, source: str = GENERIC, target: str = GENERIC):
+        self.tokens: list[str] = []
+        # Strings of unknown origin are read the way the database running them will
+        self.backslash_escapes = source == MYSQL or (source == GENERIC and target == MYSQL)
+        self.sql = (_MYSQL_TOKEN_RE if self.backslash_escapes else _TOKEN_RE).sub(self._mask, sql)
+
+    def _mask(self, match: re.Match) -> str:
+        self.tokens.append(match.group(0))
+        return f"\x00{len(self.tokens) - 1}\x00"
+
+    def add_literal(self, value: str) -> str:
+        """Register a new string literal and return its mask."""
+        self.tokens.append("'" + value.replace("'", "''") + "'")
+        return f"\x00{len(self.tokens) - 1}\x00"
+
+    def literal_value(self, masked: str) -> Optional[str]:
+        """Return the unquoted value of a masked string literal, if it is one."""
+        match = _MASK_RE.fullmatch(masked.strip())
+        if not match:
+            return None
+        token = self.tokens[int(match.group(1))]
+        if not token.startswith("'"):
+            return None
+        return self.unquote(token)
+
+    def unquote(self, token: str) -> str:
+        """Value of a quoted string token."""
+        if self.backslash_escapes:
+            return _MYSQL_ESCAPE_RE.sub(
+                lambda m: "'" if m.group(1) is None else _MYSQL_ESCAPES.get(m.group(1), m.group(1)), token[1:-1]
+            )
+        return token[1:-1].replace("''", "'")
+
+    def restore(self) -> str:
+        return _MASK_RE.sub(lambda m: self.tokens[int(m.group(1))], self.sql)
+
+
+type _Replacement = Callable[[re.Match, _Translation], str]
+type _Rule = tuple[re.Pattern, _Replacement]
+
+
+def _rule(pattern: str, replacement: str | _Replacement, flags: int = 0) -> _Rule:
+    """Compile a case-insensitive rule. String replacements ignore the translation state."""
+    compiled = re.compile(pattern, re.IGNORECASE | flags)
+    if isinstance(replacement, str):
+        template = replacement
+        return compiled, lambda m, _t: m.expand(template)
+    return compiled, replacement
+
+
+# Quoting
+
+
+def _requote(t: _Translation, source: str, target: str) -> None:
+    """Rewrite quoted identifiers (and MySQL-escaped strings) to the quoting style of the target dialect."""
+    for i, token in enumerate(t.tokens):
+        if token.startswith("'") and t.backslash_escapes != (target == MYSQL):
+            # Only MySQL reads a backslash as an escape
+            value = t.unquote(token)
+            if target == MYSQL:
+                value = value.replace("\\", "\\\\")
+            t.tokens[i] = "'" + value.replace("'", "''") + "'"
+        elif token.startswith("`") and target != MYSQL:
+            name = token[1:-1].replace("``", "`")
+            t.tokens[i] = '"' + name.replace('"', '""') + '"'
+        elif token.startswith('"') and target == MYSQL and source in (POSTGRESQL, SQLITE):
+            # In MySQL double quotes delimit strings unless ANSI_QUOTES is set
+            name = token[1:-1].replace('""', '"')
+            t.tokens[i] = "`" + name.replace("`", "``") + "`"
+
+
+# Date and time functions
+
+
+def _trunc_unit(m: re.Match, t: _Translation, formats: dict[str, str], target: str) -> str:
+    unit = (t.literal_value(m.group("unit")) or "").lower()
+    if unit not in formats:
+        raise ValueError(f"Cannot translate DATE_TRUNC({unit!r}, ...) into {target}")
+    return formats[unit]
+
+
+def _sqlite_date_trunc(m: re.Match, t: _Translation) -> str:
+    fmt = _trunc_unit(m, t, _SQLITE_TRUNC_FORMATS, SQLITE)
+    return f"strftime({t.add_literal(fmt)}, {m.group('expr')})"
+
+
+def _mysql_date_trunc(m: re.Match, t: _Translation) -> str:
+    fmt = _trunc_unit(m, t, _MYSQL_TRUNC_FORMATS, MYSQL)
+    return f"CAST(DATE_FORMAT({m.group('expr')}, {t.add_literal(fmt)}) AS DATETIME)"
+
+
+def _sqlite_extract(m: re.Match, t: _Translation) -> str:
+    fmt = _SQLITE_EXTRACT_FORMATS.get(m.group("unit").lower())
+    if fmt is None:
+        raise ValueError(f"Cannot translate EXTRACT({m.group('unit')} FROM ...) into {SQLITE}")
+    return f"CAST(strftime({t.add_literal(fmt)}, {m.group('expr')}) AS INTEGER)"
+
+
+def _mysql_extract(m: re.Match, _t: _Translation) -> str:
+    unit = m.group("unit").lower()
+    if unit in _MYSQL_EXTRACT_UNITS:
+        return m.group(0)
+    if unit not in _MYSQL_EXTRACT_FUNCTIONS:
+        raise ValueError(f"Cannot translate EXTRACT({m.group('unit')} FROM ...) into {MYSQL}")
+    return _MYSQL_EXTRACT_FUNCTIONS[unit].format(m.group("expr"))
+
+
+def _sqlite_date_part(m: re.Match, t: _Translation) -> str:
+    fmt = _SQLITE_EXTRACT_FORMATS[m.group("fn").lower()]
+    return f"CAST(strftime({t.add_literal(fmt)}, {m.group('expr')}) AS INTEGER)"
+
+
+def _postgresql_date_part(m: re.Match, _t: _Translation) -> str:
+    return f"EXTRACT({m.group('fn').upper()} FROM {m.group('expr')})"
+
+
+def _interval_literal(m: re.Match, t: _Translation, target: str) -> tuple[str, str]:
+    """Amount and singular unit of a PostgreSQL interval literal such as '7 days'."""
+    value = t.literal_value(m.group("literal")) or ""
+    parts = value.split()
+    if len(parts) == 2 and parts[0].lstrip("-").isdigit() and parts[1].lower().rstrip("s") in _INTERVAL_UNITS:
+        return parts[0], parts[1].lower().rstrip("s")
+    raise ValueError(f"Cannot translate INTERVAL {value!r} into {target}")
+
+
+def _interval_modifier(m: re.Match, t: _Translation) -> str:
+    """Turn `- INTERVAL '7 days'` / `+ INTERVAL 7 DAY` into a SQLite modifier such as '-7 days'."""
+    amount = m.group("amount")
+    unit = m.group("unit")
+    if amount is None:
+        amount, unit = _interval_literal(m, t, SQLITE)
+    unit = unit.lower()
+    if unit == "week":
+        # SQLite modifiers have no weeks
+        amount, unit = str(int(amount) * 7), "day"
+    sign = "-" if m.group("sign") == "-" else "+"
+    return t.add_literal(f"{sign}{amount} {unit}s")
+
+
+def _mysql_interval(m: re.Match, t: _Translation) -> str:
+    amount, unit = _interval_literal(m, t, MYSQL)
+    return f"INTERVAL {amount} {unit.upper()}"
+
+
+def _postgresql_interval(m: re.Match, t: _Translation) -> str:
+    value = f"{m.group('amount')} {m.group('unit').lower()}s"
+    return f"INTERVAL {t.add_literal(value)}"
+
+
+def _sqlite_interval(m: re.Match, t: _Translation) -> str:
+    modifier = _interval_modifier(m, t)
+    base = m.group("base").upper()
+    if base == "CURRENT_DATE" or base.startswith("CURDATE"):
+        return f"date({t.add_literal('now')}, {modifier})"
+    return f"datetime({t.add_literal('now')}, {modifier})"
+
+
+_INTERVAL = (
+    r"(?P<sign>[+-])\s*INTERVAL\s+"
+    r"(?:(?P<amount>\d+)\s+(?P<unit>YEAR|MONTH|WEEK|DAY|HOUR|MINUTE|SECOND)S?\b|(?P<literal>\x00\d+\x00))"
+)
+
+
+# Casts
+
+
+_CAST = r"(?P<expr>" + _OPERAND + r")::(?P<type>\w+)(?P<args>\s*\(\s*\d+(?:\s*,\s*\d+)?\s*\))?"
+
+
+def _sqlite_cast(m: re.Match, _t: _Translation) -> str:
+    expr = m.group("expr")
+    type_name = m.group("type").lower()
+    if type_name in _SQLITE_CAST_FUNCTIONS:
+        return f"{_SQLITE_CAST_FUNCTIONS[type_name]}({expr})"
+    if type_name in _SQLITE_CAST_TYPES:
+        return f"CAST({expr} AS {_SQLITE_CAST_TYPES[type_name]})"
+    return expr
+
+
+def _mysql_cast(m: re.Match, _t: _Translation) -> str:
+    cast_type = _MYSQL_CAST_TYPES.get(m.group("type").lower())
+    if cast_type is None:
+        raise ValueError(f"Cannot translate a cast to {m.group('type')} into {MYSQL}")
+    if cast_type in _MYSQL_CAST_ARGS and m.group("args"):
+        cast_type += m.group("args").replace(" ", "")
+    return f"CAST({m.group('expr')} AS {cast_type})"
+
+
+# LIMIT / TOP / FETCH FIRST
+
+
+def _top_to_limit(m: re.Match, _t: _Translation) -> str:
+    # Only handled when the statement has no LIMIT of its own
+    rest = m.group("rest")
+    if re.search(r"\bLIMIT\b", rest, re.IGNORECASE):
+        return m.group(0)
+    body = rest.rstrip()
+    terminator = ""
+    if body.endswith(";"):
+        body, terminator = body[:-1].rstrip(), ";"
+    return f"{m.group('select')}{body} LIMIT {m.group('n')}{terminator}"
+
+
+_TOP_RULE = _rule(
+    r"^(?P<select>\s*SELECT\s+(?:DISTINCT\s+)?)TOP\s*\(?\s*(?P<n>\d+)\s*\)?\s+(?P<rest>.*)$", _top_to_limit, re.DOTALL
+)
+# Runs before _FETCH_FIRST_RULE: LIMIT has to come before OFFSET
+_OFFSET_FETCH_RULE = _rule(
+    r"\bOFFSET\s+(\d+)\s+ROWS?\s+FETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+ONLY\b", r"LIMIT \2 OFFSET \1"
+)
+_FETCH_FIRST_RULE = _rule(r"\bFETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+ONLY\b", r"LIMIT \1")
+_MYSQL_LIMIT_RULE = _rule(r"\bLIMIT\s+(\d+)\s*,\s*(\d+)\b", r"LIMIT \2 OFFSET \1")
+
+
+# Statement-level rewrites for introspection commands
+
+
+def _sqlite_statement(sql: str) -> Optional[str]:
+    """Translate MySQL-style SHOW/DESC introspection commands to SQLite."""
+    stripped = sql.strip().rstrip(";").strip()
+    upper = stripped.upper()
+    parts = stripped.split()
+
+    if upper == "SHOW TABLES":
+        return "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;"
+    if upper == "SHOW DATABASES":
+        return "SELECT 'main' as database_name;"
+    if (upper.startswith("DESC ") or upper.startswith("DESCRIBE ")) and len(parts) == 2:
+        return f"PRAGMA table_info({parts[1]});"
+    if upper.startswith("SHOW COLUMNS FROM ") and len(parts) == 4:
+        return f"PRAGMA table_info({parts[3]});"
+    return None
+
+
+def _postgresql_statement(sql: str) -> Optional[str]:
+    """Translate MySQL-style SHOW/DESC introspection commands to PostgreSQL."""
+    stripped = sql.strip().rstrip(";").strip()
+    upper = stripped.upper()
+    parts = stripped.split()
+
+    if upper == "SHOW TABLES":
+        return "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;"
+    if upper == "SHOW DATABASES":
+        return "SELECT datname AS database_name FROM pg_database WHERE NOT datistemplate ORDER BY datname;"
+    table_name = None
+    if (upper.startswith("DESC ") or upper.startswith("DESCRIBE ")) and len(parts) == 2:
+        table_name = parts[1]
+    elif upper.startswith("SHOW COLUMNS FROM ") and len(parts) == 4:
+        table_name = parts[3]
+    if table_name and re.fullmatch(r"[\w.]+", table_name):
+        return (
+            "SELECT column_name, data_type, is_nullable, column_default "
+            f"FROM information_schema.columns WHERE table_name = '{table_name.split('.')[-1]}' "
+            "ORDER BY ordinal_position;"
+        )
+    return None
+
+
+# Rule sets per target dialect
+
+
+_SQLITE_RULES: list[_Rule] = [
+    _rule(r"\bILIKE\b", "LIKE"),  # SQLite LIKE is already case-insensitive for ASCII
+    _rule(_CAST, _sqlite_cast),
+    _rule(
+        r"(?P<base>NOW\s*\(\s*\)|CURRENT_TIMESTAMP|CURRENT_DATE|CURDATE\s*\(\s*\))\s*" + _INTERVAL,
+        _sqlite_interval,
+    ),
+    _rule(r"\bDATE_TRUNC\s*\(\s*(?P<unit>\x00\d+\x00)\s*,\s*(?P<expr>" + _OPERAND + r")\s*\)", _sqlite_date_trunc),
+    _rule(r"\bEXTRACT\s*\(\s*(?P<unit>\w+)\s+FROM\s+(?P<expr>" + _OPERAND + r")\s*\)", _sqlite_extract),
+    _rule(r"\b(?P<fn>YEAR|MONTH|DAY|HOUR|MINUTE|SECOND)\s*\(\s*(?P<expr>" + _OPERAND + r")\s*\)", _sqlite_date_part),
+    _rule(r"\bNOW\s*\(\s*\)", "CURRENT_TIMESTAMP"),
+    _rule(r"\bCURDATE\s*\(\s*\)", "CURRENT_DATE"),
+    _rule(r"\bTRUE\b", "1"),
+    _rule(r"\bFALSE\b", "0"),
+    _OFFSET_FETCH_RULE,
+    _FETCH_FIRST_RULE,
+]
+
+_POSTGRESQL_RULES: list[_Rule] = [
+    _rule(r"\bIFNULL\s*\(", "COALESCE("),
+    _rule(r"\bCURDATE\s*\(\s*\)", "CURRENT_DATE"),
+    _rule(
+        r"\b(?P<fn>YEAR|MONTH|DAY|HOUR|MINUTE|SECOND)\s*\(\s*(?P<expr>" + _OPERAND + r")\s*\)", _postgresql_date_part
+    ),
+    _rule(r"\bINTERVAL\s+(?P<amount>\d+)\s+(?P<unit>YEAR|MONTH|WEEK|DAY|HOUR|MINUTE|SECOND)\b", _postgresql_interval),
+    _MYSQL_LIMIT_RULE,
+]
+
+_MYSQL_RULES: list[_Rule] = [
+    _rule(r"\bILIKE\b", "LIKE"),  # Default MySQL collations are case-insensitive
+    _rule(_CAST, _mysql_cast),
+    _rule(r"\bINTERVAL\s+(?P<literal>\x00\d+\x00)", _mysql_interval),
+    _rule(r"\bDATE_TRUNC\s*\(\s*(?P<unit>\x00\d+\x00)\s*,\s*(?P<expr>" + _OPERAND + r")\s*\)", _mysql_date_trunc),
+    _rule(r"\bEXTRACT\s*\(\s*(?P<unit>\w+)\s+FROM\s+(?P<expr>" + _OPERAND + r")\s*\)", _mysql_extract),
+    _OFFSET_FETCH_RULE,
+    _FETCH_FIRST_RULE,
+]
+
+_RULES = {SQLITE: _SQLITE_RULES, POSTGRESQL: _POSTGRESQL_RULES, MYSQL: _MYSQL_RULES}
+_STATEMENT_RULES = {SQLITE: _sqlite_statement, POSTGRESQL: _postgresql_statement}
+
+
+def _normalize_dialect(dialect) -> str:
+    """Accept DatabaseType members, plain strings or None."""
+    if dialect is None:
+        return GENERIC
+    value = str(getattr(dialect, "value", dialect)).lower()
+    if value not in DIALECTS:
+        raise ValueError(f"Unsupported SQL dialect: {dialect}")
+    return value
+
+
+@lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def _translate(sql: str, source: str, target: str) -> str:
+    if source == target:
+        return sql
+
+    statement_rule = _STATEMENT_RULES.get(target)
+    if statement_rule is not None and (translated := statement_rule(sql)) is not None:
+        return translated
+
+    t = _Translation(sql, source, target)
+    _requote(t, source, target)
+
+    # None of the supported targets understand T-SQL's SELECT TOP n
+    for pattern, replacement in [_TOP_RULE, *_RULES[target]]:
+        t.sql = pattern.sub(lambda m, r=replacement: r(m, t), t.sql)
+
+    return t.restore()
+
+
+def translate_sql(sql: str, target, source=None) -> str:
+    """
+    Translate a SQL statement into the target dialect.
+
+    Args:
+        sql: The SQL statement to translate
+        target: Target dialect (DatabaseType or "postgresql" / "mysql" / "sqlite")
+        source: Dialect the statement was written in; None when unknown
+
+    Returns:
+        The translated SQL, or the original statement if nothing needed rewriting
+    """
+    return _translate(sql, _normalize_dialect(source), _normalize_dialect(target))
+
+
+def translation_cache_info():
+    """Expose LRU statistics for monitoring."""
+    return _translate.cache_info()
+
+
+def clear_translation_cache() -> None:
+    _translate.cache_clear()
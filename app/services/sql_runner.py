@@ -1,10 +1,25 @@
+import asyncio
 import time
+from collections import defaultdict
+from typing import Optional
 
 import asyncpg
+import logfire
 import sqlalchemy as sa
-from app.models import DatabaseConnection, QueryResult
-from app.services.redis_ops import get_data
-from sqlalchemy.ext.asyncio import create_async_engine
+from app.models import (
+    ColumnStatistics,
+    DatabaseConnection,
+    DatabaseStatistics,
+    QueryResult,
+    StatementResult,
+    TableStatistics,
+    TransactionStatement,
+)
+from app.services import local_cache
+from app.services.query_log import record_query
+from app.services.redis_ops import get_data, save_data
+from app.services.sql_dialect import translate_sql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
 
 class SQLExecutionError(Exception):
@@ -19,6 +34,158 @@ class ConnectionNotFoundError(Exception):
     pass
 
 
+class TransactionAbortedError(SQLExecutionError):
+    """Exception raised when a required statement fails and the whole transaction is rolled back."""
+
+    def __init__(self, message: str, results: list[StatementResult]):
+        super().__init__(message)
+        self.results = results
+
+
+# Long-lived pools used by transactional execution, keyed by connection ID.
+# The connection's updated_at is kept next to each pool so edited connections get a fresh one.
+_postgresql_pools: dict[str, tuple[float, asyncpg.Pool]] = {}
+_engines: dict[str, tuple[float, AsyncEngine]] = {}
+# One lock per connection: creating a pool connects to its database, and an unreachable
+# host must not hold up the pools of other connections
+_pool_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+# Pools of edited or deleted connections being closed
+_closing: set[asyncio.Task] = set()
+
+
+async def _get_postgresql_pool(connection: DatabaseConnection) -> asyncpg.Pool:
+    """Get (or create) the asyncpg pool for a connection."""
+    cached = _postgresql_pools.get(connection.id)
+    if cached and cached[0] == connection.updated_at:
+        return cached[1]
+
+    async with _pool_locks[connection.id]:
+        cached = _postgresql_pools.get(connection.id)
+        if cached and cached[0] == connection.updated_at:
+            return cached[1]
+
+        pool = await asyncpg.create_pool(
+            user=connection.username,
+            password=connection.password,
+            database=connection.database,
+            host=connection.host,
+            port=connection.port,
+            min_size=1,
+            max_size=10,
+            server_settings={"application_name": "pulse_sql_runner"},
+        )
+        stale = _postgresql_pools.get(connection.id)
+        _postgresql_pools[connection.id] = (connection.updated_at, pool)
+        if stale:
+            _close_later(stale, None)
+        return pool
+
+
+async def _get_engine(connection: DatabaseConnection) -> AsyncEngine:
+    """Get (or create) the SQLAlchemy engine for a connection."""
+    cached = _engines.get(connection.id)
+    if cached and cached[0] == connection.updated_at:
+        return cached[1]
+
+    async with _pool_locks[connection.id]:
+        cached = _engines.get(connection.id)
+        if cached and cached[0] == connection.updated_at:
+            return cached[1]
+
+        engine = create_async_engine(connection.get_connection_url(), echo=False, pool_pre_ping=True, pool_recycle=300)
+        stale = _engines.get(connection.id)
+        _engines[connection.id] = (connection.updated_at, engine)
+        if stale:
+            _close_later(None, stale)
+        return engine
+
+
+async def _close_pool(pool: Optional[tuple[float, asyncpg.Pool]], engine: Optional[tuple[float, AsyncEngine]]) -> None:
+    try:
+        if pool is not None:
+            await pool[1].close()
+        if engine is not None:
+            await engine[1].dispose()
+    except Exception as e:
+        logfire.info(f"Warning: could not close database pool: {str(e)}")
+
+
+def _close_later(pool: Optional[tuple[float, asyncpg.Pool]], engine: Optional[tuple[float, AsyncEngine]]) -> None:
+    # Queries in progress finish first: closing waits for their connections to be released
+    task = asyncio.create_task(_close_pool(pool, engine))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def _drop_pools(connection_id: str) -> None:
+    """Close the pools of a connection that was edited or deleted (in any process)."""
+    pool = _postgresql_pools.pop(connection_id, None)
+    engine = _engines.pop(connection_id, None)
+    if pool is not None or engine is not None:
+        _close_later(pool, engine)
+
+
+local_cache.on_evict(DatabaseConnection, _drop_pools)
+
+
+async def close_pools() -> None:
+    """Close every pooled database connection. Called on application shutdown."""
+    pools = list(_postgresql_pools.values())
+    engines = list(_engines.values())
+    _postgresql_pools.clear()
+    _engines.clear()
+    _pool_locks.clear()
+    for _, pool in pools:
+        await pool.close()
+    for _, engine in engines:
+        await engine.dispose()
+    if _closing:
+        await asyncio.gather(*_closing, return_exceptions=True)
+
+
+def _elapsed_ms(start_time: float) -> float:
+    return round((time.time() - start_time) * 1000, 2)
+
+
+def _result_from_records(records: list, start_time: float) -> QueryResult:
+    """Build a QueryResult from asyncpg records, keeping the records as rows (no copy, no validation)."""
+    columns = list(records[0].keys()) if records else []
+    return QueryResult.model_construct(
+        columns=columns, rows=records, row_count=len(records), execution_time_ms=_elapsed_ms(start_time)
+    )
+
+
+def _result_from_cursor(result: sa.CursorResult, start_time: float) -> QueryResult:
+    """Build a QueryResult from a SQLAlchemy cursor result, keeping the Row objects as rows."""
+    columns = []
+    rows = []
+
+    if result.returns_rows:
+        columns = list(result.keys())
+        rows = result.fetchall()
+    elif result.rowcount is not None:
+        # For non-SELECT queries, return row count if available
+        return QueryResult.model_construct(
+            columns=["affected_rows"],
+            rows=[[result.rowcount]],
+            row_count=1,
+            execution_time_ms=_elapsed_ms(start_time),
+        )
+
+    return QueryResult.model_construct(
+        columns=columns, rows=rows, row_count=len(rows), execution_time_ms=_elapsed_ms(start_time)
+    )
+
+
+def _batch_result(batch: list[list], start_time: float) -> QueryResult:
+    return QueryResult.model_construct(
+        columns=["executions"],
+        rows=[[len(batch)]],
+        row_count=1,
+        execution_time_ms=_elapsed_ms(start_time),
+    )
+
+
 async def _execute_postgresql_query(connection: DatabaseConnection, sql: str) -> QueryResult:
     """Execute query on PostgreSQL database."""
     start_time = time.time()
@@ -38,22 +205,7 @@ async def _execute_postgresql_query(connection: DatabaseConnection, sql: str) ->
             # Execute query
             result = await conn.fetch(sql)
 
-            # Process results
-            columns = []
-            rows = []
-
-            if result:
-                # Get column names from the first row
-                columns = list(result[0].keys())
-
-                # Convert rows to list format
-                rows = [list(row.values()) for row in result]
-
-            execution_time = (time.time() - start_time) * 1000
-
-            return QueryResult(
-                columns=columns, rows=rows, row_count=len(rows), execution_time_ms=round(execution_time, 2)
-            )
+            return _result_from_records(result, start_time)
 
         finally:
             await conn.close()
@@ -77,32 +229,7 @@ async def _execute_generic_query(connection: DatabaseConnection, sql: str) -> Qu
                 # Execute the query
                 result = await conn.execute(sa.text(sql))
 
-                # Process results
-                columns = []
-                rows = []
-
-                if result.returns_rows:
-                    # Get column names
-                    columns = list(result.keys())
-
-                    # Fetch all rows
-                    fetched_rows = result.fetchall()
-                    rows = [list(row) for row in fetched_rows]
-                else:
-                    # For non-SELECT queries, return row count if available
-                    if hasattr(result, "rowcount") and result.rowcount is not None:
-                        return QueryResult(
-                            columns=["affected_rows"],
-                            rows=[[result.rowcount]],
-                            row_count=1,
-                            execution_time_ms=round((time.time() - start_time) * 1000, 2),
-                        )
-
-                execution_time = (time.time() - start_time) * 1000
-
-                return QueryResult(
-                    columns=columns, rows=rows, row_count=len(rows), execution_time_ms=round(execution_time, 2)
-                )
+                return _result_from_cursor(result, start_time)
 
         finally:
             await engine.dispose()
@@ -114,52 +241,14 @@ async def _execute_generic_query(connection: DatabaseConnection, sql: str) -> Qu
         raise SQLExecutionError(f"Unexpected error: {str(e)}")
 
 
-def _translate_sql_for_sqlite(sql: str) -> str:
-    """
-    Translate common MySQL/PostgreSQL SQL commands to SQLite equivalents.
-
-    Args:
-        sql: The original SQL query
-
-    Returns:
-        Translated SQL query for SQLite
-    """
-    sql_upper = sql.upper().strip()
-
-    # Handle SHOW TABLES
-    if sql_upper == "SHOW TABLES;" or sql_upper == "SHOW TABLES":
-        return "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;"
-
-    # Handle SHOW DATABASES (not really applicable to SQLite, but provide something useful)
-    if sql_upper == "SHOW DATABASES;" or sql_upper == "SHOW DATABASES":
-        return "SELECT 'main' as database_name;"
-
-    # Handle DESC or DESCRIBE table
-    if sql_upper.startswith("DESC ") or sql_upper.startswith("DESCRIBE "):
-        # Extract table name
-        parts = sql.split()
-        if len(parts) >= 2:
-            table_name = parts[1].strip(";")
-            return f"PRAGMA table_info({table_name});"
-
-    # Handle SHOW COLUMNS FROM table
-    if sql_upper.startswith("SHOW COLUMNS FROM "):
-        parts = sql.split()
-        if len(parts) >= 4:
-            table_name = parts[3].strip(";")
-            return f"PRAGMA table_info({table_name});"
-
-    # Return original SQL if no translation needed
-    return sql
-
-
-async def run_sql_query(connection_id: str, sql: str) -> QueryResult:
+async def run_sql_query(connection_id: str, sql: str, source_dialect: Optional[str] = None) -> QueryResult:
     """
     Execute a SQL query on the specified database connection.
 
     Args:
         connection_id: The ID of the database connection to use
         sql: The SQL query to execute
+        source_dialect: Dialect the SQL was written in, if known (None means a PostgreSQL/MySQL mix)
 
     Returns:
         QueryResult with the query results
@@ -179,16 +268,203 @@ async def run_sql_query(connection_id: str, sql: str) -> QueryResult:
     if not sql:
         raise SQLExecutionError("SQL query cannot be empty")
 
-    # Translate SQL for SQLite if needed
-    if connection.db_type.value == "sqlite":
-        sql = _translate_sql_for_sqlite(sql)
+    # Translate SQL into the connection's dialect (memoized per statement)
+    try:
+        sql = translate_sql(sql, connection.db_type, source_dialect)
+    except ValueError as e:
+        raise SQLExecutionError(str(e))
 
     # Use PostgreSQL-specific implementation for better performance
     if connection.db_type.value == "postgresql":
-        return await _execute_postgresql_query(connection, sql)
+        result = await _execute_postgresql_query(connection, sql)
     else:
         # Use generic SQLAlchemy implementation for other databases
-        return await _execute_generic_query(connection, sql)
+        result = await _execute_generic_query(connection, sql)
+
+    _log_query(connection.id, sql, result.execution_time_ms)
+    return result
+
+
+# Query log writes run in the background so they never add latency to a query
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _log_query(connection_id: str, sql: str, execution_time_ms: float) -> None:
+    task = asyncio.create_task(record_query(connection_id, sql, execution_time_ms))
+    _background_tasks.add(task)
+    task.add_done_callback(_finish_log_task)
+
+
+def _finish_log_task(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logfire.info(f"Warning: Could not record query fingerprint: {task.exception()}")
+
+
+async def explain_query(connection: DatabaseConnection, sql: str, generic: bool = False) -> QueryResult:
+    """
+    Return the planner's execution plan for a statement without running it.
+
+    PostgreSQL returns a single JSON document, MySQL the tabular EXPLAIN and
+    SQLite the EXPLAIN QUERY PLAN rows. With generic, PostgreSQL plans a statement
+    with $n parameters (GENERIC_PLAN, PostgreSQL 16 and later).
+
+    Raises:
+        SQLExecutionError: If the statement cannot be explained
+    """
+    if connection.db_type.value == "postgresql":
+        options = "FORMAT JSON, GENERIC_PLAN" if generic else "FORMAT JSON"
+        return await _execute_postgresql_query(connection, f"EXPLAIN ({options}) {sql}")
+    if connection.db_type.value == "sqlite":
+        return await _execute_generic_query(connection, f"EXPLAIN QUERY PLAN {sql}")
+    return await _execute_generic_query(connection, f"EXPLAIN {sql}")
+
+
+async def _run_postgresql_statement(conn: asyncpg.Connection, statement: TransactionStatement) -> QueryResult:
+    """Run one transaction statement on an asyncpg connection."""
+    start_time = time.time()
+    if statement.batch is not None:
+        # executemany pipelines every parameter set in a single round trip
+        await conn.executemany(statement.sql, statement.batch)
+        return _batch_result(statement.batch, start_time)
+
+    records = await conn.fetch(statement.sql, *(statement.params or []))
+    return _result_from_records(records, start_time)
+
+
+async def _run_generic_statement(conn: AsyncConnection, statement: TransactionStatement) -> QueryResult:
+    """Run one transaction statement on a SQLAlchemy connection."""
+    start_time = time.time()
+    if statement.batch is not None:
+        await conn.exec_driver_sql(statement.sql, [tuple(params) for params in statement.batch])
+        return _batch_result(statement.batch, start_time)
+
+    if statement.params is not None:
+        result = await conn.exec_driver_sql(statement.sql, tuple(statement.params))
+    else:
+        result = await conn.execute(sa.text(statement.sql))
+    return _result_from_cursor(result, start_time)
+
+
+class _RequiredStatementFailed(Exception):
+    def __init__(self, index: int, error: Exception):
+        super().__init__(str(error))
+        self.index = index
+        self.error = error
+
+
+async def _execute_postgresql_transaction(
+    connection: DatabaseConnection, statements: list[TransactionStatement]
+) -> list[StatementResult]:
+    """Run statements in a single transaction on one pooled asyncpg connection."""
+    pool = await _get_postgresql_pool(connection)
+    results: list[StatementResult] = []
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            for index, statement in enumerate(statements):
+                if not statement.optional:
+                    try:
+                        data = await _run_postgresql_statement(conn, statement)
+                    except Exception as e:
+                        raise _RequiredStatementFailed(index, e)
+                    results.append(StatementResult(index=index, status="ok", data=data))
+                    continue
+
+                # Nested transaction blocks are savepoints in asyncpg
+                try:
+                    async with conn.transaction():
+                        data = await _run_postgresql_statement(conn, statement)
+                    results.append(StatementResult(index=index, status="ok", data=data))
+                except Exception as e:
+                    results.append(StatementResult(index=index, status="rolled_back", error=str(e)))
+
+    return results
+
+
+async def _execute_generic_transaction(
+    connection: DatabaseConnection, statements: list[TransactionStatement]
+) -> list[StatementResult]:
+    """Run statements in a single transaction on one pooled SQLAlchemy connection."""
+    engine = await _get_engine(connection)
+    results: list[StatementResult] = []
+
+    async with engine.begin() as conn:
+        for index, statement in enumerate(statements):
+            if not statement.optional:
+                try:
+                    data = await _run_generic_statement(conn, statement)
+                except Exception as e:
+                    raise _RequiredStatementFailed(index, e)
+                results.append(StatementResult(index=index, status="ok", data=data))
+                continue
+
+            try:
+                async with conn.begin_nested():
+                    data = await _run_generic_statement(conn, statement)
+                results.append(StatementResult(index=index, status="ok", data=data))
+            except Exception as e:
+                results.append(StatementResult(index=index, status="rolled_back", error=str(e)))
+
+    return results
+
+
+async def run_sql_transaction(
+    connection_id: str, statements: list[TransactionStatement], source_dialect: Optional[str] = None
+) -> list[StatementResult]:
+    """
+    Execute an ordered list of statements in one transaction on one pooled connection.
+
+    Required statements are all-or-nothing: if one fails, every statement is rolled back.
+    Optional statements run inside a savepoint, so their failure only undoes that statement.
+
+    Args:
+        connection_id: The ID of the database connection to use
+        statements: Statements to execute, in order
+        source_dialect: Dialect the SQL was written in, if known
+
+    Returns:
+        One StatementResult per statement
+
+    Raises:
+        ConnectionNotFoundError: If the connection ID is not found
+        TransactionAbortedError: If a required statement fails (carries per-statement results)
+        SQLExecutionError: If the transaction could not be run at all
+    """
+    try:
+        connection = await get_data(connection_id, DatabaseConnection)
+    except KeyError:
+        raise ConnectionNotFoundError(f"Database connection with ID {connection_id} not found")
+
+    translated = []
+    for statement in statements:
+        sql = statement.sql.strip()
+        if not sql:
+            raise SQLExecutionError("SQL query cannot be empty")
+        try:
+            sql = translate_sql(sql, connection.db_type, source_dialect)
+        except ValueError as e:
+            raise SQLExecutionError(str(e))
+        translated.append(statement.model_copy(update={"sql": sql}))
+
+    try:
+        if connection.db_type.value == "postgresql":
+            return await _execute_postgresql_transaction(connection, translated)
+        return await _execute_generic_transaction(connection, translated)
+
+    except _RequiredStatementFailed as failure:
+        results = []
+        for index in range(len(statements)):
+            if index < failure.index:
+                results.append(StatementResult(index=index, status="rolled_back"))
+            elif index == failure.index:
+                results.append(StatementResult(index=index, status="error", error=str(failure.error)))
+            else:
+                results.append(StatementResult(index=index, status="skipped"))
+        raise TransactionAbortedError(f"Statement {failure.index} failed, transaction rolled back", results)
+
+    except Exception as e:
+        raise SQLExecutionError(f"Transaction failed: {str(e)}")
 
 
 async def test_database_connection(connection: DatabaseConnection) -> bool:
@@ -334,3 +610,141 @@ async def get_database_schema(connection: DatabaseConnection) -> dict:
 
     except Exception as e:
         raise SQLExecutionError(f"Failed to get database schema: {str(e)}")
+
+
+# Statistics are cheap to read but change slowly, so they are cached per connection
+TABLE_STATISTICS_TTL = 600
+
+
+async def _collect_postgresql_statistics(connection: DatabaseConnection) -> dict[str, TableStatistics]:
+    """Read row estimates from pg_class and column statistics from pg_stats."""
+    tables: dict[str, TableStatistics] = {}
+
+    tables_result = await _execute_postgresql_query(
+        connection,
+        """
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p');
+        """,
+    )
+    for table_name, reltuples in tables_result.rows:
+        # reltuples is -1 for tables that were never vacuumed or analyzed
+        tables[table_name] = TableStatistics(row_estimate=reltuples if reltuples >= 0 else None)
+
+    stats_result = await _execute_postgresql_query(
+        connection,
+        """
+            SELECT tablename, attname, null_frac, n_distinct
+            FROM pg_stats
+            WHERE schemaname = 'public';
+        """,
+    )
+    for table_name, column_name, null_frac, n_distinct in stats_result.rows:
+        table = tables.setdefault(table_name, TableStatistics())
+        distinct = n_distinct
+        # Negative n_distinct is a fraction of the row count
+        if n_distinct is not None and n_distinct < 0:
+            distinct = -n_distinct * table.row_estimate if table.row_estimate is not None else None
+        table.columns[column_name] = ColumnStatistics(null_fraction=null_frac, distinct_estimate=distinct)
+
+    return tables
+
+
+async def _collect_mysql_statistics(connection: DatabaseConnection) -> dict[str, TableStatistics]:
+    """Read row estimates from information_schema.TABLES and index cardinality from STATISTICS."""
+    tables: dict[str, TableStatistics] = {}
+
+    tables_result = await _execute_generic_query(
+        connection,
+        f"SELECT table_name, table_rows FROM information_schema.TABLES WHERE table_schema = '{connection.database}';",
+    )
+    for table_name, table_rows in tables_result.rows:
+        tables[table_name] = TableStatistics(row_estimate=table_rows)
+
+    # MySQL only keeps distinct estimates for indexed columns and no null fractions
+    cardinality_result = await _execute_generic_query(
+        connection,
+        f"""
+            SELECT table_name, column_name, MAX(cardinality)
+            FROM information_schema.STATISTICS
+            WHERE table_schema = '{connection.database}'
+            GROUP BY table_name, column_name;
+        """,
+    )
+    for table_name, column_name, cardinality in cardinality_result.rows:
+        table = tables.setdefault(table_name, TableStatistics())
+        table.columns[column_name] = ColumnStatistics(distinct_estimate=cardinality)
+
+    return tables
+
+
+async def _collect_sqlite_statistics(connection: DatabaseConnection) -> dict[str, TableStatistics]:
+    """Read row and distinct estimates from sqlite_stat1 (only present after ANALYZE)."""
+    tables: dict[str, TableStatistics] = {}
+
+    exists_result = await _execute_generic_query(
+        connection, "SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_stat1';"
+    )
+    if not exists_result.rows:
+        return tables
+
+    # stat is "<rows> <avg rows per distinct value of the 1st index column> ...";
+    # pair each index with its leading column so the average becomes a distinct estimate
+    stats_result = await _execute_generic_query(
+        connection,
+        """
+            SELECT s.tbl, s.stat, ii.name
+            FROM sqlite_stat1 s
+            LEFT JOIN pragma_index_info(s.idx) ii ON ii.seqno = 0;
+        """,
+    )
+    for table_name, stat, column_name in stats_result.rows:
+        values = [int(v) for v in str(stat).split() if v.isdigit()]
+        if not values:
+            continue
+        table = tables.setdefault(table_name, TableStatistics())
+        table.row_estimate = max(table.row_estimate or 0, values[0])
+        if column_name and len(values) > 1 and values[1] > 0:
+            table.columns[column_name] = ColumnStatistics(distinct_estimate=values[0] / values[1])
+
+    return tables
+
+
+async def collect_table_statistics(connection: DatabaseConnection) -> DatabaseStatistics:
+    """
+    Collect table statistics from the database's own catalog.
+
+    Only catalog views are read (no COUNT(*) or table scans), so this is cheap
+    even on very large databases. Figures are the planner's estimates.
+
+    Raises:
+        SQLExecutionError: If the catalog could not be read
+    """
+    try:
+        if connection.db_type.value == "postgresql":
+            tables = await _collect_postgresql_statistics(connection)
+        elif connection.db_type.value == "mysql":
+            tables = await _collect_mysql_statistics(connection)
+        elif connection.db_type.value == "sqlite":
+            tables = await _collect_sqlite_statistics(connection)
+        else:
+            tables = {}
+    except Exception as e:
+        raise SQLExecutionError(f"Failed to collect table statistics: {str(e)}")
+
+    return DatabaseStatistics(connection_id=connection.id, tables=tables)
+
+
+async def get_table_statistics(connection: DatabaseConnection, refresh: bool = False) -> DatabaseStatistics:
+    """Get table statistics for a connection, served from Redis while the cached copy is fresh."""
+    if not refresh:
+        try:
+            return await get_data(connection.id, DatabaseStatistics)
+        except KeyError:
+            pass
+
+    statistics = await collect_table_statistics(connection)
+    await save_data(connection.id, statistics, ttl=TABLE_STATISTICS_TTL)
+    return statistics
@@ -0,0 +1,825 @@
+"""
+Storage backends for Redis-shaped data.
+
+Everything that persists state (redis_ops, the orchestrator, schema_store,
+query_log, local_cache, ...) talks to a StorageBackend: the subset of the
+redis.asyncio.Redis API the app uses, covering strings with TTLs, sets,
+hashes, sorted sets, pipelines/MULTI, pub/sub and streams with consumer groups.
+
+Two implementations exist:
+
+- Redis (redis.asyncio.Redis), used for any redis:// or rediss:// URL.
+- InMemoryRedis, an asyncio implementation of the same commands and return
+  shapes (RESP2, as parsed by redis-py) for REDIS_URL=memory://. It needs no
+  server, so tests and throughput benchmarks run on one machine. State is per
+  process: it is not a substitute for Redis when several workers run.
+"""
+
+import asyncio
+import fnmatch
+import heapq
+import itertools
+import time
+import zlib
+from collections.abc import AsyncIterator
+from typing import Any, Optional, Protocol
+
+from redis.exceptions import ResponseError
+
+MEMORY_URL_SCHEME = "memory://"
+# Expired keys are dropped when read, and by a sweep every this many expiring writes
+EXPIRE_SWEEP_EVERY = 1000
+
+
+class StorageBackend(Protocol):
+    """Commands the app relies on; redis.asyncio.Redis and InMemoryRedis both provide them."""
+
+    async def get(self, name) -> Any: ...
+    async def set(self, name, value, ex=None, nx: bool = False) -> Any: ...
+    async def mget(self, keys, *args) -> list: ...
+    async def delete(self, *names) -> int: ...
+    async def exists(self, *names) -> int: ...
+    async def expire(self, name, time) -> bool: ...
+    def scan_iter(self, match=None, count=None) -> AsyncIterator: ...
+    async def hset(self, name, key=None, value=None, mapping=None) -> int: ...
+    async def hmget(self, name, keys, *args) -> list: ...
+    async def hgetall(self, name) -> dict: ...
+    async def zadd(self, name, mapping) -> int: ...
+    async def zrank(self, name, value) -> Optional[int]: ...
+    async def zrevrangebyscore(self, name, max, min, start=None, num=None, withscores=False) -> list: ...
+    async def publish(self, channel, message) -> int: ...
+    async def spublish(self, shard_channel, message) -> int:
+        # A single process has one shard
+        return await self.publish(shard_channel, message)
+
+    def pubsub(self) -> Any: ...
+    async def xadd(self, name, fields, id="*", maxlen=None, approximate=True) -> Any: ...
+    async def xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False) -> list: ...
+    async def xack(self, name, groupname, *ids) -> int: ...
+    async def xdel(self, name, *ids) -> int: ...
+    async def xgroup_create(self, name, groupname, id="$", mkstream: bool = False) -> bool: ...
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=None) -> list: ...
+    async def xclaim(self, name, groupname, consumername, min_idle_time, message_ids, idle=None) -> list: ...
+    def pipeline(self, transaction: bool = True) -> Any: ...
+
+
+def _wrongtype() -> ResponseError:
+    return ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def _to_bytes(value: Any) -> bytes:
+    """Encode a value the way redis-py does before sending it."""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    if isinstance(value, bool):
+        raise TypeError("Invalid input of type: 'bool'. Convert to a bytes, string, int or float first.")
+    if isinstance(value, int | float):
+        return repr(value).encode("utf-8")
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    raise TypeError(f"Invalid input of type: '{type(value).__name__}'")
+
+
+def _score_bound(value: Any) -> tuple[float, bool]:
+    """Parse a ZRANGEBYSCORE bound: returns (score, exclusive)."""
+    if isinstance(value, int | float):
+        return float(value), False
+    text = value.decode("utf-8") if isinstance(value, bytes) else str(value)
+    exclusive = text.startswith("(")
+    if exclusive:
+        text = text[1:]
+    return float(text.replace("+inf", "inf")), exclusive
+
+
+def _stream_id(value: Any) -> tuple[int, int]:
+    text = value.decode("utf-8") if isinstance(value, bytes) else str(value)
+    if text == "-":
+        return (0, 0)
+    if text == "+":
+        return (2**63, 2**63)
+    ms, _, seq = text.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _format_stream_id(stream_id: tuple[int, int]) -> bytes:
+    return f"{stream_id[0]}-{stream_id[1]}".encode()
+
+
+class _ConsumerGroup:
+    def __init__(self, last_delivered: tuple[int, int]):
+        self.last_delivered = last_delivered
+        # id -> [consumer, delivery time (monotonic ms), delivery count]
+        self.pending: dict[tuple[int, int], list] = {}
+
+
+class _Stream:
+    def __init__(self):
+        self.entries: dict[tuple[int, int], dict[bytes, bytes]] = {}
+        self.last_id = (0, 0)
+        self.groups: dict[bytes, _ConsumerGroup] = {}
+
+
+class InMemoryStore:
+    """Keyspace shared by every InMemoryRedis client of a process."""
+
+    def __init__(self):
+        self.data: dict[bytes, Any] = {}
+        self.expires: dict[bytes, float] = {}
+        self._expiring_writes = 0
+        self.channels: dict[bytes, set[InMemoryPubSub]] = {}
+        # Notified on every XADD so blocked XREADGROUP calls wake up
+        self.stream_added = asyncio.Condition()
+
+    def alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key in self.data
+
+    def set_expiry(self, key: bytes, seconds: float) -> None:
+        self.expires[key] = time.monotonic() + seconds
+        self._expiring_writes += 1
+        if self._expiring_writes >= EXPIRE_SWEEP_EVERY:
+            self._expiring_writes = 0
+            now = time.monotonic()
+            for expired in [k for k, deadline in self.expires.items() if deadline <= now]:
+                self.data.pop(expired, None)
+                del self.expires[expired]
+
+    def lookup(self, key: bytes, kind: type) -> Any:
+        """Value of a key, None if missing; raises WRONGTYPE if it holds another type."""
+        if not self.alive(key):
+            return None
+        value = self.data[key]
+        # Exact type: a sorted set is a dict underneath but not a hash
+        if type(value) is not kind:
+            raise _wrongtype()
+        return value
+
+    def create(self, key: bytes, kind: type) -> Any:
+        value = self.lookup(key, kind)
+        if value is None:
+            value = self.data[key] = kind()
+        return value
+
+    def drop_if_empty(self, key: bytes) -> None:
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, bytes | _Stream) and not value:
+            del self.data[key]
+            self.expires.pop(key, None)
+
+
+_TYPE_NAMES = {bytes: "string", set: "set", dict: "hash", _Stream: "stream"}
+
+
+class _SortedSet(dict):
+    """member -> score."""
+
+
+_TYPE_NAMES[_SortedSet] = "zset"
+
+
+class InMemoryRedis:
+    """In-process implementation of the StorageBackend commands."""
+
+    def __init__(self, store: Optional[InMemoryStore] = None, decode_responses: bool = False):
+        self.store = store or InMemoryStore()
+        self.decode_responses = decode_responses
+
+    # Helpers
+
+    def _out(self, value: Any) -> Any:
+        if self.decode_responses and isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def _hash(self, name) -> Optional[dict]:
+        return self.store.lookup(_to_bytes(name), dict)
+
+    def _zset(self, name) -> Optional[_SortedSet]:
+        return self.store.lookup(_to_bytes(name), _SortedSet)
+
+    def _set(self, name) -> Optional[set]:
+        return self.store.lookup(_to_bytes(name), set)
+
+    def _stream(self, name) -> Optional[_Stream]:
+        return self.store.lookup(_to_bytes(name), _Stream)
+
+    # Connection
+
+    async def ping(self) -> bool:
+        return True
+
+    async def aclose(self) -> None:
+        pass
+
+    # Keys and strings
+
+    async def get(self, name) -> Any:
+        return self._out(self.store.lookup(_to_bytes(name), bytes))
+
+    async def set(self, name, value, ex=None, px=None, nx: bool = False, xx: bool = False) -> Optional[bool]:
+        key = _to_bytes(name)
+        exists = self.store.alive(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.store.data[key] = _to_bytes(value)
+        self.store.expires.pop(key, None)
+        if ex is not None or px is not None:
+            seconds = float(ex) if ex is not None else px / 1000
+            self.store.set_expiry(key, seconds)
+        return True
+
+    async def setex(self, name, time, value) -> bool:
+        return await self.set(name, value, ex=time)
+
+    async def mget(self, keys, *args) -> list:
+        names = [keys, *args] if isinstance(keys, str | bytes) else [*keys, *args]
+        values = []
+        for name in names:
+            try:
+                values.append(await self.get(name))
+            except ResponseError:
+                values.append(None)
+        return values
+
+    async def delete(self, *names) -> int:
+        deleted = 0
+        for name in names:
+            key = _to_bytes(name)
+            if self.store.alive(key):
+                del self.store.data[key]
+                self.store.expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    async def exists(self, *names) -> int:
+        return sum(1 for name in names if self.store.alive(_to_bytes(name)))
+
+    async def expire(self, name, time_: Any) -> bool:
+        key = _to_bytes(name)
+        if not self.store.alive(key):
+            return False
+        self.store.set_expiry(key, float(time_))
+        return True
+
+    async def ttl(self, name) -> int:
+        key = _to_bytes(name)
+        if not self.store.alive(key):
+            return -2
+        deadline = self.store.expires.get(key)
+        return -1 if deadline is None else max(round(deadline - time.monotonic()), 0)
+
+    async def pttl(self, name) -> int:
+        key = _to_bytes(name)
+        if not self.store.alive(key):
+            return -2
+        deadline = self.store.expires.get(key)
+        return -1 if deadline is None else max(round((deadline - time.monotonic()) * 1000), 0)
+
+    async def type(self, name) -> Any:
+        key = _to_bytes(name)
+        if not self.store.alive(key):
+            return self._out(b"none")
+        return self._out(_TYPE_NAMES[type(self.store.data[key])].encode())
+
+    async def scan_iter(self, match=None, count=None, _type=None):
+        pattern = match.decode("utf-8") if isinstance(match, bytes) else match
+        for key in list(self.store.data):
+            if not self.store.alive(key):
+                continue
+            if pattern is None or fnmatch.fnmatchcase(key.decode("utf-8", "replace"), pattern):
+                yield self._out(key)
+
+    async def keys(self, pattern="*") -> list:
+        return [key async for key in self.scan_iter(match=pattern)]
+
+    async def flushall(self) -> bool:
+        self.store.data.clear()
+        self.store.expires.clear()
+        return True
+
+    # Sets
+
+    async def sadd(self, name, *values) -> int:
+        members = self.store.create(_to_bytes(name), set)
+        added = {_to_bytes(value) for value in values} - members
+        members.update(added)
+        return len(added)
+
+    async def srem(self, name, *values) -> int:
+        members = self._set(name)
+        if members is None:
+            return 0
+        removed = {_to_bytes(value) for value in values} & members
+        members.difference_update(removed)
+        self.store.drop_if_empty(_to_bytes(name))
+        return len(removed)
+
+    async def smembers(self, name) -> set:
+        return {self._out(member) for member in self._set(name) or ()}
+
+    async def scard(self, name) -> int:
+        return len(self._set(name) or ())
+
+    async def sscan(self, name, cursor: int = 0, match=None, count=None) -> tuple[int, list]:
+        """
+        Members are visited in order of a stable hash and the cursor is the next hash
+        to visit, so, like Redis, members present for the whole iteration are returned
+        even if others are added or removed between calls.
+        """
+        count = count or 10
+        pattern = match.decode("utf-8") if isinstance(match, bytes) else match
+        remaining = [
+            (slot, member) for member in self._set(name) or () if (slot := zlib.crc32(member) + 1) >= int(cursor)
+        ]
+        page = heapq.nsmallest(count, remaining)
+        next_cursor = 0
+        if len(remaining) > count:
+            # Never split members sharing a slot across pages
+            last_slot = page[-1][0]
+            page += [item for item in remaining if item[0] == last_slot and item > page[-1]]
+            next_cursor = last_slot + 1
+        return next_cursor, [
+            self._out(member)
+            for _, member in page
+            if pattern is None or fnmatch.fnmatchcase(member.decode("utf-8", "replace"), pattern)
+        ]
+
+    async def sscan_iter(self, name, match=None, count=None):
+        cursor = 0
+        while True:
+            cursor, members = await self.sscan(name, cursor, match=match, count=count)
+            for member in members:
+                yield member
+            if cursor == 0:
+                return
+
+    # Hashes
+
+    async def hset(self, name, key=None, value=None, mapping=None, items=None) -> int:
+        fields = self.store.create(_to_bytes(name), dict)
+        pairs = dict(mapping or {})
+        if key is not None:
+            pairs[key] = value
+        added = 0
+        for field, field_value in pairs.items():
+            field = _to_bytes(field)
+            added += field not in fields
+            fields[field] = _to_bytes(field_value)
+        return added
+
+    async def hget(self, name, key) -> Any:
+        return self._out((self._hash(name) or {}).get(_to_bytes(key)))
+
+    async def hmget(self, name, keys, *args) -> list:
+        fields = self._hash(name) or {}
+        names = [keys, *args] if isinstance(keys, str | bytes) else [*keys, *args]
+        return [self._out(fields.get(_to_bytes(field))) for field in names]
+
+    async def hgetall(self, name) -> dict:
+        return {self._out(field): self._out(value) for field, value in (self._hash(name) or {}).items()}
+
+    async def hdel(self, name, *keys) -> int:
+        fields = self._hash(name)
+        if fields is None:
+            return 0
+        deleted = sum(1 for key in keys if fields.pop(_to_bytes(key), None) is not None)
+        self.store.drop_if_empty(_to_bytes(name))
+        return deleted
+
+    async def hexists(self, name, key) -> bool:
+        return _to_bytes(key) in (self._hash(name) or {})
+
+    async def hkeys(self, name) -> list:
+        return [self._out(field) for field in self._hash(name) or {}]
+
+    # Sorted sets
+
+    def _ordered(self, zset: _SortedSet, reverse: bool = False) -> list[tuple[bytes, float]]:
+        return sorted(zset.items(), key=lambda item: (item[1], item[0]), reverse=reverse)
+
+    def _scored(self, items: list[tuple[bytes, float]], withscores: bool) -> list:
+        if withscores:
+            return [(self._out(member), score) for member, score in items]
+        return [self._out(member) for member, _ in items]
+
+    async def zadd(self, name, mapping, nx: bool = False, xx: bool = False) -> int:
+        zset = self.store.create(_to_bytes(name), _SortedSet)
+        added = 0
+        for member, score in mapping.items():
+            member = _to_bytes(member)
+            exists = member in zset
+            if (nx and exists) or (xx and not exists):
+                continue
+            added += not exists
+            zset[member] = float(score)
+        return added
+
+    async def zincrby(self, name, amount, value) -> float:
+        zset = self.store.create(_to_bytes(name), _SortedSet)
+        member = _to_bytes(value)
+        zset[member] = zset.get(member, 0.0) + float(amount)
+        return zset[member]
+
+    async def zrem(self, name, *values) -> int:
+        zset = self._zset(name)
+        if zset is None:
+            return 0
+        removed = sum(1 for value in values if zset.pop(_to_bytes(value), None) is not None)
+        self.store.drop_if_empty(_to_bytes(name))
+        return removed
+
+    async def zscore(self, name, value) -> Optional[float]:
+        return (self._zset(name) or {}).get(_to_bytes(value))
+
+    async def zmscore(self, key, members) -> list:
+        zset = self._zset(key) or {}
+        return [zset.get(_to_bytes(member)) for member in members]
+
+    async def zcard(self, name) -> int:
+        return len(self._zset(name) or ())
+
+    async def zrank(self, name, value) -> Optional[int]:
+        zset = self._zset(name) or _SortedSet()
+        member = _to_bytes(value)
+        if member not in zset:
+            return None
+        return [item for item, _ in self._ordered(zset, reverse=False)].index(member)
+
+    async def zrange(self, name, start: int, end: int, desc: bool = False, withscores: bool = False) -> list:
+        items = self._ordered(self._zset(name) or _SortedSet(), reverse=desc)
+        end = len(items) if end == -1 else end + 1
+        return self._scored(items[start:end], withscores)
+
+    async def zrevrange(self, name, start: int, end: int, withscores: bool = False) -> list:
+        return await self.zrange(name, start, end, desc=True, withscores=withscores)
+
+    def _by_score(self, name, low, high, reverse: bool, start, num) -> list[tuple[bytes, float]]:
+        low_score, low_exclusive = _score_bound(low)
+        high_score, high_exclusive = _score_bound(high)
+        items = [
+            (member, score)
+            for member, score in self._ordered(self._zset(name) or _SortedSet(), reverse=reverse)
+            if (score > low_score if low_exclusive else score >= low_score)
+            and (score < high_score if high_exclusive else score <= high_score)
+        ]
+        if start is not None and num is not None:
+            items = items[start:] if num < 0 else items[start : start + num]
+        return items
+
+    async def zrangebyscore(self, name, min, max, start=None, num=None, withscores: bool = False) -> list:
+        return self._scored(self._by_score(name, min, max, False, start, num), withscores)
+
+    async def zrevrangebyscore(self, name, max, min, start=None, num=None, withscores: bool = False) -> list:
+        return self._scored(self._by_score(name, min, max, True, start, num), withscores)
+
+    async def zremrangebyscore(self, name, min, max) -> int:
+        zset = self._zset(name)
+        if zset is None:
+            return 0
+        removed = self._by_score(name, min, max, False, None, None)
+        for member, _ in removed:
+            del zset[member]
+        self.store.drop_if_empty(_to_bytes(name))
+        return len(removed)
+
+    # Pub/sub
+
+    async def publish(self, channel, message) -> int:
+        subscribers = self.store.channels.get(_to_bytes(channel), set())
+        for pubsub in subscribers:
+            pubsub.deliver(_to_bytes(channel), _to_bytes(message))
+        return len(subscribers)
+
+    async def spublish(self, shard_channel, message) -> int:
+        # A single process has one shard
+        return await self.publish(shard_channel, message)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "InMemoryPubSub":
+        return InMemoryPubSub(self, ignore_subscribe_messages)
+
+    # Streams
+
+    async def xadd(self, name, fields, id="*", maxlen=None, approximate: bool = True, nomkstream: bool = False) -> Any:
+        key = _to_bytes(name)
+        if nomkstream and self._stream(name) is None:
+            return None
+        stream = self.store.create(key, _Stream)
+        if id == "*":
+            ms = int(time.time() * 1000)
+            entry_id = (ms, stream.last_id[1] + 1) if ms <= stream.last_id[0] else (ms, 0)
+            entry_id = max(entry_id, (stream.last_id[0], stream.last_id[1] + 1))
+        else:
+            entry_id = _stream_id(id)
+            if entry_id <= stream.last_id:
+                raise ResponseError("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.entries[entry_id] = {_to_bytes(field): _to_bytes(value) for field, value in fields.items()}
+        stream.last_id = entry_id
+        if maxlen is not None:
+            for old_id in list(itertools.islice(stream.entries, max(len(stream.entries) - maxlen, 0))):
+                del stream.entries[old_id]
+
+        async with self.store.stream_added:
+            self.store.stream_added.notify_all()
+        return self._out(_format_stream_id(entry_id))
+
+    async def xlen(self, name) -> int:
+        stream = self._stream(name)
+        return len(stream.entries) if stream else 0
+
+    async def xdel(self, name, *ids) -> int:
+        stream = self._stream(name)
+        if stream is None:
+            return 0
+        return sum(1 for entry_id in ids if stream.entries.pop(_stream_id(entry_id), None) is not None)
+
+    async def xgroup_create(self, name, groupname, id="$", mkstream: bool = False) -> bool:
+        stream = self._stream(name)
+        if stream is None:
+            if not mkstream:
+                raise ResponseError("ERR The XGROUP subcommand requires the key to exist.")
+            stream = self.store.create(_to_bytes(name), _Stream)
+        group = _to_bytes(groupname)
+        if group in stream.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        stream.groups[group] = _ConsumerGroup(stream.last_id if id == "$" else _stream_id(id))
+        return True
+
+    def _group(self, name, groupname) -> tuple[_Stream, _ConsumerGroup]:
+        stream = self._stream(name)
+        group = stream.groups.get(_to_bytes(groupname)) if stream else None
+        if group is None:
+            raise ResponseError(
+                f"NOGROUP No such key '{name}' or consumer group '{groupname}' in XREADGROUP with GROUP option"
+            )
+        return stream, group
+
+    def _entry(self, stream: _Stream, entry_id: tuple[int, int]) -> tuple:
+        fields = stream.entries[entry_id]
+        return (
+            self._out(_format_stream_id(entry_id)),
+            {self._out(field): self._out(value) for field, value in fields.items()},
+        )
+
+    def _read_group(self, groupname, consumername, streams: dict, count, noack: bool) -> list:
+        consumer = _to_bytes(consumername)
+        now = time.monotonic() * 1000
+        result = []
+        for name, start in streams.items():
+            stream, group = self._group(name, groupname)
+            entries = []
+            if start in (">", b">"):
+                for entry_id in stream.entries:
+                    if entry_id <= group.last_delivered:
+                        continue
+                    group.last_delivered = entry_id
+                    if not noack:
+                        group.pending[entry_id] = [consumer, now, 1]
+                    entries.append(self._entry(stream, entry_id))
+                    if count and len(entries) >= count:
+                        break
+            else:
+                # Re-read this consumer's pending entries
+                after = _stream_id(start)
+                for entry_id, (owner, _, _) in sorted(group.pending.items()):
+                    if owner == consumer and entry_id > after and entry_id in stream.entries:
+                        entries.append(self._entry(stream, entry_id))
+                        if count and len(entries) >= count:
+                            break
+            if entries or start not in (">", b">"):
+                result.append([self._out(_to_bytes(name)), entries])
+        return result
+
+    async def xreadgroup(
+        self, groupname, consumername, streams: dict, count=None, block=None, noack: bool = False
+    ) -> list:
+        result = self._read_group(groupname, consumername, streams, count, noack)
+        if result or block is None:
+            return result
+
+        deadline = None if block == 0 else time.monotonic() + block / 1000
+        async with self.store.stream_added:
+            while True:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(self.store.stream_added.wait(), timeout)
+                except TimeoutError:
+                    return []
+                result = self._read_group(groupname, consumername, streams, count, noack)
+                if result:
+                    return result
+
+    async def xack(self, name, groupname, *ids) -> int:
+        _, group = self._group(name, groupname)
+        return sum(1 for entry_id in ids if group.pending.pop(_stream_id(entry_id), None) is not None)
+
+    async def xpending(self, name, groupname) -> dict:
+        _, group = self._group(name, groupname)
+        ids = sorted(group.pending)
+        consumers: dict[bytes, int] = {}
+        for owner, _, _ in group.pending.values():
+            consumers[owner] = consumers.get(owner, 0) + 1
+        return {
+            "pending": len(ids),
+            "min": self._out(_format_stream_id(ids[0])) if ids else None,
+            "max": self._out(_format_stream_id(ids[-1])) if ids else None,
+            "consumers": [{"name": self._out(owner), "pending": n} for owner, n in consumers.items()],
+        }
+
+    async def xautoclaim(
+        self, name, groupname, consumername, min_idle_time: int, start_id="0-0", count=None, justid: bool = False
+    ) -> list:
+        stream, group = self._group(name, groupname)
+        consumer = _to_bytes(consumername)
+        now = time.monotonic() * 1000
+        start = _stream_id(start_id)
+        count = count or 100
+        claimed, deleted = [], []
+        next_id = (0, 0)
+        for entry_id in sorted(group.pending):
+            if entry_id < start:
+                continue
+            if len(claimed) + len(deleted) >= count:
+                next_id = entry_id
+                break
+            owner, delivered_at, deliveries = group.pending[entry_id]
+            if now - delivered_at < min_idle_time:
+                continue
+            if entry_id not in stream.entries:
+                del group.pending[entry_id]
+                deleted.append(self._out(_format_stream_id(entry_id)))
+                continue
+            group.pending[entry_id] = [consumer, now, deliveries + 1]
+            claimed.append(entry_id)
+        if justid:
+            # redis-py returns only the claimed IDs
+            return [self._out(_format_stream_id(entry_id)) for entry_id in claimed]
+        entries = [self._entry(stream, entry_id) for entry_id in claimed]
+        return [self._out(_format_stream_id(next_id)), entries, deleted]
+
+    async def xclaim(
+        self, name, groupname, consumername, min_idle_time: int, message_ids, idle=None, justid: bool = False
+    ) -> list:
+        stream, group = self._group(name, groupname)
+        consumer = _to_bytes(consumername)
+        now = time.monotonic() * 1000
+        claimed = []
+        for message_id in message_ids:
+            entry_id = _stream_id(message_id)
+            pending = group.pending.get(entry_id)
+            if pending is None or entry_id not in stream.entries or now - pending[1] < min_idle_time:
+                continue
+            group.pending[entry_id] = [consumer, now - (idle or 0), pending[2] + (0 if justid else 1)]
+            claimed.append(entry_id)
+        if justid:
+            return [self._out(_format_stream_id(entry_id)) for entry_id in claimed]
+        return [self._entry(stream, entry_id) for entry_id in claimed]
+
+    # Pipelines
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> "InMemoryPipeline":
+        return InMemoryPipeline(self, transaction)
+
+
+class InMemoryPipeline:
+    """
+    Queues commands and runs them on execute().
+
+    No command awaits anything while the queue runs, so the batch is atomic with
+    respect to other tasks, which gives the same guarantee as MULTI/EXEC.
+    """
+
+    def __init__(self, client: InMemoryRedis, transaction: bool = True):
+        self.client = client
+        self.transaction = transaction
+        self.command_stack: list[tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self) -> "InMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.command_stack = []
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def multi(self) -> None:
+        pass
+
+    def __getattr__(self, command: str):
+        method = getattr(self.client, command)
+        if not callable(method) or command.startswith("_"):
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs) -> "InMemoryPipeline":
+            self.command_stack.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        stack, self.command_stack = self.command_stack, []
+        results = []
+        for command, args, kwargs in stack:
+            try:
+                results.append(await getattr(self.client, command)(*args, **kwargs))
+            except ResponseError as e:
+                results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def reset(self) -> None:
+        self.command_stack = []
+
+
+class InMemoryPubSub:
+    def __init__(self, client: InMemoryRedis, ignore_subscribe_messages: bool = False):
+        self.client = client
+        self.ignore_subscribe_messages = ignore_subscribe_messages
+        self.channels: set[bytes] = set()
+        self._messages: asyncio.Queue = asyncio.Queue()
+
+    def deliver(self, channel: bytes, data: bytes) -> None:
+        self._messages.put_nowait(
+            {"type": "message", "pattern": None, "channel": self.client._out(channel), "data": self.client._out(data)}
+        )
+
+    async def subscribe(self, *channels) -> None:
+        for channel in channels:
+            channel = _to_bytes(channel)
+            self.channels.add(channel)
+            self.client.store.channels.setdefault(channel, set()).add(self)
+            self._messages.put_nowait(
+                {
+                    "type": "subscribe",
+                    "pattern": None,
+                    "channel": self.client._out(channel),
+                    "data": len(self.channels),
+                }
+            )
+
+    async def unsubscribe(self, *channels) -> None:
+        for channel in [_to_bytes(channel) for channel in channels] or list(self.channels):
+            self.channels.discard(channel)
+            subscribers = self.client.store.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self.client.store.channels[channel]
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: Optional[float] = 0.0):
+        ignore = ignore_subscribe_messages or self.ignore_subscribe_messages
+        try:
+            if timeout is None:
+                message = await self._messages.get()
+            elif timeout <= 0:
+                message = self._messages.get_nowait()
+            else:
+                message = await asyncio.wait_for(self._messages.get(), timeout)
+        except (asyncio.QueueEmpty, TimeoutError):
+            return None
+        if ignore and message["type"] != "message":
+            return None
+        return message
+
+    async def listen(self):
+        while self.channels or not self._messages.empty():
+            message = await self._messages.get()
+            if self.ignore_subscribe_messages and message["type"] != "message":
+                continue
+            yield message
+
+    async def aclose(self) -> None:
+        await self.unsubscribe()
+
+    async def reset(self) -> None:
+        await self.aclose()
+
+
+_memory_store: Optional[InMemoryStore] = None
+
+
+def is_memory_url(url: str) -> bool:
+    return url.startswith(MEMORY_URL_SCHEME)
+
+
+def memory_backend(decode_responses: bool = False) -> InMemoryRedis:
+    """Client over the process-wide in-memory keyspace."""
+    global _memory_store
+
+    if _memory_store is None:
+        _memory_store = InMemoryStore()
+    return InMemoryRedis(_memory_store, decode_responses=decode_responses)
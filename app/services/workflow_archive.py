@@ -0,0 +1,305 @@
+"""
+Archive of finished workflows in the app's Postgres database.
+
+A background task moves completed and failed workflows out of Redis once they
+are ARCHIVE_AFTER seconds old: contexts are inserted in batches into
+workflow_archive (range-partitioned by month of created_at) together with their
+schemas, then deleted from Redis with their index entries. Redis only holds
+live and recently finished workflows; the orchestrator reads archived ones
+from here when Redis misses, with their schema attached (it may have expired
+from Redis), and merges them into workflow listings.
+"""
+
+import asyncio
+import time
+from datetime import UTC, datetime
+from typing import Optional
+from uuid import UUID, uuid4
+
+import logfire
+from sqlalchemy import DateTime, String, Text, select, text, tuple_
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models import Context, WorkflowStatus
+from app.services.database import Base, sessionmanager
+from app.services.redis import CLUSTER_MODE, KEY_BUCKETS, get_binary_redis, release_lock
+from app.services.schema_store import load_schema, remember_schema
+from app.services.workflow_state import decode_context, workflow_bucket, workflow_index_key, workflow_key
+
+# Finished workflows stay in Redis this long after creation (UI polls read them there)
+ARCHIVE_AFTER = 300
+ARCHIVE_INTERVAL = 30
+ARCHIVE_BATCH_SIZE = 500
+# Only one process archives at a time
+ARCHIVE_LOCK_KEY = "workflows:archiver:lock"
+ARCHIVE_LOCK_TTL = ARCHIVE_INTERVAL * 4
+# Catches rows no monthly partition covers, so one of them cannot fail every batch
+DEFAULT_PARTITION = "workflow_archive_default"
+
+FINISHED_STATUSES = (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED, WorkflowStatus.CANCELLED)
+
+
+class WorkflowArchive(Base):
+    __tablename__ = "workflow_archive"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+    # The partition key must be part of the primary key
+    request_id: Mapped[UUID] = mapped_column(primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    status: Mapped[str] = mapped_column(String(16))
+    user_id: Mapped[Optional[str]] = mapped_column(String(255), index=True)
+    session_id: Mapped[Optional[str]] = mapped_column(String(255), index=True)
+    query: Mapped[str] = mapped_column(Text)
+    sql_query: Mapped[Optional[str]] = mapped_column(Text)
+    schema_ref: Mapped[str] = mapped_column(String(64))
+    context: Mapped[dict] = mapped_column(JSONB)
+
+
+class SchemaArchive(Base):
+    __tablename__ = "workflow_schema_archive"
+
+    schema_ref: Mapped[str] = mapped_column(String(64), primary_key=True)
+    schema: Mapped[dict] = mapped_column(JSONB)
+
+
+_known_partitions: set[str] = set()
+_archiver_task: Optional[asyncio.Task] = None
+
+
+def _timestamp(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=UTC)
+
+
+async def _ensure_partitions(connection, months: set[tuple[int, int]]) -> list[str]:
+    """
+    Create the monthly partitions a batch needs (idempotent). Returns the names of
+    the partitions created, known to exist once the transaction commits.
+
+    Months are UTC months (see _timestamp); the bounds carry their offset so the
+    session TimeZone of the server does not shift them.
+    """
+    created = []
+    for year, month in sorted(months):
+        name = f"workflow_archive_{year}_{month:02d}"
+        if name in _known_partitions:
+            continue
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        await connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF workflow_archive "
+                f"FOR VALUES FROM ('{year}-{month:02d}-01 00:00:00+00') "
+                f"TO ('{next_year}-{next_month:02d}-01 00:00:00+00')"
+            )
+        )
+        created.append(name)
+    return created
+
+
+def _archive_row(ctx: Context) -> dict:
+    return {
+        "request_id": ctx.request_id,
+        "created_at": _timestamp(ctx.created_at),
+        "updated_at": _timestamp(ctx.updated_at),
+        "status": ctx.status.value,
+        "user_id": ctx.user_id,
+        "session_id": ctx.session_id,
+        "query": ctx.query,
+        "sql_query": ctx.composer_output.sql_query if ctx.composer_output else None,
+        "schema_ref": ctx.schema_ref,
+        "context": ctx.to_dict(),
+    }
+
+
+async def archive_contexts(contexts: list[Context]) -> None:
+    """Insert finished contexts and their schemas in one transaction (batched, idempotent)."""
+    if not contexts:
+        return
+
+    schemas = {}
+    for ctx in contexts:
+        if ctx.schema_ref not in schemas:
+            try:
+                schemas[ctx.schema_ref] = await load_schema(ctx.schema_ref)
+            except KeyError:
+                # Expired from Redis; the context is still worth keeping
+                pass
+
+    async with sessionmanager.connect() as connection:
+        months = {(created.year, created.month) for created in (_timestamp(ctx.created_at) for ctx in contexts)}
+        created = await _ensure_partitions(connection, months)
+        if schemas:
+            await connection.execute(
+                insert(SchemaArchive)
+                .values([{"schema_ref": ref, "schema": schema} for ref, schema in schemas.items()])
+                .on_conflict_do_nothing()
+            )
+        await connection.execute(
+            insert(WorkflowArchive).values([_archive_row(ctx) for ctx in contexts]).on_conflict_do_nothing()
+        )
+    # A failed batch rolls the CREATE TABLE back too
+    _known_partitions.update(created)
+
+
+async def _remove_from_redis(redis, contexts: list[Context]) -> None:
+    """Delete archived workflows and their index entries in one MULTI (one per slot in a cluster)."""
+    groups: dict[int, list[Context]] = {}
+    for ctx in contexts:
+        groups.setdefault(workflow_bucket(ctx.request_id) if CLUSTER_MODE else 0, []).append(ctx)
+
+    for group in groups.values():
+        async with redis.pipeline(transaction=True) as pipe:
+            for ctx in group:
+                request_id = str(ctx.request_id)
+                bucket = workflow_bucket(request_id)
+                pipe.delete(workflow_key(request_id))
+                pipe.zrem(workflow_index_key(bucket), request_id)
+                pipe.zrem(workflow_index_key(bucket, "status", ctx.status.value), request_id)
+                if ctx.user_id:
+                    pipe.zrem(workflow_index_key(bucket, "user", ctx.user_id), request_id)
+                if ctx.session_id:
+                    pipe.zrem(workflow_index_key(bucket, "session", ctx.session_id), request_id)
+            await pipe.execute()
+
+
+async def archive_finished_workflows() -> int:
+    """Archive one batch of finished workflows older than ARCHIVE_AFTER. Returns how many were archived."""
+    redis = get_binary_redis()
+    token = uuid4().hex
+    if not await redis.set(ARCHIVE_LOCK_KEY, token, nx=True, ex=ARCHIVE_LOCK_TTL):
+        return 0
+
+    try:
+        cutoff = time.time() - ARCHIVE_AFTER
+        async with redis.pipeline(transaction=False) as pipe:
+            for bucket in range(KEY_BUCKETS):
+                for status in FINISHED_STATUSES:
+                    pipe.zrangebyscore(
+                        workflow_index_key(bucket, "status", status.value),
+                        "-inf",
+                        cutoff,
+                        start=0,
+                        num=ARCHIVE_BATCH_SIZE,
+                        withscores=True,
+                    )
+            results = await pipe.execute()
+        # Oldest first across buckets
+        candidates = sorted((score, member.decode("utf-8")) for members in results for member, score in members)
+        request_ids = [request_id for _, request_id in candidates[:ARCHIVE_BATCH_SIZE]]
+        if not request_ids:
+            return 0
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for request_id in request_ids:
+                pipe.hgetall(workflow_key(request_id))
+            mappings = await pipe.execute(raise_on_error=False)
+
+        contexts = []
+        for mapping in mappings:
+            if isinstance(mapping, Exception) or not mapping:
+                continue
+            ctx = decode_context(mapping)
+            if ctx.status in FINISHED_STATUSES:
+                contexts.append(ctx)
+
+        await archive_contexts(contexts)
+        await _remove_from_redis(redis, contexts)
+        return len(contexts)
+    finally:
+        await release_lock(redis, ARCHIVE_LOCK_KEY, token)
+
+
+async def load_archived_context(request_id: str) -> Optional[Context]:
+    """Load a context from the archive, or None if it was never archived."""
+    try:
+        request_uuid = UUID(request_id)
+    except ValueError:
+        return None
+
+    async with sessionmanager.session() as session:
+        result = await session.execute(
+            select(WorkflowArchive.context, SchemaArchive.schema)
+            .outerjoin(SchemaArchive, SchemaArchive.schema_ref == WorkflowArchive.schema_ref)
+            .where(WorkflowArchive.request_id == request_uuid)
+        )
+        row = result.one_or_none()
+
+    return _archived_context(*row) if row is not None else None
+
+
+async def list_archived_contexts(
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    status: Optional[str] = None,
+    before: Optional[tuple[float, str]] = None,
+    limit: int = 20,
+) -> list[Context]:
+    """
+    Archived contexts newest first by (created_at, request_id), filtered like workflow
+    listings; before is the (created_at, request_id) the page starts after.
+    """
+    query = select(WorkflowArchive.context)
+    if user_id is not None:
+        query = query.where(WorkflowArchive.user_id == user_id)
+    if session_id is not None:
+        query = query.where(WorkflowArchive.session_id == session_id)
+    if status is not None:
+        query = query.where(WorkflowArchive.status == status)
+    if before is not None:
+        created_at, request_id = before
+        query = query.where(
+            tuple_(WorkflowArchive.created_at, WorkflowArchive.request_id)
+            < tuple_(_timestamp(created_at), UUID(request_id))
+        )
+    query = query.order_by(WorkflowArchive.created_at.desc(), WorkflowArchive.request_id.desc()).limit(limit)
+
+    async with sessionmanager.session() as session:
+        result = await session.execute(query)
+        return [Context.model_validate(data) for data in result.scalars()]
+
+
+def _archived_context(data: dict, schema: Optional[dict]) -> Context:
+    ctx = Context.model_validate(data)
+    if schema is not None and not ctx.schema_loaded:
+        remember_schema(ctx.schema_ref, schema)
+        ctx.attach_schema(schema)
+    return ctx
+
+
+async def _run_archiver():
+    while True:
+        try:
+            # Drain the backlog, then wait for the next round
+            while await archive_finished_workflows() >= ARCHIVE_BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logfire.info(f"Warning: workflow archiver failed: {str(e)}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+async def start_archiver():
+    """Create the archive tables and start archiving in the background."""
+    global _archiver_task
+
+    async with sessionmanager.connect() as connection:
+        await sessionmanager.create_all(connection)
+        await connection.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF workflow_archive DEFAULT")
+        )
+    if _archiver_task is None:
+        _archiver_task = asyncio.create_task(_run_archiver())
+
+
+async def stop_archiver():
+    global _archiver_task
+
+    if _archiver_task is not None:
+        _archiver_task.cancel()
+        try:
+            await _archiver_task
+        except asyncio.CancelledError:
+            pass
+        _archiver_task = None
@@ -0,0 +1,116 @@
+"""
+Workflow state layout in Redis.
+
+A workflow lives in the hash {workflow:bucket}:request_id, one field per Context field.
+Agent outputs and table statistics are codec-encoded documents; everything else
+is a short string, so step transitions rewrite a few bytes with HSET and status
+reads fetch only the fields they need with HMGET. Fields that are None are
+absent from the hash.
+
+Every key of a workflow (hash, events channel) and the index entries pointing
+at it carry the hash tag of its bucket, so they live in one Redis Cluster slot
+and are updated in one MULTI. Indexes are split per bucket; listings merge all
+buckets.
+"""
+
+from typing import Any, Optional
+
+from app.models import Context
+from app.services.codec import decode_data, encode_data
+from app.services.redis import hash_tag, key_bucket
+
+WORKFLOW_TTL = 3600
+# Index entries older than this (by created_at) are trimmed on write
+WORKFLOW_INDEX_RETENTION = 24 * 3600
+
+# Fields stored as codec-encoded documents; every other field is a plain string
+ENCODED_FIELDS = {
+    "table_statistics",
+    "planner_output",
+    "mapper_output",
+    "composer_output",
+    "validator_output",
+    "agent_runs",
+}
+
+
+def workflow_bucket(request_id: Any) -> int:
+    return key_bucket(request_id)
+
+
+def workflow_key(request_id: Any) -> str:
+    return f"{hash_tag('workflow', workflow_bucket(request_id))}:{request_id}"
+
+
+def legacy_workflow_key(request_id: Any) -> str:
+    """Key of workflows written before hash tags; read until they expire."""
+    return f"workflow:{request_id}"
+
+
+def workflow_index_key(bucket: int, kind: Optional[str] = None, value: Any = None) -> str:
+    """
+    Sorted set of the request_ids of one bucket, scored by created_at.
+
+    Without kind: every workflow. Otherwise kind is user, session or status.
+    """
+    if kind is None:
+        return f"{hash_tag('workflow', bucket)}:index"
+    return f"{hash_tag('workflow', bucket)}:index:{kind}:{value}"
+
+
+def workflow_events_channel(request_id: Any) -> str:
+    """Pub/sub channel announcing which fields of a workflow changed (in the workflow's slot)."""
+    return f"{workflow_key(request_id)}:events"
+
+
+def workflow_lease_key(request_id: Any) -> str:
+    """Lease of the worker running a workflow (in the workflow's slot)."""
+    return f"{workflow_key(request_id)}:lease"
+
+
+def workflow_cancel_key(request_id: Any) -> str:
+    """Set when cancelling a workflow; checked before each of its agents (in the workflow's slot)."""
+    return f"{workflow_key(request_id)}:cancel"
+
+
+def output_field(agent_name: str) -> str:
+    """Context field written by an agent."""
+    return f"{agent_name}_output"
+
+
+def encode_fields(ctx: Context, fields: Optional[list[str]] = None) -> tuple[dict[str, Any], list[str]]:
+    """
+    Encode Context fields for HSET.
+
+    Returns the field -> value mapping to set and the fields to delete (None values).
+    """
+    data = ctx.model_dump(mode="json", include=set(fields) if fields else None)
+    mapping = {}
+    deleted = []
+    for field, value in data.items():
+        if value is None:
+            deleted.append(field)
+        elif field in ENCODED_FIELDS:
+            mapping[field] = encode_data(value)
+        else:
+            mapping[field] = str(value)
+    return mapping, deleted
+
+
+def decode_field(field: str, value: Optional[bytes]) -> Any:
+    """Decode one hash value written by encode_fields."""
+    if value is None:
+        return None
+    if field in ENCODED_FIELDS:
+        return decode_data(value)
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def decode_context(mapping: dict) -> Context:
+    """Rebuild a Context from HGETALL output."""
+    data = {}
+    for field, value in mapping.items():
+        field = field.decode("utf-8") if isinstance(field, bytes) else field
+        data[field] = decode_field(field, value)
+    # Scalars are stored as strings; validation coerces them back
+    return Context.model_validate(data)
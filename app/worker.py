@@ -0,0 +1,57 @@
+"""
+Standalone workflow worker.
+
+Takes workflow jobs from the Redis Stream consumer group and runs them, up to
+WORKFLOW_WORKER_CONCURRENCY at a time. Start as many worker processes, on as many
+machines, as agent throughput needs; API nodes only enqueue and read status.
+
+Run with: python -m app.worker
+"""
+
+import asyncio
+import signal
+
+import logfire
+
+from app.config import database_config, logfire_config, workflow_config
+from app.llm_clients.openai_client import openai_client
+from app.models import DatabaseConnection
+from app.services.database import sessionmanager
+from app.services.local_cache import start_local_cache, stop_local_cache
+from app.services.redis import ping_redis
+from app.services.sql_runner import close_pools
+from app.workflow_runner import start_runner, stop_runner, workflow_runner
+
+
+async def main():
+    await ping_redis()
+    # Validators read connections on every query, like the API; invalidations also close
+    # the pools of edited connections here
+    await start_local_cache(DatabaseConnection)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await start_runner()
+    logfire.info(
+        f"Workflow worker {workflow_runner.worker_id} started "
+        f"(concurrency {workflow_config.WORKFLOW_WORKER_CONCURRENCY})"
+    )
+    await stopping.wait()
+
+    # Workflows in progress are requeued for the other workers
+    await stop_runner()
+    await stop_local_cache()
+    await close_pools()
+    if sessionmanager._engine is not None:
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    # Reads of archived workflows go to the app database
+    sessionmanager.init(database_config.get_db_url())
+    logfire.configure(token=logfire_config.LOGFIRE_TOKEN, environment="local", service_name="pulse-worker")
+    logfire.instrument_openai(openai_client.client)
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""
+Batches of natural-language queries against one database.
+
+The schema (and table statistics) of a batch are resolved once by the caller and
+shared by every workflow of the batch through their content hash, so they are
+hashed and stored once instead of once per query. At most `concurrency`
+workflows of a batch are queued or running at a time; each one goes through
+admission control and the worker pool like any other workflow. Results are
+yielded as workflows finish, followed by a summary with latency statistics and
+token totals.
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from typing import Optional
+
+from app.config import workflow_config
+from app.models import Context, WorkflowPriority, WorkflowStatus
+from app.orchestrator import STEP_FIELDS, get_workflow_status
+from app.services.admission import QueueFullError
+from app.services.schema_store import remember_schema, schema_hash, store_schema
+from app.workflow_runner import submit_workflow
+
+# How often the workflows of a batch in flight are checked
+BATCH_POLL_INTERVAL = 0.5
+
+FINISHED_STATUSES = (WorkflowStatus.COMPLETED.value, WorkflowStatus.FAILED.value, WorkflowStatus.CANCELLED.value)
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _result(index: int, query: str, request_id: str, status: Optional[dict]) -> dict:
+    if status is None:
+        # Expired before the batch saw it finish
+        return {"index": index, "query": query, "request_id": request_id, "status": "missing"}
+    return {
+        "index": index,
+        "query": query,
+        "request_id": request_id,
+        "status": status["status"],
+        "sql_query": status["sql_query"],
+        "is_valid": status["is_valid"],
+        "feedback": status["feedback"],
+        "retry_count": status["retry_count"],
+        # From creation to the last state write: includes the time spent in the queue
+        "latency_seconds": round(status["updated_at"] - status["created_at"], 3),
+        # Every agent execution, including retries and cancelled candidates
+        "prompt_tokens": sum(run["prompt_tokens"] for run in status["agent_runs"] or []),
+        "completion_tokens": sum(run["completion_tokens"] for run in status["agent_runs"] or []),
+    }
+
+
+def _summary(results: list[dict], wall_seconds: float) -> dict:
+    latencies = sorted(result["latency_seconds"] for result in results if "latency_seconds" in result)
+    return {
+        "total": len(results),
+        "completed": sum(result["status"] == WorkflowStatus.COMPLETED.value for result in results),
+        # Including cancelled and missing workflows
+        "failed": sum(result["status"] != WorkflowStatus.COMPLETED.value for result in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "prompt_tokens": sum(result.get("prompt_tokens", 0) for result in results),
+        "completion_tokens": sum(result.get("completion_tokens", 0) for result in results),
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+async def run_batch(
+    queries: list[str],
+    schema: dict,
+    table_statistics: Optional[dict] = None,
+    concurrency: Optional[int] = None,
+    user_id: Optional[str] = None,
+    priority: WorkflowPriority = WorkflowPriority.LOW,
+    candidates: Optional[int] = None,
+    timeout_seconds: Optional[float] = None,
+) -> AsyncIterator[dict]:
+    """
+    Run one workflow per query and yield each result as it finishes, then {"summary": ...}.
+
+    A full pending queue does not fail the batch: the remaining queries are submitted
+    once its own workflows finish or the queue drains. If the consumer stops
+    iterating, the workflows already submitted still run to completion.
+    """
+    concurrency = concurrency or workflow_config.WORKFLOW_BATCH_CONCURRENCY
+    started_at = time.monotonic()
+
+    schema_ref = schema_hash(schema)
+    remember_schema(schema_ref, schema)
+    await store_schema(schema_ref, schema)
+
+    # request_id -> (index, query) of the workflows submitted and not finished yet
+    in_flight: dict[str, tuple[int, str]] = {}
+    results: list[dict] = []
+    next_index = 0
+
+    while next_index < len(queries) or in_flight:
+        while next_index < len(queries) and len(in_flight) < concurrency:
+            ctx = Context(
+                query=queries[next_index],
+                schema_ref=schema_ref,
+                table_statistics=table_statistics,
+                user_id=user_id,
+                priority=priority,
+                candidates=candidates,
+                deadline=time.time() + timeout_seconds if timeout_seconds else None,
+            )
+            try:
+                await submit_workflow(ctx)
+            except QueueFullError:
+                break
+            in_flight[str(ctx.request_id)] = (next_index, queries[next_index])
+            next_index += 1
+
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+
+        request_ids = list(in_flight)
+        statuses = await asyncio.gather(*(get_workflow_status(request_id, STEP_FIELDS) for request_id in request_ids))
+        for request_id, status in zip(request_ids, statuses):
+            if status is None or status["status"] in FINISHED_STATUSES:
+                index, query = in_flight.pop(request_id)
+                result = _result(index, query, request_id, status)
+                results.append(result)
+                yield result
+
+    yield {"summary": _summary(results, time.monotonic() - started_at)}
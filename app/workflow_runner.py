@@ -0,0 +1,367 @@
+"""
+Durable workflow execution by a pool of workers.
+
+Starting a workflow saves its context and puts it in the pending queue of
+app/services/admission.py; once admitted (global and per-user caps), it becomes a
+job in the Redis Stream JOB_STREAM_KEY. Workers (python -m app.worker, and the API process unless
+WORKFLOW_RUN_IN_API is false) read jobs through the consumer group JOB_GROUP, up to
+WORKFLOW_WORKER_CONCURRENCY at a time, so agent throughput scales with the number
+of worker processes, independently of the API.
+
+The worker running a workflow holds a lease ({workflow:bucket}:request_id:lease,
+SET NX with a TTL) and renews it with heartbeats, which also reset the idle time
+of its job. A job stays pending in the group until the workflow finishes; when its
+worker dies, the job goes idle and another worker claims it (XAUTOCLAIM) once the
+lease has expired. A claimed workflow is loaded from Redis and continues from its
+last checkpoint; agents whose outputs are already stored are not run again.
+
+Cancelling a workflow sets its cancel key and announces it on CANCEL_CHANNEL: a
+workflow still waiting for admission is cancelled on the spot, the worker running
+it cancels its task at once, and the orchestrator checks the key before every
+agent in case the announcement was missed.
+"""
+
+import asyncio
+import os
+import socket
+import time
+from typing import Optional
+from uuid import uuid4
+
+import logfire
+from redis.exceptions import ResponseError
+
+from app.config import workflow_config
+from app.models import Context, WorkflowStatus
+from app.orchestrator import WorkflowOrchestrator
+from app.services import admission
+from app.services.redis import binary_redis, get_pubsub_redis
+from app.services.workflow_state import WORKFLOW_TTL, workflow_cancel_key, workflow_lease_key
+
+JOB_STREAM_KEY = "workflows:jobs"
+JOB_GROUP = "workflow-workers"
+# A lease not renewed for this long is considered orphaned
+LEASE_TTL = 30
+HEARTBEAT_INTERVAL = 10
+# Longest wait for new jobs before looking for orphaned ones again
+POLL_INTERVAL = 5
+# Carries the request_id of every cancelled workflow to all workers
+CANCEL_CHANNEL = "workflows:cancel"
+RECONNECT_DELAY = 1
+
+FINISHED_STATUSES = (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED, WorkflowStatus.CANCELLED)
+
+
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class LeaseLostError(Exception):
+    """Another worker took over a workflow this process was running."""
+
+
+class WorkflowRunner:
+    """Enqueues workflows and runs jobs from the stream under a lease."""
+
+    def __init__(self, redis_client=None, concurrency: Optional[int] = None):
+        self.redis_client = redis_client or binary_redis
+        self.concurrency = concurrency or workflow_config.WORKFLOW_WORKER_CONCURRENCY
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.orchestrator = WorkflowOrchestrator()
+        # Workflows this process is running, by request_id
+        self._runs: dict[str, asyncio.Task] = {}
+        self._slot_free = asyncio.Event()
+        self._group_ready = False
+        self._consumer_task: Optional[asyncio.Task] = None
+        self._cancel_listener_task: Optional[asyncio.Task] = None
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            # From the start of the stream: jobs added before any worker existed are read too
+            await self.redis_client.xgroup_create(JOB_STREAM_KEY, JOB_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def _start_job(self, request_id: str) -> str:
+        """Add a job for the workers. Returns the job id."""
+        await self._ensure_group()
+        return _decode(await self.redis_client.xadd(JOB_STREAM_KEY, {"request_id": request_id}))
+
+    async def submit(self, ctx: Context):
+        """
+        Queue a workflow; it is handed to the workers once admission control lets it run.
+
+        Raises:
+            QueueFullError: If too many workflows are already waiting
+        """
+        await admission.ensure_capacity()
+        self._apply_deadline(ctx)
+        await self.orchestrator.save_context(ctx)
+        await admission.enqueue(ctx)
+        await self.admit()
+
+    @staticmethod
+    def _apply_deadline(ctx: Context):
+        """Give a workflow without a deadline the deployment default (from now)."""
+        if ctx.deadline is None and workflow_config.WORKFLOW_DEADLINE_SECONDS > 0:
+            ctx.deadline = time.time() + workflow_config.WORKFLOW_DEADLINE_SECONDS
+
+    async def admit(self) -> int:
+        """Hand as many pending workflows to the workers as there are free slots."""
+        return await admission.admit(self._start_job)
+
+    async def run(self, ctx: Context) -> Context:
+        """
+        Queue a workflow and run it in this process, returning the final context.
+
+        The job is leased to this process from the start, so workers skip it; if the
+        caller is cancelled the workflow keeps running, and if this process dies a
+        worker resumes it. It skips the pending queue but counts towards the caps.
+        """
+        self._apply_deadline(ctx)
+        await self.orchestrator.save_context(ctx)
+        job_id = await self._start_job(str(ctx.request_id))
+        request_id = str(ctx.request_id)
+        if not await self._claim(request_id):
+            raise LeaseLostError(f"Workflow {request_id} was claimed by another worker")
+
+        task = self._start(request_id, job_id, ctx)
+        await asyncio.wait([task])
+        if task.cancelled():
+            raise LeaseLostError(f"Workflow {request_id} was taken over by another worker")
+        return task.result()
+
+    async def _claim(self, request_id: str) -> bool:
+        if not await self.redis_client.set(workflow_lease_key(request_id), self.worker_id, nx=True, ex=LEASE_TTL):
+            return False
+        await admission.hold(request_id, LEASE_TTL)
+        return True
+
+    async def _renew(self, request_id: str, job_id: str) -> bool:
+        """Extend this worker's lease and keep its job from going idle; False if another worker holds it now."""
+        key = workflow_lease_key(request_id)
+        holder = await self.redis_client.get(key)
+        if holder is None:
+            # Expired (e.g. a long pause) but nobody took it yet
+            if not await self._claim(request_id):
+                return False
+        elif _decode(holder) != self.worker_id:
+            return False
+        # Between GET and EXPIRE the lease can only be taken over if it just expired;
+        # the next heartbeat notices the new holder
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.expire(key, LEASE_TTL)
+            # Only moves the job if a worker has read it (it is then pending)
+            pipe.xclaim(JOB_STREAM_KEY, JOB_GROUP, self.worker_id, 0, [job_id], justid=True)
+            renewed, _ = await pipe.execute()
+        if renewed:
+            await admission.hold(request_id, LEASE_TTL)
+        return bool(renewed)
+
+    async def _release(self, request_id: str, job_id: str, finished: bool):
+        """Drop the lease and the job; an unfinished workflow gets a new job so another worker takes it now."""
+        key = workflow_lease_key(request_id)
+        if _decode(await self.redis_client.get(key)) != self.worker_id:
+            # Taken over; the new holder owns the job
+            return
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            if not finished:
+                pipe.xadd(JOB_STREAM_KEY, {"request_id": request_id})
+            pipe.xack(JOB_STREAM_KEY, JOB_GROUP, job_id)
+            pipe.xdel(JOB_STREAM_KEY, job_id)
+            pipe.delete(key)
+            await pipe.execute()
+        if finished:
+            # Its slot goes to the next pending workflow
+            await admission.release(request_id)
+            await self.admit()
+
+    def _start(self, request_id: str, job_id: str, ctx: Optional[Context] = None) -> asyncio.Task:
+        task = asyncio.create_task(self._execute(request_id, job_id, ctx))
+        self._runs[request_id] = task
+        task.add_done_callback(lambda _: self._on_done(request_id))
+        return task
+
+    def _on_done(self, request_id: str):
+        self._runs.pop(request_id, None)
+        self._slot_free.set()
+
+    async def _heartbeat(self, request_id: str, job_id: str, run: asyncio.Task):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                renewed = await self._renew(request_id, job_id)
+            except Exception as e:
+                # Keep running; the lease lasts several heartbeats
+                logfire.info(f"Warning: Could not renew lease of workflow {request_id}: {str(e)}")
+                continue
+            if not renewed:
+                logfire.info(f"Warning: Lost the lease of workflow {request_id}, stopping")
+                run.cancel()
+                return
+
+    async def _execute(self, request_id: str, job_id: str, ctx: Optional[Context] = None) -> Optional[Context]:
+        """Run (or resume) a workflow this worker holds the lease of."""
+        heartbeat = asyncio.create_task(self._heartbeat(request_id, job_id, asyncio.current_task()))
+        finished = False
+        try:
+            if ctx is None:
+                ctx = await self.orchestrator.load_context(request_id)
+                if ctx is None or ctx.status in FINISHED_STATUSES:
+                    # Expired, or finished just before its worker died
+                    finished = True
+                    return ctx
+                if ctx.status != WorkflowStatus.PENDING:
+                    logfire.info(f"Resuming workflow {request_id} at {ctx.status.value}")
+            ctx = await self.orchestrator.execute_workflow(ctx)
+            finished = True
+            return ctx
+        finally:
+            heartbeat.cancel()
+            await asyncio.shield(self._release(request_id, job_id, finished))
+
+    async def _accept(self, job_id: str, request_id: str):
+        """Start a job unless another live worker holds its workflow (that worker acks it when done)."""
+        if request_id not in self._runs and await self._claim(request_id):
+            self._start(request_id, job_id)
+
+    async def consume(self, count: int) -> int:
+        """
+        Take up to count jobs: orphans first (pending longer than a lease without a
+        heartbeat), then new ones, waiting up to POLL_INTERVAL for them. Returns how many were read.
+        """
+        await self._ensure_group()
+        _, jobs, *_ = await self.redis_client.xautoclaim(
+            JOB_STREAM_KEY, JOB_GROUP, self.worker_id, LEASE_TTL * 1000, start_id="0-0", count=count
+        )
+        if not jobs:
+            response = await self.redis_client.xreadgroup(
+                JOB_GROUP, self.worker_id, {JOB_STREAM_KEY: ">"}, count=count, block=POLL_INTERVAL * 1000
+            )
+            jobs = [job for _, entries in response for job in entries]
+
+        for job_id, fields in jobs:
+            await self._accept(_decode(job_id), _decode(fields[b"request_id"]))
+        return len(jobs)
+
+    async def _run_consumer(self):
+        while True:
+            try:
+                free = self.concurrency - len(self._runs)
+                if free <= 0:
+                    self._slot_free.clear()
+                    await self._slot_free.wait()
+                    continue
+                # Slots of dead workers expire; admit workflows into them
+                await self.admit()
+                await self.consume(free)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logfire.info(f"Warning: workflow worker failed to read jobs: {str(e)}")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def cancel(self, request_id: str) -> Optional[WorkflowStatus]:
+        """
+        Cancel a workflow wherever it runs.
+
+        Returns its status: CANCELLED if it was still waiting for admission, its current
+        status if a worker is being told to stop it (it becomes CANCELLED before its next
+        agent at the latest), its final status if it had already finished, or None if it
+        does not exist.
+        """
+        ctx = await self.orchestrator.load_context(request_id)
+        if ctx is None or ctx.status in FINISHED_STATUSES:
+            return ctx.status if ctx else None
+
+        await self.redis_client.set(workflow_cancel_key(request_id), self.worker_id, ex=WORKFLOW_TTL)
+        if await admission.withdraw(request_id):
+            # Never admitted, so no worker will finish it
+            ctx.status = WorkflowStatus.CANCELLED
+            ctx.feedback = "Cancelled"
+            ctx.update_timestamp()
+            await self.orchestrator.save_context(ctx)
+            return ctx.status
+
+        await self.redis_client.publish(CANCEL_CHANNEL, request_id)
+        return ctx.status
+
+    def _on_cancel(self, request_id: str):
+        run = self._runs.get(request_id)
+        if run is not None:
+            logfire.info(f"Cancelling workflow {request_id}")
+            # The orchestrator sees the cancel key and finishes the workflow as cancelled
+            run.cancel()
+
+    async def _listen_cancels(self):
+        while True:
+            pubsub = get_pubsub_redis().pubsub()
+            try:
+                await pubsub.subscribe(CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_cancel(_decode(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Cancelled workflows still stop before their next agent
+                logfire.info(f"Warning: workflow cancel listener disconnected: {str(e)}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def start(self):
+        """Start taking jobs from the stream in the background."""
+        if self._consumer_task is None:
+            self._consumer_task = asyncio.create_task(self._run_consumer())
+        if self._cancel_listener_task is None:
+            self._cancel_listener_task = asyncio.create_task(self._listen_cancels())
+
+    async def stop(self):
+        """Stop taking jobs and the runs in progress; their jobs are requeued for other workers."""
+        for task in (self._consumer_task, self._cancel_listener_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._consumer_task = None
+        self._cancel_listener_task = None
+
+        runs = list(self._runs.values())
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+
+
+workflow_runner = WorkflowRunner()
+
+
+async def submit_workflow(ctx: Context):
+    """
+    Queue a workflow for the worker pool; returns once it is stored.
+
+    Raises:
+        QueueFullError: If too many workflows are already waiting
+    """
+    await workflow_runner.submit(ctx)
+
+
+async def cancel_workflow(request_id: str) -> Optional[WorkflowStatus]:
+    """Cancel a workflow on whichever worker runs it (see WorkflowRunner.cancel)."""
+    return await workflow_runner.cancel(request_id)
+
+
+async def start_runner():
+    """Take workflow jobs in this process."""
+    workflow_runner.start()
+
+
+async def stop_runner():
+    await workflow_runner.stop()
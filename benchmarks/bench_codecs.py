@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: Redis payload codecs for workflow state.
+
+For schemas of increasing size, compares the previous Context persistence path
+(schema embedded in the context, model_dump(mode="json") + json.dumps /
+json.loads + model_validate) with each registered codec, for the schema payload
+(stored once per hash) and for the context document (written on every step,
+schema referenced by hash). Reports encode and decode time and stored bytes.
+
+Run with: python -m benchmarks.bench_codecs
+"""
+
+import json
+import time
+
+from app.config import cache_config
+from app.models import (
+    Aggregation,
+    ComposerOutput,
+    Context,
+    Entity,
+    Filter,
+    MappedAggregation,
+    MappedEntity,
+    MappedFilter,
+    MapperOutput,
+    PlannerOutput,
+    ValidationResult,
+    ValidatorOutput,
+    WorkflowStatus,
+)
+from app.services.codec import decode_data, decode_model, encode_data, encode_model
+
+TABLE_COUNTS = [10, 100, 500]
+COLUMNS_PER_TABLE = 20
+CODECS = ["json", "msgpack", "msgpack+zstd"]
+REPEATS = 20
+
+COLUMN_TYPES = ["integer", "character varying", "timestamp without time zone", "numeric", "boolean", "text"]
+
+
+def make_schema(table_count: int) -> dict:
+    """Schema shaped like get_database_schema output."""
+    tables = {}
+    for t in range(table_count):
+        tables[f"table_{t}"] = {
+            "columns": [
+                {
+                    "name": f"column_{c}" if c else "id",
+                    "type": COLUMN_TYPES[c % len(COLUMN_TYPES)],
+                    "nullable": c % 3 != 0,
+                    "default": None if c % 4 else "nextval('seq'::regclass)",
+                }
+                for c in range(COLUMNS_PER_TABLE)
+            ],
+            "primary_keys": ["id"],
+            "foreign_keys": [{"column": "column_1", "references": f"table_{(t + 1) % table_count}.id"}],
+        }
+    return {"database_type": "postgresql", "tables": tables}
+
+
+def make_context(table_count: int) -> Context:
+    """A finished workflow context with every agent output filled in."""
+    return Context(
+        query="Show the ten customers with the highest order totals last month",
+        schema=make_schema(table_count),
+        planner_output=PlannerOutput(
+            intent="aggregate",
+            entities=[Entity(name="customers", type="table"), Entity(name="orders", type="table")],
+            filters=[Filter(column="created_at", operator=">=", value="2024-01-01")],
+            aggregations=[Aggregation(function="SUM", column="total")],
+            limit=10,
+        ),
+        mapper_output=MapperOutput(
+            mapped_entities=[
+                MappedEntity(entity_name="customers", table="table_0"),
+                MappedEntity(entity_name="orders", table="table_1"),
+            ],
+            mapped_filters=[
+                MappedFilter(
+                    filter=Filter(column="created_at", operator=">=", value="2024-01-01"),
+                    mapped_column="table_1.column_2",
+                )
+            ],
+            mapped_aggregations=[
+                MappedAggregation(
+                    aggregation=Aggregation(function="SUM", column="total"), mapped_column="table_1.column_3"
+                )
+            ],
+        ),
+        composer_output=ComposerOutput(
+            sql_query="SELECT t0.id, SUM(t1.column_3) FROM table_0 t0 JOIN table_1 t1 ON t0.id = t1.column_1 "
+            "WHERE t1.column_2 >= '2024-01-01' GROUP BY t0.id ORDER BY 2 DESC LIMIT 10"
+        ),
+        validator_output=ValidatorOutput(validation=ValidationResult(is_valid=True, query_output="10 rows")),
+        status=WorkflowStatus.COMPLETED,
+        current_step="validator",
+    )
+
+
+def previous_encode(ctx: Context) -> bytes:
+    return json.dumps({**ctx.to_dict(), "schema": ctx.schema}).encode("utf-8")
+
+
+def previous_decode(payload: bytes) -> Context:
+    return Context.from_dict(json.loads(payload.decode("utf-8")))
+
+
+def best_of(fn, arg) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def print_row(table_count: int, payload: str, name: str, encode_ms: float, decode_ms: float, size: int, baseline: int):
+    print(
+        f"{table_count:>6} | {payload:>7} | {name:>12} | {encode_ms:>11.2f} | {decode_ms:>11.2f} | "
+        f"{size:>9} | {baseline / size:>6.1f}x"
+    )
+
+
+def main():
+    configured = cache_config.REDIS_CODEC
+    print(
+        f"{'tables':>6} | {'payload':>7} | {'codec':>12} | {'encode (ms)':>11} | {'decode (ms)':>11} | "
+        f"{'bytes':>9} | {'ratio':>7}"
+    )
+    print("-" * 84)
+    try:
+        for table_count in TABLE_COUNTS:
+            ctx = make_context(table_count)
+            schema = ctx.schema
+
+            baseline = previous_encode(ctx)
+            print_row(
+                table_count,
+                "context",
+                "previous",
+                best_of(previous_encode, ctx),
+                best_of(previous_decode, baseline),
+                len(baseline),
+                len(baseline),
+            )
+            for name in CODECS:
+                cache_config.REDIS_CODEC = name
+
+                payload = encode_data(schema)
+                # Every codec must round-trip to the same document
+                assert decode_data(payload) == schema
+                encode_ms = best_of(encode_data, schema)
+                decode_ms = best_of(decode_data, payload)
+                print_row(table_count, "schema", name, encode_ms, decode_ms, len(payload), len(baseline))
+
+                payload = encode_model(ctx)
+                assert decode_model(payload, Context) == ctx
+                encode_ms = best_of(encode_model, ctx)
+                decode_ms = best_of(lambda p: decode_model(p, Context), payload)
+                print_row(table_count, "context", name, encode_ms, decode_ms, len(payload), len(baseline))
+    finally:
+        cache_config.REDIS_CODEC = configured
+
+
+if __name__ == "__main__":
+    main()
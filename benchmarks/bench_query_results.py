@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: query result encoding.
+
+Compares the previous response path (copy rows into lists, validate QueryResult,
+re-validate and serialize the response model the way FastAPI does, json.dumps)
+with the current one (keep driver rows, orjson straight to bytes).
+
+Run with: python -m benchmarks.bench_query_results
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+
+from app.models import QueryResponse, QueryResult
+from app.services.result_encoder import query_response
+
+COLUMNS = ["id", "name", "email", "total", "created_at", "notes"]
+SIZES = [1_000, 10_000, 100_000]
+REPEATS = 5
+
+response_adapter = TypeAdapter(QueryResponse)
+
+
+def make_rows(count: int) -> list[tuple]:
+    """Driver-like row tuples with a realistic mix of cell types."""
+    base = datetime(2024, 1, 1)
+    return [
+        (
+            i,
+            f"Customer {i}",
+            f"customer{i}@example.com",
+            Decimal(f"{i % 1000}.{i % 100:02d}"),
+            base + timedelta(minutes=i),
+            None if i % 3 else "vip",
+        )
+        for i in range(count)
+    ]
+
+
+def previous_path(rows: list[tuple]) -> bytes:
+    result = QueryResult(columns=COLUMNS, rows=[list(row) for row in rows], row_count=len(rows), execution_time_ms=1.0)
+    response = QueryResponse(status="ok", data=result, error=None)
+    # FastAPI validates the returned object against response_model, then serializes it
+    content = response_adapter.dump_python(response_adapter.validate_python(response), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def current_path(rows: list[tuple]) -> bytes:
+    result = QueryResult.model_construct(columns=COLUMNS, rows=rows, row_count=len(rows), execution_time_ms=1.0)
+    return query_response(status="ok", data=result).body
+
+
+def best_of(fn, rows: list[tuple]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    print(f"{'rows':>8} | {'previous (ms)':>14} | {'current (ms)':>13} | {'speedup':>7}")
+    print("-" * 53)
+    for size in SIZES:
+        rows = make_rows(size)
+
+        # Both paths must produce the same document
+        assert json.loads(previous_path(rows)) == json.loads(current_path(rows))
+
+        previous_ms = best_of(previous_path, rows)
+        current_ms = best_of(current_path, rows)
+        print(f"{size:>8} | {previous_ms:>14.1f} | {current_ms:>13.1f} | {previous_ms / current_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
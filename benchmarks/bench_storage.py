@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: storage paths used on every request.
+
+Measures operations per second of redis_ops (save_data, get_data, list_data),
+workflow state writes (a full step-by-step workflow through the coalescing
+writer) and status reads / listing, with CONCURRENCY tasks in flight.
+
+Runs on the in-memory storage backend by default, so it needs no Redis; set
+BENCH_REDIS_URL (e.g. redis://localhost:6379/15) to run the same workload
+against a server. The benchmark writes keys; do not point it at live data.
+
+Run with: python -m benchmarks.bench_storage
+"""
+
+import asyncio
+import os
+import time
+
+os.environ["REDIS_URL"] = os.environ.get("BENCH_REDIS_URL", "memory://")
+
+from app.config import cache_config  # noqa: E402
+from app.models import ComposerOutput, Context, IndexAdvice, ValidationResult, ValidatorOutput  # noqa: E402
+from app.orchestrator import AGENT_STEP_FIELDS, WorkflowOrchestrator  # noqa: E402
+from app.services import redis_ops  # noqa: E402
+from app.services.workflow_state import output_field  # noqa: E402
+
+OPERATIONS = 5_000
+WORKFLOWS = 500
+CONCURRENCY = 50
+
+SCHEMA = {
+    "database_type": "postgresql",
+    "tables": {
+        f"table_{t}": {"columns": [{"name": f"column_{c}", "type": "integer"} for c in range(20)]} for t in range(20)
+    },
+}
+
+
+async def run_concurrently(count: int, operation) -> float:
+    """Run operation(i) for i in range(count) with CONCURRENCY in flight; returns ops/s."""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await operation(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(count)))
+    return count / (time.perf_counter() - start)
+
+
+async def run_workflow(orchestrator: WorkflowOrchestrator, i: int) -> Context:
+    """The state writes of one successful workflow, with instant agents."""
+    ctx = Context(query=f"query {i}", schema=SCHEMA, user_id=f"user_{i % 10}")
+    await orchestrator.save_context(ctx)
+    for agent_name in ["planner", "mapper", "composer", "validator"]:
+        ctx.current_step = agent_name
+        await orchestrator.save_fields(ctx, "current_step")
+        if agent_name == "composer":
+            ctx.composer_output = ComposerOutput(sql_query=f"SELECT {i}")
+        elif agent_name == "validator":
+            ctx.validator_output = ValidatorOutput(validation=ValidationResult(is_valid=True))
+        await orchestrator.save_fields(ctx, output_field(agent_name), *AGENT_STEP_FIELDS)
+    await orchestrator.save_context(ctx)
+    return ctx
+
+
+def print_row(name: str, ops_per_second: float):
+    print(f"{name:<28} | {ops_per_second:>12,.0f}")
+
+
+async def main():
+    print(f"backend: {cache_config.REDIS_URL}  concurrency: {CONCURRENCY}")
+    print(f"{'operation':<28} | {'ops/s':>12}")
+    print("-" * 43)
+
+    advice = IndexAdvice(connection_id="bench")
+    print_row("save_data", await run_concurrently(OPERATIONS, lambda i: redis_ops.save_data(f"bench{i}", advice)))
+    print_row("get_data", await run_concurrently(OPERATIONS, lambda i: redis_ops.get_data(f"bench{i}", IndexAdvice)))
+    start = time.perf_counter()
+    items = await redis_ops.list_data(IndexAdvice)
+    print_row("list_data (per item)", len(items) / (time.perf_counter() - start))
+
+    orchestrator = WorkflowOrchestrator()
+    contexts = []
+
+    async def workflow(i: int):
+        contexts.append(await run_workflow(orchestrator, i))
+
+    print_row("workflow state writes", await run_concurrently(WORKFLOWS, workflow))
+    print_row(
+        "get_workflow_status",
+        await run_concurrently(
+            OPERATIONS, lambda i: orchestrator.get_workflow_status(str(contexts[i % len(contexts)].request_id))
+        ),
+    )
+    print_row(
+        "list_workflows (page of 20)",
+        await run_concurrently(OPERATIONS // 10, lambda i: orchestrator.list_workflows(user_id=f"user_{i % 10}")),
+    )
+
+    for i in range(OPERATIONS):
+        await redis_ops.delete_data(f"bench{i}", IndexAdvice)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
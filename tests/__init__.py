@@ -0,0 +1,22 @@
+"""
+Unit tests. Run with: python -m unittest discover -s tests -t .
+
+Every test runs on the in-memory storage backend (REDIS_URL=memory://), so no
+Redis server, database or OpenAI key is needed.
+"""
+
+import os
+
+os.environ["REDIS_URL"] = "memory://"
+os.environ["REDIS_CLUSTER"] = "false"
+os.environ.setdefault("LOGFIRE_IGNORE_NO_CONFIG", "1")
+for name, value in {
+    "DB_USER": "pulse",
+    "DB_PASSWORD": "pulse",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "pulse",
+    "LOGFIRE_TOKEN": "test",
+    "OPENAI_API_KEY": "sk-test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,57 @@
+import dataclasses
+import unittest
+from unittest import mock
+
+from app.models import ComposerOutput, Context, MapperOutput, PlannerOutput, ValidationResult, ValidatorOutput
+from app.orchestrator import WorkflowOrchestrator
+from app.services.redis import get_binary_redis
+
+
+class MemoryStorageTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs each test on an empty in-memory keyspace."""
+
+    async def asyncSetUp(self):
+        # Re-initialized in place: module-level clients keep pointing at the same store,
+        # and its stream condition is bound to the event loop of this test
+        get_binary_redis().store.__init__()
+
+
+async def plan(ctx: Context) -> Context:
+    ctx.planner_output = PlannerOutput(intent="select", entities=[], filters=[], aggregations=[])
+    return ctx
+
+
+async def map_entities(ctx: Context) -> Context:
+    ctx.mapper_output = MapperOutput(mapped_entities=[], mapped_filters=[], mapped_aggregations=[])
+    return ctx
+
+
+async def compose(ctx: Context) -> Context:
+    ctx.composer_output = ComposerOutput(sql_query="SELECT 1")
+    return ctx
+
+
+async def validate(ctx: Context) -> Context:
+    ctx.validator_output = ValidatorOutput(validation=ValidationResult(is_valid=True))
+    return ctx
+
+
+FAKE_AGENTS = {"planner": plan, "mapper": map_entities, "composer": compose, "validator": validate}
+
+
+class WorkflowTestCase(MemoryStorageTestCase):
+    """Runs workflows with agents that answer at once, without an LLM."""
+
+    agents = FAKE_AGENTS
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.orchestrator = WorkflowOrchestrator()
+        registry = self.orchestrator.registry
+        specs = {
+            name: dataclasses.replace(spec, func=self.agents[name], is_async=True)
+            for name, spec in registry.specs.items()
+        }
+        patcher = mock.patch.object(registry, "specs", specs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
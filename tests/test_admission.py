@@ -0,0 +1,99 @@
+from typing import Optional
+from unittest import mock
+
+from app.config import workflow_config
+from app.models import Context, WorkflowPriority
+from app.services import admission
+from tests.support import MemoryStorageTestCase
+
+
+class AdmissionTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.started: list[str] = []
+        for name, value in (
+            ("WORKFLOW_MAX_RUNNING", 3),
+            ("WORKFLOW_MAX_RUNNING_PER_USER", 2),
+            ("WORKFLOW_MAX_PENDING", 4),
+        ):
+            patcher = mock.patch.object(workflow_config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def start_job(self, request_id: str):
+        self.started.append(request_id)
+
+    async def enqueue(
+        self, user_id: Optional[str] = None, priority: WorkflowPriority = WorkflowPriority.NORMAL, created_at: float = 0
+    ) -> str:
+        ctx = Context(query="q", schema={}, user_id=user_id, priority=priority, created_at=1000.0 + created_at)
+        await admission.ensure_capacity()
+        await admission.enqueue(ctx)
+        return str(ctx.request_id)
+
+    async def test_rejects_when_pending_queue_is_full(self):
+        for i in range(4):
+            await self.enqueue(created_at=i)
+        with self.assertRaises(admission.QueueFullError):
+            await admission.ensure_capacity()
+
+    async def test_orders_by_priority_then_arrival(self):
+        low = await self.enqueue(priority=WorkflowPriority.LOW, created_at=0)
+        normal = await self.enqueue(created_at=1)
+        high = await self.enqueue(priority=WorkflowPriority.HIGH, created_at=2)
+        later_high = await self.enqueue(priority=WorkflowPriority.HIGH, created_at=3)
+
+        positions = [await admission.queue_position(request_id) for request_id in (high, later_high, normal, low)]
+        self.assertEqual(positions, [1, 2, 3, 4])
+        self.assertEqual(await admission.admit(self.start_job), 3)
+        self.assertEqual(self.started, [high, later_high, normal])
+        self.assertIsNone(await admission.queue_position(high))
+        self.assertEqual(await admission.queue_position(low), 1)
+
+    async def test_caps_running_workflows_per_user(self):
+        first, second, third = [await self.enqueue(user_id="alice", created_at=i) for i in range(3)]
+        other = await self.enqueue(user_id="bob", created_at=3)
+
+        self.assertEqual(await admission.admit(self.start_job), 3)
+        # alice's third workflow waits while bob's goes ahead
+        self.assertEqual(self.started, [first, second, other])
+        self.assertEqual(await admission.queue_position(third), 1)
+
+        await admission.release(first)
+        self.assertEqual(await admission.admit(self.start_job), 1)
+        self.assertEqual(self.started[-1], third)
+
+    async def test_admits_only_into_free_slots(self):
+        request_ids = [await self.enqueue(created_at=i) for i in range(4)]
+        self.assertEqual(await admission.admit(self.start_job), 3)
+        self.assertEqual(await admission.admit(self.start_job), 0)
+
+        await admission.release(request_ids[0])
+        self.assertEqual(await admission.admit(self.start_job), 1)
+        self.assertEqual(self.started, request_ids)
+
+    async def test_expired_slots_are_freed(self):
+        request_ids = [await self.enqueue(created_at=i) for i in range(4)]
+        await admission.admit(self.start_job)
+        # A worker that stopped heartbeating: its slot expired
+        await admission.hold(request_ids[0], -1)
+        self.assertEqual(await admission.admit(self.start_job), 1)
+
+    async def test_withdraw(self):
+        request_id = await self.enqueue(user_id="alice")
+        self.assertTrue(await admission.withdraw(request_id))
+        self.assertFalse(await admission.withdraw(request_id))
+        self.assertIsNone(await admission.queue_position(request_id))
+        self.assertEqual(await admission.admit(self.start_job), 0)
+
+    async def test_lock_taken_over_is_not_released(self):
+        redis = admission.get_binary_redis()
+        await self.enqueue()
+
+        async def slow_start_job(request_id: str):
+            # The pass outlived the lock and another process took it
+            await redis.set(admission.ADMISSION_LOCK_KEY, "other", ex=60)
+
+        self.assertEqual(await admission.admit(slow_start_job), 1)
+        self.assertEqual(await redis.get(admission.ADMISSION_LOCK_KEY), b"other")
+        self.assertEqual(await admission.admit(self.start_job), 0)
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from app.config import cache_config
+from app.models import AgentRun, Context
+from app.services import codec
+from app.services.codec import MAGIC, decode_data, decode_model, encode_data, encode_model
+
+
+def sample_context() -> Context:
+    ctx = Context(query="orders per month", schema={"orders": {"id": "integer"}}, user_id="u1")
+    ctx.agent_runs.append(AgentRun(agent="planner", ready_at=0.5, started_at=1.0, finished_at=2.5, prompt_tokens=10))
+    return ctx
+
+
+class CodecTest(unittest.TestCase):
+    def use_codec(self, name: str):
+        patcher = mock.patch.object(cache_config, "REDIS_CODEC", name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip_in_every_format(self):
+        ctx = sample_context()
+        for name in ("json", "msgpack", "msgpack+zstd"):
+            with self.subTest(codec=name):
+                self.use_codec(name)
+                payload = encode_model(ctx)
+                self.assertEqual(payload[0] == MAGIC, name != "json")
+                self.assertEqual(decode_model(payload, Context), ctx)
+                data = {"rows": [[1, "a"], [2, None]], "ok": True}
+                self.assertEqual(decode_data(encode_data(data)), data)
+
+    def test_reads_payloads_of_other_formats(self):
+        ctx = sample_context()
+        self.use_codec("json")
+        legacy = encode_model(ctx)
+        self.use_codec("msgpack+zstd")
+        self.assertEqual(decode_model(legacy, Context), ctx)
+        self.assertEqual(decode_model(legacy.decode("utf-8"), Context), ctx)
+
+    def test_falls_back_to_msgpack_without_zstandard(self):
+        self.use_codec("msgpack+zstd")
+        with mock.patch.object(codec, "zstandard", None):
+            payload = encode_model(sample_context())
+        self.assertEqual(payload[1], codec.FORMAT_MSGPACK)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "Unsupported payload format 99"):
+            decode_data(bytes((MAGIC, 99)) + b"\x80")
+
+    def test_unknown_codec_name_is_rejected(self):
+        self.use_codec("pickle")
+        with self.assertRaisesRegex(ValueError, "Unknown Redis codec"):
+            encode_data({})
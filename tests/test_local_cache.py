@@ -0,0 +1,95 @@
+import asyncio
+from unittest import mock
+
+from app.models import DatabaseConnection, DatabaseType
+from app.services import local_cache
+from app.services.redis_ops import _make_key, delete_data, get_data, save_data
+
+from tests.support import MemoryStorageTestCase
+
+
+def make_connection(host: str = "db-1") -> DatabaseConnection:
+    return DatabaseConnection(
+        id="conn-1",
+        name="main",
+        db_type=DatabaseType.POSTGRESQL,
+        host=host,
+        port=5432,
+        database="app",
+        username="app",
+        password="secret",
+    )
+
+
+class LocalCacheTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await local_cache.start_local_cache(DatabaseConnection)
+        self.addAsyncCleanup(local_cache.stop_local_cache)
+
+    def test_parse_key(self):
+        self.assertEqual(local_cache.parse_key(_make_key("DatabaseConnection", "abc")), ("DatabaseConnection", "abc"))
+        self.assertEqual(local_cache.parse_key("DatabaseConnection:abc"), ("DatabaseConnection", "abc"))
+
+    async def test_get_is_served_from_cache(self):
+        await save_data("conn-1", make_connection())
+        await get_data("conn-1", DatabaseConnection)
+        cache = local_cache.get_cache("DatabaseConnection")
+        self.assertIsNotNone(cache.get(_make_key("DatabaseConnection", "conn-1")))
+
+    async def test_save_evicts(self):
+        await save_data("conn-1", make_connection("db-1"))
+        self.assertEqual((await get_data("conn-1", DatabaseConnection)).host, "db-1")
+
+        await save_data("conn-1", make_connection("db-2"))
+        self.assertEqual((await get_data("conn-1", DatabaseConnection)).host, "db-2")
+
+    async def test_delete_evicts(self):
+        await save_data("conn-1", make_connection())
+        await get_data("conn-1", DatabaseConnection)
+
+        await delete_data("conn-1", DatabaseConnection)
+        with self.assertRaises(KeyError):
+            await get_data("conn-1", DatabaseConnection)
+
+    async def test_invalidation_message_evicts(self):
+        await save_data("conn-1", make_connection())
+        await get_data("conn-1", DatabaseConnection)
+        key = _make_key("DatabaseConnection", "conn-1")
+
+        # As published by another process
+        await local_cache.get_pubsub_redis().publish(local_cache.INVALIDATION_CHANNEL, key)
+        for _ in range(100):
+            if local_cache.get_cache("DatabaseConnection").get(key) is None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertIsNone(local_cache.get_cache("DatabaseConnection").get(key))
+
+
+class SubscribeTimeoutTest(MemoryStorageTestCase):
+    async def test_starts_uncached_when_subscribe_hangs(self):
+        pubsub_type = type(local_cache.get_pubsub_redis().pubsub())
+        subscribe = pubsub_type.subscribe
+        attempts = []
+
+        async def hanging_subscribe(pubsub, *channels):
+            attempts.append(channels)
+            if len(attempts) == 1:
+                await asyncio.sleep(60)
+            await subscribe(pubsub, *channels)
+
+        with (
+            mock.patch.object(pubsub_type, "subscribe", hanging_subscribe),
+            mock.patch.object(local_cache, "SUBSCRIBE_TIMEOUT", 0.05),
+            mock.patch.object(local_cache, "RECONNECT_DELAY", 0.01),
+        ):
+            await asyncio.wait_for(local_cache.start_local_cache(DatabaseConnection), 1)
+            self.addAsyncCleanup(local_cache.stop_local_cache)
+            self.assertIsNone(local_cache.get_cache("DatabaseConnection"))
+
+            # The listener retries and caching starts once it is subscribed
+            for _ in range(100):
+                if local_cache.get_cache("DatabaseConnection") is not None:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertIsNotNone(local_cache.get_cache("DatabaseConnection"))
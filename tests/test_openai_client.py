@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from openai import APITimeoutError, LengthFinishReasonError
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+from app.llm_clients.openai_client import OpenAIClient, track_usage
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def completion(prompt_tokens: int, completion_tokens: int) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "c1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "m",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "SELECT 1"}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    )
+
+
+class UsageTrackingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = OpenAIClient()
+
+    async def test_successful_call(self):
+        create = mock.AsyncMock(return_value=completion(10, 2))
+        with mock.patch.object(self.client.client.chat.completions, "create", create), track_usage() as usage:
+            self.assertEqual(await self.client.call("m", "system", "user"), "SELECT 1")
+        self.assertEqual((usage.calls, usage.failed_calls, usage.prompt_tokens, usage.completion_tokens), (1, 0, 10, 2))
+
+    async def test_timed_out_call_is_recorded(self):
+        error = APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        create = mock.AsyncMock(side_effect=error)
+        with mock.patch.object(self.client.client.chat.completions, "create", create), track_usage() as usage:
+            with self.assertRaises(APITimeoutError):
+                await self.client.call("m", "system", "user")
+        self.assertEqual((usage.calls, usage.failed_calls, usage.prompt_tokens), (1, 1, 0))
+
+    async def test_cancelled_call_is_recorded(self):
+        async def slow(**kwargs):
+            await asyncio.sleep(60)
+
+        with mock.patch.object(self.client.client.chat.completions, "create", slow), track_usage() as usage:
+            with self.assertRaises(TimeoutError):
+                async with asyncio.timeout(0.01):
+                    await self.client.call("m", "system", "user")
+        self.assertEqual((usage.calls, usage.failed_calls), (1, 1))
+        self.assertGreater(usage.seconds, 0)
+
+    async def test_truncated_structured_call_keeps_its_tokens(self):
+        parse = mock.AsyncMock(side_effect=LengthFinishReasonError(completion=completion(100, 4096)))
+        with mock.patch.object(self.client.client.beta.chat.completions, "parse", parse), track_usage() as usage:
+            with self.assertRaises(LengthFinishReasonError):
+                await self.client.call_structured("m", "system", "user", Answer)
+        self.assertEqual(
+            (usage.calls, usage.failed_calls, usage.prompt_tokens, usage.completion_tokens), (1, 1, 100, 4096)
+        )
@@ -0,0 +1,127 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from app.agents.registry import get_agent_registry
+from app.config import workflow_config
+from app.models import AgentPacing, ComposerOutput, Context, ValidationResult, ValidatorOutput, WorkflowStatus
+from app.orchestrator import displayed_status
+from tests.support import FAKE_AGENTS, WorkflowTestCase
+
+
+def ui_status(status: WorkflowStatus, current_step: str, created_at: float = 1000.0) -> dict:
+    return {
+        "status": status.value,
+        "current_step": current_step,
+        "created_at": created_at,
+        "pacing": AgentPacing.UI.value,
+        "feedback": None,
+        "has_planner_output": True,
+        "has_mapper_output": True,
+        "has_composer_output": True,
+        "has_validator_output": True,
+        "sql_query": "SELECT 1",
+        "is_valid": True,
+    }
+
+
+class DisplayedStatusTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(workflow_config, "AGENT_MIN_STEP_SECONDS", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reveals_one_step_per_interval(self):
+        steps = get_agent_registry().execution_order
+        status = ui_status(WorkflowStatus.COMPLETED, steps[-1])
+
+        for shown, step in enumerate(steps):
+            displayed = displayed_status(status, now=1000.0 + 2 * shown + 1)
+            self.assertEqual(displayed["status"], WorkflowStatus.RUNNING.value)
+            self.assertEqual(displayed["current_step"], step)
+            self.assertIsNone(displayed["is_valid"])
+        self.assertEqual(displayed_status(status, now=1000.0 + 2 * len(steps)), status)
+
+    def test_follows_registered_agents(self):
+        registry = get_agent_registry()
+        steps = ["planner", "pruner", "mapper", "composer", "validator"]
+        with mock.patch.object(registry, "execution_order", steps):
+            status = ui_status(WorkflowStatus.COMPLETED, "validator")
+            displayed = displayed_status(status, now=1003.0)
+        self.assertEqual(displayed["current_step"], "pruner")
+        self.assertTrue(displayed["has_planner_output"])
+        self.assertFalse(displayed["has_mapper_output"])
+        self.assertNotIn("has_pruner_output", displayed)
+        self.assertIsNone(displayed["sql_query"])
+
+    def test_other_pacing_is_unchanged(self):
+        status = {**ui_status(WorkflowStatus.COMPLETED, "validator"), "pacing": AgentPacing.NONE.value}
+        self.assertIs(displayed_status(status, now=1000.0), status)
+
+
+class ExecuteWorkflowTest(WorkflowTestCase):
+    async def test_stores_persist_seconds_of_every_run(self):
+        ctx = await self.orchestrator.execute_workflow(Context(query="orders", schema={"orders": {}}))
+        self.assertEqual(ctx.status, WorkflowStatus.COMPLETED)
+
+        stored = await self.orchestrator.load_context(str(ctx.request_id))
+        self.assertEqual([run.agent for run in stored.agent_runs], self.orchestrator.execution_order)
+        for run in stored.agent_runs:
+            self.assertIsNotNone(run.persist_seconds, run.agent)
+
+    async def test_stops_when_the_deadline_has_passed(self):
+        ctx = await self.orchestrator.execute_workflow(Context(query="orders", schema={}, deadline=time.time() - 1))
+        self.assertEqual(ctx.status, WorkflowStatus.FAILED)
+        self.assertIn("deadline exceeded before planner", ctx.feedback)
+        self.assertEqual(ctx.agent_runs, [])
+
+
+async def compose_candidate(ctx: Context) -> Context:
+    # Candidate 1 answers first; the others are still generating
+    if ctx.candidate != 1:
+        await asyncio.sleep(60)
+    ctx.composer_output = ComposerOutput(sql_query=f"SELECT {ctx.candidate}")
+    return ctx
+
+
+class SpeculativeCandidatesTest(WorkflowTestCase):
+    agents = {**FAKE_AGENTS, "composer": compose_candidate}
+
+    async def test_keeps_the_first_valid_candidate(self):
+        ctx = Context(query="orders", schema={}, candidates=3)
+        ctx = await asyncio.wait_for(self.orchestrator.execute_workflow(ctx), 5)
+
+        self.assertEqual(ctx.status, WorkflowStatus.COMPLETED)
+        self.assertEqual(ctx.composer_output.sql_query, "SELECT 1")
+        composer_runs = {run.candidate: run for run in ctx.agent_runs if run.agent == "composer"}
+        self.assertEqual(set(composer_runs), {0, 1, 2})
+        self.assertIsNone(composer_runs[1].error)
+        self.assertIsNotNone(composer_runs[1].persist_seconds)
+        # The losers were cancelled, not awaited
+        self.assertIsNotNone(composer_runs[0].error)
+
+        stored = await self.orchestrator.load_context(str(ctx.request_id))
+        self.assertEqual(stored.composer_output.sql_query, "SELECT 1")
+
+
+async def compose_each(ctx: Context) -> Context:
+    ctx.composer_output = ComposerOutput(sql_query=f"SELECT {ctx.candidate}")
+    return ctx
+
+
+async def reject(ctx: Context) -> Context:
+    ctx.validator_output = ValidatorOutput(validation=ValidationResult(is_valid=False, feedback=f"{ctx.candidate}"))
+    return ctx
+
+
+class NoValidCandidateTest(WorkflowTestCase):
+    agents = {**FAKE_AGENTS, "composer": compose_each, "validator": reject}
+
+    async def test_keeps_the_lowest_candidate(self):
+        ctx = Context(query="orders", schema={}, candidates=3, max_retries=0)
+        ctx = await self.orchestrator.execute_workflow(ctx)
+
+        self.assertEqual(ctx.status, WorkflowStatus.FAILED)
+        self.assertEqual(ctx.composer_output.sql_query, "SELECT 0")
+        self.assertEqual(ctx.validator_output.validation.feedback, "0")
@@ -0,0 +1,50 @@
+import sqlite3
+import unittest
+
+from app.services.index_advisor import _numbered_parameters, _placeholder_values
+from app.services.query_log import _keys, fingerprint_sql, record_query, top_queries
+from app.services.redis import get_redis
+
+from tests.support import MemoryStorageTestCase
+
+
+class QueryLogTest(MemoryStorageTestCase):
+    async def test_literals_are_not_stored(self):
+        await record_query("conn-1", "SELECT * FROM Users WHERE email = 'ann@example.com' AND id = 42", 3.0)
+        await record_query("conn-1", "SELECT * FROM Users WHERE email = 'bob@example.com' AND id = 7", 2.0)
+
+        [entry] = await top_queries("conn-1")
+        self.assertEqual(entry["sql"], "SELECT * FROM Users WHERE email = ? AND id = ?")
+        self.assertEqual(entry["calls"], 2)
+        self.assertEqual(entry["total_time_ms"], 5.0)
+        self.assertEqual(entry["fingerprint"], fingerprint_sql("select * from users where email = 'x' and id = 1"))
+
+        stored = await get_redis().hgetall(_keys("conn-1")[2])
+        self.assertNotIn("example.com", repr(stored))
+
+    async def test_writes_are_not_logged(self):
+        await record_query("conn-1", "INSERT INTO users VALUES ('ann@example.com')", 1.0)
+        self.assertEqual(await top_queries("conn-1"), [])
+
+    def test_keys_share_a_hash_tag(self):
+        tags = {key[: key.index("}") + 1] for key in _keys("conn-1")}
+        self.assertEqual(len(tags), 1)
+        self.assertTrue(tags.pop().startswith("{query_log:"))
+
+
+class ExplainPlaceholdersTest(unittest.TestCase):
+    def test_numbered_parameters(self):
+        self.assertEqual(
+            _numbered_parameters("SELECT * FROM t WHERE a = ? AND b IN (?) LIMIT ?"),
+            "SELECT * FROM t WHERE a = $1 AND b IN ($2) LIMIT $3",
+        )
+
+    def test_placeholder_values_explain_on_sqlite(self):
+        sql = _placeholder_values("SELECT * FROM users WHERE email = ? AND created_at > ? LIMIT ? OFFSET ?")
+        self.assertEqual(sql, "SELECT * FROM users WHERE email = '0' AND created_at > '0' LIMIT 0 OFFSET 0")
+
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE users (id INTEGER, email TEXT, created_at TEXT)")
+        plan = db.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        self.assertIn("SCAN users", " ".join(row[-1] for row in plan))
+        db.close()
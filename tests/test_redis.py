@@ -0,0 +1,21 @@
+from app.services.redis import get_binary_redis, release_lock
+
+from tests.support import MemoryStorageTestCase
+
+
+class ReleaseLockTest(MemoryStorageTestCase):
+    async def test_release_own_lock(self):
+        redis = get_binary_redis()
+        await redis.set("lock", "token-a", nx=True, ex=10)
+        self.assertTrue(await release_lock(redis, "lock", "token-a"))
+        self.assertIsNone(await redis.get("lock"))
+
+    async def test_keep_lock_of_next_holder(self):
+        redis = get_binary_redis()
+        # token-a's lock expired and token-b took it
+        await redis.set("lock", "token-b", nx=True, ex=10)
+        self.assertFalse(await release_lock(redis, "lock", "token-a"))
+        self.assertEqual(await redis.get("lock"), b"token-b")
+
+    async def test_release_missing_lock(self):
+        self.assertFalse(await release_lock(get_binary_redis(), "lock", "token-a"))
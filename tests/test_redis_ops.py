@@ -0,0 +1,46 @@
+from unittest import mock
+
+from pydantic import BaseModel
+
+from app.services import redis_ops
+from app.services.redis import get_binary_redis, key_bucket
+from app.services.redis_ops import _make_index_key, _make_key, list_data, list_ids, save_data
+
+from tests.support import MemoryStorageTestCase
+
+
+class Note(BaseModel):
+    text: str
+
+
+class ListDataTest(MemoryStorageTestCase):
+    async def test_lists_saved_instances(self):
+        for i in range(250):
+            await save_data(str(i), Note(text=f"note {i}"))
+        notes = await list_data(Note)
+        self.assertEqual(sorted(note.text for note in notes), sorted(f"note {i}" for i in range(250)))
+
+    async def test_expired_values_leave_the_index(self):
+        await save_data("a", Note(text="a"))
+        await save_data("b", Note(text="b"))
+        await get_binary_redis().delete(_make_key("Note", "a"))
+
+        self.assertEqual([note.text for note in await list_data(Note)], ["b"])
+        self.assertEqual(await list_ids("Note"), ["b"])
+
+    async def test_value_saved_again_keeps_its_index_entry(self):
+        await save_data("a", Note(text="old"))
+        redis = get_binary_redis()
+        await redis.delete(_make_key("Note", "a"))
+        mget = type(redis).mget
+
+        async def mget_then_save(client, keys):
+            values = await mget(client, keys)
+            # Saved again between the MGET and the index cleanup
+            await save_data("a", Note(text="new"))
+            return values
+
+        with mock.patch.object(type(redis), "mget", mget_then_save):
+            self.assertEqual(await redis_ops._load_bucket(Note, key_bucket("a"), ["a"]), [])
+        self.assertIn(b"a", await redis.smembers(_make_index_key("Note", key_bucket("a"))))
+        self.assertEqual([note.text for note in await list_data(Note)], ["new"])
@@ -0,0 +1,44 @@
+from app.services import schema_store
+from app.services.redis import get_binary_redis
+from app.services.schema_store import load_schema, schema_hash, store_schema
+
+from tests.support import MemoryStorageTestCase
+
+SCHEMA = {"tables": {"users": {"columns": [{"name": "id", "type": "integer"}]}}}
+
+
+class SchemaStoreTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        schema_store._memo.clear()
+
+    def test_hash_ignores_key_order(self):
+        reordered = {"tables": {"users": {"columns": [{"type": "integer", "name": "id"}]}}}
+        self.assertEqual(schema_hash(SCHEMA), schema_hash(reordered))
+        self.assertNotEqual(schema_hash(SCHEMA), schema_hash({"tables": {}}))
+
+    async def test_round_trip_through_redis(self):
+        ref = schema_hash(SCHEMA)
+        await store_schema(ref, SCHEMA)
+        schema_store._memo.clear()
+
+        self.assertEqual(await load_schema(ref), SCHEMA)
+
+    async def test_missing_schema(self):
+        with self.assertRaises(KeyError):
+            await load_schema(schema_hash(SCHEMA))
+
+    async def test_store_again_after_eviction(self):
+        ref = schema_hash(SCHEMA)
+        await store_schema(ref, SCHEMA)
+        # Evicted or flushed from Redis while this process still remembers it
+        await get_binary_redis().delete(schema_store._make_key(ref))
+
+        await store_schema(ref, SCHEMA)
+        schema_store._memo.clear()
+        self.assertEqual(await load_schema(ref), SCHEMA)
+
+    async def test_store_refreshes_ttl(self):
+        ref = schema_hash(SCHEMA)
+        await store_schema(ref, SCHEMA)
+        self.assertGreater(await get_binary_redis().ttl(schema_store._make_key(ref)), 0)
@@ -0,0 +1,158 @@
+import sqlite3
+import unittest
+
+from app.services.sql_dialect import translate_sql
+
+
+class SQLiteTranslationTest(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute("CREATE TABLE orders (id INTEGER, created_at TEXT, total TEXT)")
+        self.db.executemany(
+            "INSERT INTO orders VALUES (?, ?, ?)",
+            [(i, f"2024-01-{i:02d} 10:00:00", str(i * 10)) for i in range(1, 21)],
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def run_sql(self, sql: str) -> list[tuple]:
+        return self.db.execute(translate_sql(sql, "sqlite", "postgresql")).fetchall()
+
+    def test_date_cast_uses_date_function(self):
+        sql = "SELECT id FROM orders WHERE created_at::date = '2024-01-02'"
+        self.assertEqual(
+            translate_sql(sql, "sqlite", "postgresql"), "SELECT id FROM orders WHERE date(created_at) = '2024-01-02'"
+        )
+        self.assertEqual(self.run_sql(sql), [(2,)])
+
+    def test_timestamp_and_time_casts(self):
+        sql = "SELECT created_at::timestamp, created_at::time FROM orders WHERE id = 1"
+        self.assertEqual(self.run_sql(sql), [("2024-01-01 10:00:00", "10:00:00")])
+
+    def test_numeric_and_text_casts(self):
+        translated = translate_sql("SELECT total::numeric(10, 2), id::varchar(20) FROM orders", "sqlite", "postgresql")
+        self.assertEqual(translated, "SELECT CAST(total AS NUMERIC), CAST(id AS TEXT) FROM orders")
+        self.assertEqual(self.run_sql("SELECT SUM(total::integer) FROM orders"), [(2100,)])
+
+    def test_unknown_cast_type_is_dropped(self):
+        self.assertEqual(translate_sql("SELECT payload::jsonb FROM t", "sqlite", "postgresql"), "SELECT payload FROM t")
+
+    def test_cast_inside_string_is_kept(self):
+        sql = "SELECT 'a::date' FROM t"
+        self.assertEqual(translate_sql(sql, "sqlite", "postgresql"), sql)
+
+    def test_offset_fetch(self):
+        sql = "SELECT id FROM orders ORDER BY id OFFSET 5 ROWS FETCH NEXT 3 ROWS ONLY"
+        self.assertEqual(
+            translate_sql(sql, "sqlite", "postgresql"), "SELECT id FROM orders ORDER BY id LIMIT 3 OFFSET 5"
+        )
+        self.assertEqual(self.run_sql(sql), [(6,), (7,), (8,)])
+
+    def test_fetch_first(self):
+        self.assertEqual(self.run_sql("SELECT id FROM orders ORDER BY id FETCH FIRST 2 ROWS ONLY"), [(1,), (2,)])
+
+    def test_top(self):
+        self.assertEqual(self.run_sql("SELECT TOP 2 id FROM orders ORDER BY id DESC"), [(20,), (19,)])
+
+    def test_extract_and_intervals(self):
+        self.assertEqual(
+            self.run_sql("SELECT EXTRACT(epoch FROM created_at) FROM orders WHERE id = 1"), [(1704103200,)]
+        )
+        self.assertEqual(
+            translate_sql("SELECT * FROM t WHERE d > NOW() - INTERVAL '2 weeks'", "sqlite"),
+            "SELECT * FROM t WHERE d > datetime('now', '-14 days')",
+        )
+
+    def test_untranslatable_date_functions_raise(self):
+        for sql in (
+            "SELECT DATE_TRUNC('quarter', created_at) FROM orders",
+            "SELECT EXTRACT(isodow FROM created_at) FROM orders",
+            "SELECT * FROM orders WHERE created_at > NOW() - INTERVAL '1 day 2 hours'",
+        ):
+            with self.subTest(sql=sql), self.assertRaises(ValueError):
+                translate_sql(sql, "sqlite")
+
+    def test_mysql_escaped_quotes(self):
+        self.assertEqual(
+            translate_sql(r"SELECT id FROM t WHERE a = 'it\'s' AND b ILIKE 'x'", "sqlite", "mysql"),
+            "SELECT id FROM t WHERE a = 'it''s' AND b LIKE 'x'",
+        )
+
+    def test_ilike_and_booleans(self):
+        self.assertEqual(
+            translate_sql("SELECT * FROM t WHERE name ILIKE 'a%' AND active = TRUE", "sqlite", "postgresql"),
+            "SELECT * FROM t WHERE name LIKE 'a%' AND active = 1",
+        )
+
+
+class MySQLTranslationTest(unittest.TestCase):
+    def test_offset_fetch(self):
+        self.assertEqual(
+            translate_sql("SELECT id FROM t ORDER BY id OFFSET 10 ROWS FETCH FIRST 5 ROWS ONLY", "mysql", "postgresql"),
+            "SELECT id FROM t ORDER BY id LIMIT 5 OFFSET 10",
+        )
+
+    def test_date_functions(self):
+        self.assertEqual(
+            translate_sql(
+                "SELECT DATE_TRUNC('month', created_at), EXTRACT(dow FROM created_at), EXTRACT(YEAR FROM created_at) "
+                "FROM t WHERE created_at::date >= NOW() - INTERVAL '7 days'",
+                "mysql",
+            ),
+            "SELECT CAST(DATE_FORMAT(created_at, '%Y-%m-01') AS DATETIME), (DAYOFWEEK(created_at) - 1), "
+            "EXTRACT(YEAR FROM created_at) FROM t WHERE CAST(created_at AS DATE) >= NOW() - INTERVAL 7 DAY",
+        )
+
+    def test_casts(self):
+        self.assertEqual(
+            translate_sql("SELECT total::numeric(10, 2), id::text, flag::boolean FROM t", "mysql", "postgresql"),
+            "SELECT CAST(total AS DECIMAL(10,2)), CAST(id AS CHAR), CAST(flag AS SIGNED) FROM t",
+        )
+
+    def test_untranslatable_constructs_raise(self):
+        for sql in (
+            "SELECT DATE_TRUNC('week', d) FROM t",
+            "SELECT d::tsvector FROM t",
+            "SELECT EXTRACT(isodow FROM d) FROM t",
+        ):
+            with self.subTest(sql=sql), self.assertRaises(ValueError):
+                translate_sql(sql, "mysql", "postgresql")
+
+    def test_escaped_quotes_mask_strings(self):
+        # ILIKE after a string holding an escaped quote is still seen
+        self.assertEqual(
+            translate_sql(r"SELECT id FROM t WHERE x = 'it\'s' AND y ILIKE 'a'", "mysql"),
+            r"SELECT id FROM t WHERE x = 'it\'s' AND y LIKE 'a'",
+        )
+
+    def test_backslashes_of_other_dialects_are_escaped(self):
+        self.assertEqual(
+            translate_sql(r"SELECT id FROM t WHERE path = 'C:\dir'", "mysql", "postgresql"),
+            r"SELECT id FROM t WHERE path = 'C:\\dir'",
+        )
+
+    def test_double_quoted_identifiers(self):
+        self.assertEqual(
+            translate_sql('SELECT "name" FROM "users"', "mysql", "postgresql"), "SELECT `name` FROM `users`"
+        )
+
+
+class PostgreSQLTranslationTest(unittest.TestCase):
+    def test_mysql_limit(self):
+        self.assertEqual(
+            translate_sql("SELECT IFNULL(a, 0) FROM t LIMIT 10, 5", "postgresql", "mysql"),
+            "SELECT COALESCE(a, 0) FROM t LIMIT 5 OFFSET 10",
+        )
+
+    def test_mysql_date_functions(self):
+        self.assertEqual(
+            translate_sql(
+                "SELECT YEAR(created_at), MONTH(o.created_at) FROM o WHERE d > NOW() - INTERVAL 7 DAY", "postgresql"
+            ),
+            "SELECT EXTRACT(YEAR FROM created_at), EXTRACT(MONTH FROM o.created_at) FROM o "
+            "WHERE d > NOW() - INTERVAL '7 days'",
+        )
+
+    def test_show_tables(self):
+        self.assertIn("information_schema.tables", translate_sql("SHOW TABLES", "postgresql"))
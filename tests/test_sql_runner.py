@@ -0,0 +1,98 @@
+import asyncio
+from unittest import mock
+
+from app.models import DatabaseConnection, DatabaseType
+from app.services import local_cache, sql_runner
+from app.services.redis_ops import _make_key, delete_data, save_data
+
+from tests.support import MemoryStorageTestCase
+
+
+def make_connection() -> DatabaseConnection:
+    return DatabaseConnection(
+        id="sqlite-1",
+        name="local",
+        db_type=DatabaseType.SQLITE,
+        host="localhost",
+        port=1,
+        database=":memory:",
+        username="app",
+        password="secret",
+    )
+
+
+class PoolEvictionTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await local_cache.start_local_cache(DatabaseConnection)
+        self.addAsyncCleanup(local_cache.stop_local_cache)
+        self.addAsyncCleanup(sql_runner.close_pools)
+        self.connection = make_connection()
+        await save_data(self.connection.id, self.connection)
+
+    async def test_update_drops_engine(self):
+        engine = await sql_runner._get_engine(self.connection)
+        self.assertIs(await sql_runner._get_engine(self.connection), engine)
+
+        self.connection.host = "elsewhere"
+        await save_data(self.connection.id, self.connection)
+        self.assertNotIn(self.connection.id, sql_runner._engines)
+        await asyncio.gather(*sql_runner._closing)
+        self.assertIsNot(await sql_runner._get_engine(self.connection), engine)
+
+    async def test_delete_drops_engine(self):
+        await sql_runner._get_engine(self.connection)
+
+        await delete_data(self.connection.id, DatabaseConnection)
+        self.assertNotIn(self.connection.id, sql_runner._engines)
+        await asyncio.gather(*sql_runner._closing)
+        self.assertFalse(sql_runner._closing)
+
+    async def test_invalidation_from_another_process(self):
+        await sql_runner._get_engine(self.connection)
+
+        key = _make_key("DatabaseConnection", self.connection.id)
+        await local_cache.get_pubsub_redis().publish(local_cache.INVALIDATION_CHANNEL, key)
+        for _ in range(100):
+            if self.connection.id not in sql_runner._engines:
+                break
+            await asyncio.sleep(0.01)
+        self.assertNotIn(self.connection.id, sql_runner._engines)
+
+
+class PoolLockTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.addAsyncCleanup(sql_runner.close_pools)
+
+    async def test_unreachable_host_does_not_block_other_connections(self):
+        unreachable = make_connection().model_copy(update={"id": "pg-1", "db_type": DatabaseType.POSTGRESQL})
+        connecting = asyncio.Event()
+
+        async def hanging_create_pool(**kwargs):
+            connecting.set()
+            await asyncio.sleep(60)
+
+        with mock.patch.object(sql_runner.asyncpg, "create_pool", hanging_create_pool):
+            pending = asyncio.create_task(sql_runner._get_postgresql_pool(unreachable))
+            await connecting.wait()
+            engine = await asyncio.wait_for(sql_runner._get_engine(make_connection()), 1)
+            self.assertIs(sql_runner._engines["sqlite-1"][1], engine)
+            pending.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+
+    async def test_concurrent_lookups_create_one_pool(self):
+        created = []
+
+        async def create_pool(**kwargs):
+            await asyncio.sleep(0.01)
+            pool = mock.AsyncMock()
+            created.append(pool)
+            return pool
+
+        connection = make_connection().model_copy(update={"id": "pg-1", "db_type": DatabaseType.POSTGRESQL})
+        with mock.patch.object(sql_runner.asyncpg, "create_pool", create_pool):
+            pools = await asyncio.gather(*(sql_runner._get_postgresql_pool(connection) for _ in range(5)))
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(pool is created[0] for pool in pools))
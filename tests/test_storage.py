@@ -0,0 +1,28 @@
+from redis.exceptions import ResponseError
+
+from app.services.redis import get_binary_redis
+
+from tests.support import MemoryStorageTestCase
+
+
+class WrongTypeTest(MemoryStorageTestCase):
+    async def test_hash_commands_reject_sorted_sets(self):
+        redis = get_binary_redis()
+        await redis.zadd("scores", {"a": 1})
+        for command in (redis.hgetall("scores"), redis.hget("scores", "a"), redis.hset("scores", "a", "1")):
+            with self.subTest(command=command.__qualname__), self.assertRaisesRegex(ResponseError, "WRONGTYPE"):
+                await command
+
+    async def test_sorted_set_commands_reject_hashes(self):
+        redis = get_binary_redis()
+        await redis.hset("fields", "a", "1")
+        with self.assertRaisesRegex(ResponseError, "WRONGTYPE"):
+            await redis.zadd("fields", {"a": 1})
+        self.assertEqual(await redis.hgetall("fields"), {b"a": b"1"})
+
+    async def test_type(self):
+        redis = get_binary_redis()
+        await redis.zadd("scores", {"a": 1})
+        await redis.hset("fields", "a", "1")
+        self.assertEqual(await redis.type("scores"), b"zset")
+        self.assertEqual(await redis.type("fields"), b"hash")
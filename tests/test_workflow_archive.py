@@ -0,0 +1,134 @@
+import contextlib
+import time
+from unittest import mock
+
+from app.models import Context, WorkflowStatus
+from app.orchestrator import WorkflowOrchestrator
+from app.services import schema_store, workflow_archive
+
+from tests.support import MemoryStorageTestCase
+
+
+class FakeConnection:
+    """Records statements; fails the workflow insert while fail_insert is set."""
+
+    def __init__(self, fail_insert: bool = False):
+        self.fail_insert = fail_insert
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+        if self.fail_insert and "INSERT INTO workflow_archive " in str(statement):
+            raise RuntimeError("insert failed")
+
+
+def fake_connect(connection: FakeConnection):
+    @contextlib.asynccontextmanager
+    async def connect():
+        yield connection
+
+    return connect
+
+
+class ArchivePartitionTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        workflow_archive._known_partitions.clear()
+        self.ctx = Context(query="q", schema={"tables": {}}, created_at=1718000000.0)
+
+    async def test_partition_is_remembered_after_commit(self):
+        connection = FakeConnection()
+        with mock.patch.object(workflow_archive.sessionmanager, "connect", fake_connect(connection)):
+            await workflow_archive.archive_contexts([self.ctx])
+        self.assertEqual(workflow_archive._known_partitions, {"workflow_archive_2024_06"})
+        # Bounds in UTC whatever the session TimeZone
+        self.assertTrue(
+            any(
+                "FOR VALUES FROM ('2024-06-01 00:00:00+00') TO ('2024-07-01 00:00:00+00')" in s
+                for s in connection.statements
+            )
+        )
+
+    async def test_december_partition_ends_next_year(self):
+        ctx = Context(query="q", schema={}, created_at=1735689599.0)  # 2024-12-31 23:59:59 UTC
+        connection = FakeConnection()
+        with mock.patch.object(workflow_archive.sessionmanager, "connect", fake_connect(connection)):
+            await workflow_archive.archive_contexts([ctx])
+        self.assertTrue(
+            any("workflow_archive_2024_12" in s and "TO ('2025-01-01 00:00:00+00')" in s for s in connection.statements)
+        )
+
+    async def test_partition_is_created_again_after_rollback(self):
+        failing = FakeConnection(fail_insert=True)
+        with mock.patch.object(workflow_archive.sessionmanager, "connect", fake_connect(failing)):
+            with self.assertRaises(RuntimeError):
+                await workflow_archive.archive_contexts([self.ctx])
+        self.assertEqual(workflow_archive._known_partitions, set())
+
+        connection = FakeConnection()
+        with mock.patch.object(workflow_archive.sessionmanager, "connect", fake_connect(connection)):
+            await workflow_archive.archive_contexts([self.ctx])
+        self.assertTrue(any("CREATE TABLE IF NOT EXISTS workflow_archive_2024_06" in s for s in connection.statements))
+
+    async def test_start_creates_the_default_partition(self):
+        connection = FakeConnection()
+        with (
+            mock.patch.object(workflow_archive.sessionmanager, "connect", fake_connect(connection)),
+            mock.patch.object(workflow_archive.sessionmanager, "create_all", mock.AsyncMock()),
+            mock.patch.object(workflow_archive, "_run_archiver", mock.AsyncMock()),
+        ):
+            await workflow_archive.start_archiver()
+            await workflow_archive.stop_archiver()
+        self.assertIn(
+            "CREATE TABLE IF NOT EXISTS workflow_archive_default PARTITION OF workflow_archive DEFAULT",
+            connection.statements,
+        )
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def one_or_none(self):
+        return self.row
+
+
+class LoadArchivedContextTest(MemoryStorageTestCase):
+    async def test_schema_is_attached(self):
+        schema = {"tables": {"orders": {"columns": []}}}
+        ctx = Context(query="q", schema=schema)
+        data = ctx.to_dict()
+        schema_store._memo.clear()
+
+        session = mock.AsyncMock()
+        session.execute.return_value = FakeResult((data, schema))
+
+        @contextlib.asynccontextmanager
+        async def fake_session():
+            yield session
+
+        with mock.patch.object(workflow_archive.sessionmanager, "session", fake_session):
+            loaded = await workflow_archive.load_archived_context(str(ctx.request_id))
+
+        self.assertEqual(loaded.schema, schema)
+        self.assertIn("workflow_schema_archive", str(session.execute.call_args.args[0]))
+        # Later loads in this process find it too
+        self.assertEqual(Context.model_validate(data).schema, schema)
+
+    async def test_not_archived(self):
+        self.assertIsNone(await workflow_archive.load_archived_context("not-a-uuid"))
+
+
+class ArchiveLockTest(MemoryStorageTestCase):
+    async def test_lock_taken_over_is_not_released(self):
+        redis = workflow_archive.get_binary_redis()
+
+        async def expire_and_take_over(_contexts):
+            # The batch outlived the lock and another process took it
+            await redis.set(workflow_archive.ARCHIVE_LOCK_KEY, "other", ex=60)
+
+        ctx = Context(query="q", schema={"tables": {}}, created_at=time.time() - 1000, status=WorkflowStatus.COMPLETED)
+        await WorkflowOrchestrator().save_context(ctx)
+        with mock.patch.object(workflow_archive, "archive_contexts", expire_and_take_over):
+            self.assertEqual(await workflow_archive.archive_finished_workflows(), 1)
+        self.assertEqual(await redis.get(workflow_archive.ARCHIVE_LOCK_KEY), b"other")
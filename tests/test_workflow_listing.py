@@ -0,0 +1,108 @@
+import time
+from unittest import mock
+
+from app import orchestrator
+from app.models import Context, WorkflowStatus
+from app.orchestrator import WorkflowOrchestrator, list_workflows
+
+from tests.support import MemoryStorageTestCase
+
+
+class FakeArchive:
+    """list_archived_contexts over a list of contexts, with the same ordering and filters."""
+
+    def __init__(self, contexts: list[Context]):
+        self.contexts = contexts
+        self.calls = 0
+
+    async def __call__(self, user_id=None, session_id=None, status=None, before=None, limit=20):
+        self.calls += 1
+        found = [
+            ctx
+            for ctx in self.contexts
+            if (user_id is None or ctx.user_id == user_id)
+            and (session_id is None or ctx.session_id == session_id)
+            and (status is None or ctx.status.value == status)
+            and (before is None or (ctx.created_at, str(ctx.request_id)) < before)
+        ]
+        found.sort(key=lambda ctx: (ctx.created_at, str(ctx.request_id)), reverse=True)
+        return found[:limit]
+
+
+def make_context(created_at: float, user_id: str = "alice", status: WorkflowStatus = WorkflowStatus.COMPLETED):
+    return Context(query=f"q{created_at}", schema={"tables": {}}, user_id=user_id, created_at=created_at, status=status)
+
+
+class WorkflowListingTest(MemoryStorageTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.orchestrator = WorkflowOrchestrator()
+        self.now = time.time()
+
+    async def save(self, *contexts: Context):
+        for ctx in contexts:
+            await self.orchestrator.save_context(ctx)
+
+    async def list_all(self, limit: int, **filters) -> list[dict]:
+        items, cursor = await list_workflows(limit=limit, **filters)
+        pages = [items]
+        while cursor:
+            items, cursor = await list_workflows(cursor=cursor, limit=limit, **filters)
+            pages.append(items)
+        self.assertTrue(all(len(page) <= limit for page in pages))
+        return [item for page in pages for item in page]
+
+    async def test_paginates_redis_indexes(self):
+        contexts = [make_context(self.now - i, user_id="alice" if i % 2 else "bob") for i in range(25)]
+        await self.save(*contexts)
+
+        with mock.patch.object(orchestrator, "list_archived_contexts", FakeArchive([])):
+            listed = await self.list_all(limit=4)
+            self.assertEqual([item["request_id"] for item in listed], [str(ctx.request_id) for ctx in contexts])
+
+            alice = await self.list_all(limit=3, user_id="alice")
+            self.assertEqual(len(alice), 12)
+            self.assertTrue(all(item["user_id"] == "alice" for item in alice))
+
+    async def test_archive_is_merged_after_redis(self):
+        live = [make_context(self.now - i) for i in range(2)]
+        archived = [make_context(self.now - 3600 - i) for i in range(5)]
+        # Archived but not removed from Redis yet
+        await self.save(*live, archived[0])
+        archive = FakeArchive(archived)
+
+        with mock.patch.object(orchestrator, "list_archived_contexts", archive):
+            first_page, cursor = await list_workflows(user_id="alice", limit=2)
+            # Recent full page: the archive cannot hold anything newer
+            self.assertEqual(archive.calls, 0)
+            self.assertEqual([item["request_id"] for item in first_page], [str(ctx.request_id) for ctx in live])
+
+            listed = await self.list_all(limit=2, user_id="alice")
+
+        self.assertEqual([item["request_id"] for item in listed], [str(ctx.request_id) for ctx in live + archived])
+        self.assertEqual(listed[-1]["query"], archived[-1].query)
+
+    async def test_live_statuses_skip_the_archive(self):
+        await self.save(make_context(self.now, status=WorkflowStatus.RUNNING))
+        archive = FakeArchive([make_context(self.now - 3600)])
+
+        with mock.patch.object(orchestrator, "list_archived_contexts", archive):
+            items, cursor = await list_workflows(status=WorkflowStatus.RUNNING)
+        self.assertEqual(len(items), 1)
+        self.assertIsNone(cursor)
+        self.assertEqual(archive.calls, 0)
+
+    async def test_unavailable_archive(self):
+        await self.save(make_context(self.now))
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("DatabaseSessionManager is not initialized")
+
+        with mock.patch.object(orchestrator, "list_archived_contexts", fail):
+            items, cursor = await list_workflows(user_id="alice")
+        self.assertEqual(len(items), 1)
+        self.assertIsNone(cursor)
+
+    async def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await list_workflows(cursor="nope")
@@ -0,0 +1,65 @@
+import asyncio
+from unittest import mock
+
+from app.config import workflow_config
+from app.models import Context, WorkflowStatus
+from app.services import admission
+from app.workflow_runner import WorkflowRunner
+from tests.support import FAKE_AGENTS, WorkflowTestCase
+
+# Replaced in each test: an event is bound to the loop it is first awaited in
+planner_started = asyncio.Event()
+
+
+async def slow_plan(ctx: Context) -> Context:
+    planner_started.set()
+    await asyncio.sleep(60)
+    return await FAKE_AGENTS["planner"](ctx)
+
+
+class WorkflowRunnerTest(WorkflowTestCase):
+    agents = {**FAKE_AGENTS, "planner": slow_plan}
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        patcher = mock.patch(f"{__name__}.planner_started", asyncio.Event())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.runner = WorkflowRunner(concurrency=2)
+        self.addAsyncCleanup(self.runner.stop)
+
+    async def test_cancels_a_pending_workflow(self):
+        with mock.patch.object(workflow_config, "WORKFLOW_MAX_RUNNING", 0):
+            ctx = Context(query="q", schema={})
+            await self.runner.submit(ctx)
+            request_id = str(ctx.request_id)
+            self.assertEqual(await admission.queue_position(request_id), 1)
+
+            self.assertEqual(await self.runner.cancel(request_id), WorkflowStatus.CANCELLED)
+        self.assertIsNone(await admission.queue_position(request_id))
+        stored = await self.orchestrator.load_context(request_id)
+        self.assertEqual(stored.status, WorkflowStatus.CANCELLED)
+
+    async def test_cancels_a_running_workflow(self):
+        self.runner.start()
+        ctx = Context(query="q", schema={})
+        run = asyncio.create_task(self.runner.run(ctx))
+        await asyncio.wait_for(planner_started.wait(), 5)
+
+        self.assertEqual(await self.runner.cancel(str(ctx.request_id)), WorkflowStatus.RUNNING)
+        ctx = await asyncio.wait_for(run, 5)
+        self.assertEqual(ctx.status, WorkflowStatus.CANCELLED)
+        stored = await self.orchestrator.load_context(str(ctx.request_id))
+        self.assertEqual(stored.status, WorkflowStatus.CANCELLED)
+
+    async def test_finished_workflow_keeps_its_status(self):
+        ctx = Context(query="q", schema={}, status=WorkflowStatus.COMPLETED)
+        await self.orchestrator.save_context(ctx)
+        self.assertEqual(await self.runner.cancel(str(ctx.request_id)), WorkflowStatus.COMPLETED)
+        self.assertIsNone(await self.runner.cancel("missing"))
+
+    async def test_stops_at_the_deadline(self):
+        with mock.patch.object(workflow_config, "WORKFLOW_DEADLINE_SECONDS", 0.05):
+            ctx = await asyncio.wait_for(self.runner.run(Context(query="q", schema={})), 5)
+        self.assertEqual(ctx.status, WorkflowStatus.FAILED)
+        self.assertIn("deadline exceeded during planner", ctx.feedback)